@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Replay do tráfego gravado (`TRAFFIC_RECORD_PATH`) contra uma instância local.
+
+O app de `src.main` roda neste processo com banco e uploads temporários, e a
+API da OpenAI é substituída por um servidor falso local (streaming, latência
+e tamanho de resposta configuráveis). Os eventos são reenviados no ritmo
+gravado, acelerado por `--speed`:
+
+- `create_session`, `history`, `archive`, `upload`: requisições REST pelo
+  cliente de teste do Flask (latência = duração da requisição);
+- `message`, `analyze_file`: eventos Socket.IO pelo cliente de teste do
+  Flask-SocketIO (latência = envio até a resposta da IA chegar à sala).
+
+Conteúdos são sintéticos, com os tamanhos e extensões gravados. Cada sessão
+gravada vira uma sessão nova na instância local.
+
+Uso (a partir de backend/ai_vice_backend):
+
+    python benchmarks/replay.py traffic.jsonl                      # 1x
+    python benchmarks/replay.py traffic.jsonl --speed 10 --save-baseline baseline.json
+    python benchmarks/replay.py traffic.jsonl --speed 10 --baseline baseline.json
+
+Com `--baseline`, termina com código 1 se algum percentil piorar mais que
+`--tolerance` (e mais que `--min-delta-ms`) ou a vazão cair mais que
+`--tolerance` (para uso em CI antes do deploy). Percentis só são comparados
+com amostras suficientes (p90: 20, p99: 100 operações do tipo); gravações
+curtas dão resultados ruidosos.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SOCKET_KINDS = ('message', 'analyze_file')
+PERCENTILES = (50, 90, 99)
+# Amostras mínimas para comparar cada percentil (com menos, ele é só o máximo)
+MIN_SAMPLES = {50: 5, 90: 20, 99: 100}
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.json', '.py', '.js', '.html', '.css')
+WORDS = ("o a de que para com uma resposta arquivo código exemplo sessão dados "
+         "como função usuário sistema Python análise texto projeto").split()
+
+
+def load_recording(path):
+    """
+    Cabeçalho e eventos da gravação, em ordem de tempo.
+    """
+    header, events = {}, []
+    offset = 0
+    with open(path, encoding='utf-8') as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'version' in record:
+                # Gravações concatenadas: os tempos continuam do ponto anterior
+                offset = events[-1]['t'] if events else 0
+                header = header or record
+                continue
+            record['t'] = record['t'] + offset
+            events.append(record)
+    events.sort(key=lambda event: event['t'])
+    return header, events
+
+
+def synthetic_text(size, rng):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:max(size, 1)]
+
+
+class FakeUpstream:
+    """
+    Servidor compatível com `POST /v1/chat/completions` (com e sem streaming).
+    """
+
+    def __init__(self, latency_ms, reply_chars, chunk_chars=40, chunk_ms=5):
+        reply = synthetic_text(reply_chars, random.Random(0))
+        chunks = [reply[i:i + chunk_chars] for i in range(0, len(reply), chunk_chars)]
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                upstream.calls += 1
+                time.sleep(latency_ms / 1000)
+                usage = {'prompt_tokens': 100, 'completion_tokens': len(reply) // 4,
+                         'total_tokens': 100 + len(reply) // 4, 'prompt_tokens_details': {'cached_tokens': 0}}
+                base = {'id': 'chatcmpl-replay', 'created': int(time.time()), 'model': body.get('model', 'fake')}
+                if not body.get('stream'):
+                    payload = json.dumps(dict(base, object='chat.completion', usage=usage, choices=[{
+                        'index': 0, 'finish_reason': 'stop',
+                        'message': {'role': 'assistant', 'content': reply}
+                    }])).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        data = dict(base, object='chat.completion.chunk', choices=[{
+                            'index': 0, 'finish_reason': None, 'delta': {'content': chunk}
+                        }])
+                        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(chunk_ms / 1000)
+                    final = dict(base, object='chat.completion.chunk', choices=[], usage=usage)
+                    self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    # Geração cancelada: o cliente fechou o stream
+                    pass
+
+        self.calls = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Session:
+    def __init__(self, session_id, user_id, client):
+        self.id = session_id
+        self.user_id = user_id
+        self.client = client
+        self.lock = threading.Lock()
+        self.last_upload = None
+        # Operações Socket.IO aguardando resposta da IA, por tipo
+        self.pending = {'message': deque(), 'analyze_file': deque()}
+
+
+class Replayer:
+    def __init__(self, app, socketio, speed, concurrency, seed=0):
+        self.app = app
+        self.socketio = socketio
+        self.speed = speed
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay')
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.results = defaultdict(lambda: {'latencies': [], 'errors': 0, 'cancelled': 0})
+        self.results_lock = threading.Lock()
+        self.outstanding = 0
+        self.stopped = threading.Event()
+        self.collector = threading.Thread(target=self._collect, name='replay-collector', daemon=True)
+
+    # Resultados
+
+    def _done(self, kind, started=None, error=False, cancelled=False):
+        with self.results_lock:
+            result = self.results[kind]
+            if cancelled:
+                result['cancelled'] += 1
+            elif error:
+                result['errors'] += 1
+            else:
+                result['latencies'].append((time.perf_counter() - started) * 1000)
+
+    def _settle(self, session, kind, **outcome):
+        with session.lock:
+            if not session.pending[kind]:
+                return
+            _, started = session.pending[kind].popleft()
+        with self.results_lock:
+            self.outstanding -= 1
+        self._done(kind, started, **outcome)
+
+    # Sessões
+
+    def _text(self, size):
+        with self.rng_lock:
+            return synthetic_text(size, self.rng)
+
+    def _create_session(self, key, user, measured):
+        started = time.perf_counter()
+        response = self.app.test_client().post('/api/chat/sessions', json={'user_id': user or f"replay_{key}"})
+        if measured:
+            self._done('create_session', started, error=response.status_code != 200)
+        if response.status_code != 200:
+            return None
+        body = response.get_json()
+        client = self.socketio.test_client(self.app, auth={'session_id': body['session']['id']})
+        return _Session(body['session']['id'], body['session']['user_id'], client)
+
+    def _session_for(self, event):
+        key = event.get('session') or 'anonymous'
+        with self.sessions_lock:
+            session = self.sessions.get(key)
+            if session is None and event['kind'] != 'create_session':
+                # Gravação começou no meio da sessão: criada sem medir
+                session = self.sessions[key] = self._create_session(key, event.get('user'), measured=False)
+        return session
+
+    # Eventos
+
+    def _upload(self, session, event, measured=True):
+        ext = event.get('ext') or '.txt'
+        size = max(event.get('request_size') or 2048, 16)
+        if ext in TEXT_EXTENSIONS:
+            content = self._text(size).encode('utf-8')
+        else:
+            with self.rng_lock:
+                content = self.rng.randbytes(size)
+        started = time.perf_counter()
+        response = self.app.test_client().post(
+            f"/api/chat/sessions/{session.id}/upload",
+            data={'file': (BytesIO(content), f"replay{ext}")},
+            content_type='multipart/form-data'
+        )
+        if measured:
+            self._done('upload', started, error=response.status_code != 200)
+        if response.status_code == 200:
+            session.last_upload = response.get_json()['message']
+
+    def _run(self, event):
+        kind = event['kind']
+        if kind == 'create_session':
+            key = event.get('session') or 'anonymous'
+            session = self._create_session(key, event.get('user'), measured=True)
+            with self.sessions_lock:
+                self.sessions.setdefault(key, session)
+            return
+
+        session = self._session_for(event)
+        if session is None:
+            self._done(kind, error=True)
+            return
+
+        if kind in ('history', 'archive'):
+            suffix = 'messages' if kind == 'history' else 'archive'
+            params = {}
+            if event.get('per_page'):
+                params['per_page'] = event['per_page']
+            if event.get('page'):
+                params['page'] = event['page']
+            if event.get('before'):
+                params['before'] = 1 << 30
+            if event.get('fields'):
+                params['fields'] = ','.join(('id', 'content', 'sender', 'timestamp', 'seq')[:event['fields']])
+            started = time.perf_counter()
+            response = self.app.test_client().get(f"/api/chat/sessions/{session.id}/{suffix}", query_string=params)
+            self._done(kind, started, error=response.status_code != 200)
+        elif kind == 'upload':
+            self._upload(session, event)
+        elif kind in SOCKET_KINDS:
+            data = {'session_id': session.id, 'user_id': session.user_id}
+            if kind == 'message':
+                data['content'] = self._text(event.get('size') or 80)
+            else:
+                if session.last_upload is None:
+                    self._upload(session, {'ext': event.get('ext')}, measured=False)
+                if session.last_upload is None:
+                    self._done(kind, error=True)
+                    return
+                # Caminho no disco (como o servidor resolve o upload), para exercitar a extração
+                stored_name = os.path.basename(session.last_upload['file_url'])
+                data.update(file_path=os.path.join(self.app.config['UPLOAD_FOLDER'], session.id, stored_name),
+                            file_name=session.last_upload['file_name'])
+            with session.lock:
+                started = time.perf_counter()
+                ack = session.client.emit(kind, data, callback=True)
+                job_id = ack.get('job_id') if isinstance(ack, dict) else None
+                session.pending[kind].append((job_id, started))
+            with self.results_lock:
+                self.outstanding += 1
+
+    def _collect(self):
+        # Respostas da IA chegam aos clientes de teste pelas salas das sessões
+        while not self.stopped.is_set():
+            with self.sessions_lock:
+                sessions = [session for session in self.sessions.values() if session is not None]
+            for session in sessions:
+                with session.lock:
+                    received = session.client.get_received()
+                for packet in received:
+                    args = packet['args']
+                    payload = args[0] if isinstance(args, list) and args else args
+                    if isinstance(payload, str):
+                        payload = json.loads(payload)
+                    self._handle_packet(session, packet['name'], payload)
+            time.sleep(0.002)
+
+    def _handle_packet(self, session, name, payload):
+        if name == 'message' and isinstance(payload, dict) and payload.get('sender') == 'ai':
+            self._settle(session, 'message' if payload.get('reply_to') else 'analyze_file')
+        elif name == 'cancelled' and isinstance(payload, dict):
+            job_id = payload.get('job_id')
+            for kind, pending in session.pending.items():
+                with session.lock:
+                    match = next((item for item in pending if item[0] == job_id), None)
+                    if match is None:
+                        continue
+                    pending.remove(match)
+                with self.results_lock:
+                    self.outstanding -= 1
+                self._done(kind, cancelled=True)
+                return
+        elif name == 'error':
+            # Erro vai para o job mais antigo da sessão
+            kind = 'message' if session.pending['message'] else 'analyze_file'
+            self._settle(session, kind, error=True)
+
+    def run(self, events, timeout):
+        self.collector.start()
+        started = time.perf_counter()
+        first = events[0]['t'] if events else 0
+        for event in events:
+            delay = (event['t'] - first) / self.speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            self.executor.submit(self._run, event).add_done_callback(self._report_failure)
+        self.executor.shutdown(wait=True)
+
+        deadline = time.perf_counter() + timeout
+        while self.outstanding > 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        self.stopped.set()
+        self.collector.join()
+
+        for session in self.sessions.values():
+            if session is None:
+                continue
+            for kind, pending in session.pending.items():
+                for _ in pending:
+                    self._done(kind, error=True)  # sem resposta dentro do timeout
+            session.client.disconnect()
+        return elapsed
+
+    def _report_failure(self, future):
+        if future.exception() is not None:
+            logging.getLogger(__name__).error(f"Erro no replay: {future.exception()}")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(results, elapsed):
+    kinds = {}
+    completed = 0
+    for kind, result in sorted(results.items()):
+        latencies = result['latencies']
+        completed += len(latencies)
+        summary = {'ok': len(latencies), 'errors': result['errors'], 'cancelled': result['cancelled']}
+        if latencies:
+            summary.update({f"p{pct}": round(percentile(latencies, pct), 2) for pct in PERCENTILES})
+            summary['mean'] = round(statistics.fmean(latencies), 2)
+            summary['max'] = round(max(latencies), 2)
+        kinds[kind] = summary
+    return {'elapsed_s': round(elapsed, 3), 'throughput': round(completed / elapsed, 2) if elapsed else 0,
+            'kinds': kinds}
+
+
+def print_report(report):
+    print(f"duração {report['elapsed_s']:.1f} s   vazão {report['throughput']:.1f} op/s   (speed {report['speed']}x)")
+    print(f"{'tipo':<15}{'ok':>7}{'erros':>7}{'cancel.':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for kind, summary in report['kinds'].items():
+        cells = ''.join(f"{summary[key]:>10.1f}" if key in summary else f"{'-':>10}"
+                        for key in ('p50', 'p90', 'p99', 'max'))
+        print(f"{kind:<15}{summary['ok']:>7}{summary['errors']:>7}{summary['cancelled']:>8}{cells}")
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """
+    Lista as regressões em relação à baseline (vazia se não houver).
+    """
+    if baseline.get('speed') != report['speed'] or baseline.get('events') != report['events']:
+        print("⚠️ Baseline gravada com outra gravação ou outro --speed; comparação aproximada")
+    regressions = []
+    if report['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(f"vazão {report['throughput']:.1f} op/s < baseline {baseline['throughput']:.1f} op/s")
+    for kind, summary in report['kinds'].items():
+        base = baseline['kinds'].get(kind)
+        if not base:
+            continue
+        for pct in PERCENTILES:
+            key = f"p{pct}"
+            if key not in summary or key not in base or min(summary['ok'], base['ok']) < MIN_SAMPLES[pct]:
+                continue
+            current, previous = summary[key], base[key]
+            if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                regressions.append(f"{kind} {key}: {current:.1f} ms > baseline {previous:.1f} ms")
+        if summary['errors'] > base['errors']:
+            regressions.append(f"{kind}: {summary['errors']} erro(s) (baseline {base['errors']})")
+    return regressions
+
+
+def start_app(workdir, upstream):
+    """
+    Cria o app com banco/uploads em `workdir` e a OpenAI apontando para o servidor falso.
+    """
+    os.environ.update({
+        'OPENAI_API_KEY': 'replay',
+        'OPENAI_BASE_URL': upstream.url,
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'TRAFFIC_RECORD_PATH': '',
+        'RETENTION_ENABLED': 'False'
+    })
+    from src.main import create_app, socketio
+    return create_app(), socketio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay do tráfego gravado contra uma instância local")
+    parser.add_argument("recording", help="arquivo gravado com TRAFFIC_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="aceleração do tempo (1, 10, 100...)")
+    parser.add_argument("--limit", type=int, help="reenviar só os primeiros N eventos")
+    parser.add_argument("--concurrency", type=int, default=64, help="requisições simultâneas no máximo")
+    parser.add_argument("--upstream-ms", type=float, default=300, help="latência falsa da IA até o primeiro token")
+    parser.add_argument("--reply-chars", type=int, default=1200, help="tamanho das respostas falsas da IA")
+    parser.add_argument("--timeout", type=float, default=60, help="espera pelas respostas após o último evento")
+    parser.add_argument("--save-baseline", help="grava o resultado como baseline")
+    parser.add_argument("--baseline", help="compara com uma baseline gravada")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora relativa tolerada (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=10, help="piora absoluta mínima para contar")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    header, events = load_recording(args.recording)
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        print("Gravação sem eventos")
+        return 1
+
+    workdir = tempfile.mkdtemp(prefix='ai-vice-replay-')
+    upstream = FakeUpstream(args.upstream_ms, args.reply_chars)
+    try:
+        app, socketio = start_app(workdir, upstream)
+        replayer = Replayer(app, socketio, args.speed, args.concurrency)
+        elapsed = replayer.run(events, args.timeout)
+        report = summarize(replayer.results, elapsed)
+        report.update(speed=args.speed, events=len(events), upstream_calls=upstream.calls,
+                      recorded_at=header.get('started_at'))
+    finally:
+        upstream.close()
+        from src.main import cpu_pool
+        cpu_pool.shutdown(wait=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"Baseline gravada em {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as stored:
+            regressions = compare(report, json.load(stored), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            return 1
+        print("✅ Sem regressões em relação à baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
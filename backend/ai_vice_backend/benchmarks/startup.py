@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inicialização a frio do backend.
+
+Cada rodada usa um processo Python novo e mede:
+
+- import: `import src.main` (deve ser barato: nada é criado no import);
+- create_app: `create_app()` (dotenv, pool de CPU, banco, tarefas de fundo).
+
+Uso (a partir de backend/ai_vice_backend):
+
+    python benchmarks/startup.py                 # 10 rodadas
+    python benchmarks/startup.py --runs 20 --max-import-ms 400
+    python benchmarks/startup.py --profile       # módulos mais caros no import
+
+Com `--max-import-ms`/`--max-boot-ms`, termina com código 1 se a mediana
+passar do limite (para uso em CI).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado no processo filho. O pool de CPU é encerrado antes de sair (seus
+# processos herdam o stdout); os._exit evita esperar as threads de fundo.
+CHILD_SCRIPT = """
+import json, os, sys, time
+sys.path.insert(0, {backend_dir!r})
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+src.main.create_app()
+booted = time.perf_counter()
+src.main.cpu_pool.shutdown(wait=True)
+print(json.dumps({{"import_ms": (imported - started) * 1000, "boot_ms": (booted - imported) * 1000}}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(backend_dir=BACKEND_DIR)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def profile_imports(top: int):
+    """
+    Mostra os módulos com maior tempo acumulado de import (`-X importtime`).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    print(f"{'acumulado ms':>13} {'próprio ms':>11}  módulo")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:11.1f}  {name}")
+
+
+def summarize(label: str, values) -> str:
+    return (f"{label:<11} mediana {statistics.median(values):7.1f} ms   "
+            f"mín {min(values):7.1f} ms   máx {max(values):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização do backend")
+    parser.add_argument("--runs", type=int, default=10, help="número de processos medidos")
+    parser.add_argument("--max-import-ms", type=float, help="falha se a mediana do import passar disso")
+    parser.add_argument("--max-boot-ms", type=float, help="falha se a mediana do create_app passar disso")
+    parser.add_argument("--profile", action="store_true", help="lista os imports mais caros")
+    parser.add_argument("--top", type=int, default=20, help="linhas exibidas com --profile")
+    args = parser.parse_args()
+
+    if args.profile:
+        profile_imports(args.top)
+        return 0
+
+    # Primeira rodada descartada: cria o banco/schema e aquece o cache do sistema de arquivos
+    run_once()
+    samples = [run_once() for _ in range(args.runs)]
+    imports = [sample["import_ms"] for sample in samples]
+    boots = [sample["boot_ms"] for sample in samples]
+
+    print(f"{args.runs} rodada(s) em {BACKEND_DIR}")
+    print(summarize("import", imports))
+    print(summarize("create_app", boots))
+    print(summarize("total", [i + b for i, b in zip(imports, boots)]))
+
+    failed = False
+    if args.max_import_ms is not None and statistics.median(imports) > args.max_import_ms:
+        print(f"❌ import acima de {args.max_import_ms} ms")
+        failed = True
+    if args.max_boot_ms is not None and statistics.median(boots) > args.max_boot_ms:
+        print(f"❌ create_app acima de {args.max_boot_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
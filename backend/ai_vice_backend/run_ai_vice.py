@@ -6,15 +6,11 @@ Script principal para executar o servidor Flask/SocketIO
 
 import os
 import sys
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente
-load_dotenv()
 
 # Adicionar src ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.main import app, socketio
+from src.main import create_app, socketio
 import logging
 
 # Configurar logging
@@ -45,6 +41,8 @@ def main():
     """)
     
     try:
+        # Carrega o .env e inicializa os serviços (após o logging estar configurado)
+        app = create_app()
         host = os.getenv('HOST', '0.0.0.0')
         port = int(os.getenv('PORT', 5000))
         debug = os.getenv('DEBUG', 'False').lower() == 'true'
@@ -1,48 +1,173 @@
 import os
 import sys
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente
-load_dotenv()
 
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, request
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from src.models.user import db
 from src.models.message import Message, ChatSession
+from src.models.migrations import SCHEMA_VERSION, schema_version, upgrade_schema
+from src.services.search import init_search
+from src.services import compression
+from src.services.static_files import StaticManifest
+from src.services.uploads import send_upload
+from src.services.serialization import FastJSONProvider, SocketIOJSON, json_backend
 from src.routes.user import user_bp
-from src.routes.chat import chat_bp, handle_connect, handle_disconnect, handle_message, handle_file_analysis
+from src.routes.admin import admin_bp
+from src.routes.chat import (
+    chat_bp, ai_service, cpu_pool, job_manager, room_emitter, retention_service, shard_router, admission,
+    fair_scheduler, traffic_recorder, lazy_sessions, handle_connect, handle_disconnect, handle_cancel, handle_message, handle_file_analysis,
+    fair_share_key, message_cost
+)
+from src.services.fair_share import FILE_ANALYSIS_TOKENS_ESTIMATE
+from functools import partial
 import logging
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+# SocketIO ligado ao app em create_app (payloads de mensagens chegam pré-codificados)
+socketio = SocketIO()
+
+
+def create_app():
+    """
+    Cria e configura o app. Importar este módulo não faz trabalho: variáveis
+    de ambiente, pool de processos, banco e tarefas de fundo são iniciados
+    aqui, uma vez por processo.
+    """
+    from dotenv import load_dotenv
+
+    # Carregar variáveis de ambiente
+    load_dotenv()
+
+    # Configurar logging (sem efeito se o script de entrada já configurou)
+    logging.basicConfig(level=logging.INFO)
+
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configurações
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'uploads'))
+    # Delegar o envio de uploads ao proxy (nginx/Apache) via X-Sendfile
+    app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+    app.config['JSON_COMPRESS_MIN_SIZE'] = int(os.getenv('JSON_COMPRESS_MIN_SIZE', 2048))
+    # Atualizar o schema no boot (desativar quando `flask migrate-db` roda no deploy)
+    app.config['AUTO_MIGRATE'] = os.getenv('AUTO_MIGRATE', 'True').lower() == 'true'
+    # Rotas de diagnóstico em /api/admin (desativadas sem token)
+    app.config['ADMIN_TOKEN'] = os.getenv('ADMIN_TOKEN', '')
+    app.config['PROFILER_MAX_SECONDS'] = int(os.getenv('PROFILER_MAX_SECONDS', 60))
+    # Mensagens a partir deste tamanho (bytes) são gravadas comprimidas
+    app.config['CONTENT_COMPRESS_MIN_SIZE'] = int(os.getenv('CONTENT_COMPRESS_MIN_SIZE', 512))
+
+    # Pool de processos para trabalho de CPU (criado antes das threads do servidor)
+    if os.getenv('CPU_POOL_WORKERS'):
+        app.config['CPU_POOL_WORKERS'] = int(os.getenv('CPU_POOL_WORKERS'))
+    app.config['CPU_POOL_MAX_PENDING'] = int(os.getenv('CPU_POOL_MAX_PENDING', 32))
+    cpu_pool.init_app(app)
+
+    # Serialização JSON (usa orjson quando instalado)
+    app.json = FastJSONProvider(app)
 
-# Configurações
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Configurar CORS para permitir conexões do GitHub Pages
+    cors_origins = os.getenv('CORS_ORIGINS', 'https://llucs.github.io').split(',')
+    CORS(app, origins=cors_origins)
 
-# Configurar CORS para permitir conexões do GitHub Pages
-cors_origins = os.getenv('CORS_ORIGINS', 'https://llucs.github.io').split(',')
-CORS(app, origins=cors_origins)
+    # Janela de micro-lote por sala (0 = desativado; requer frontend com suporte a 'batch')
+    app.config['SOCKETIO_BATCH_WINDOW_MS'] = int(os.getenv('SOCKETIO_BATCH_WINDOW_MS', 0))
+
+    # Inicializar SocketIO
+    socketio.init_app(app, cors_allowed_origins=cors_origins, async_mode='threading', json=SocketIOJSON)
+    room_emitter.init_app(app, socketio)
+    job_manager.init_app(app, socketio)
+
+    # Shards de sessão: fila de jobs, caches e escritor próprios por shard
+    app.config['SHARD_COUNT'] = int(os.getenv('SHARD_COUNT', 4))
+    app.config['SHARD_WORKERS'] = int(os.getenv('SHARD_WORKERS', 8))
+    app.config['SHARD_SESSION_CONCURRENCY'] = int(os.getenv('SHARD_SESSION_CONCURRENCY', 2))
+    # Vários processos/máquinas: URLs de todos os nós e a deste nó
+    app.config['SHARD_NODES'] = os.getenv('SHARD_NODES', '')
+    app.config['SHARD_NODE_ID'] = os.getenv('SHARD_NODE_ID', '')
+    shard_router.init_app(app)
+
+    # Sessões criadas só em memória até a primeira mensagem/upload (limite de pendentes)
+    app.config['LAZY_SESSIONS_MAX_PENDING'] = int(os.getenv('LAZY_SESSIONS_MAX_PENDING', 100000))
+    lazy_sessions.init_app(app)
+
+    # Registrar blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    _register_routes(app)
+
+    # Inicializar banco de dados (create_all e migrações só com o schema desatualizado)
+    os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
+    db.init_app(app)
+    compression.configure(app.config['CONTENT_COMPRESS_MIN_SIZE'])
+    with app.app_context():
+        if app.config['AUTO_MIGRATE']:
+            upgrade_schema(db)
+        elif schema_version(db.engine) < SCHEMA_VERSION:
+            logger.warning("Schema do banco desatualizado: execute `flask --app src.main:create_app migrate-db`")
+        init_search(db.engine)
+        compression.init_compression(db.engine)
+
+    @app.cli.command('migrate-db')
+    def migrate_db():
+        """Atualiza o schema do banco para a versão atual."""
+        with app.app_context():
+            if not upgrade_schema(db):
+                logger.info(f"Schema já está na versão {SCHEMA_VERSION}")
+
+    @app.cli.command('train-content-dict')
+    def train_content_dict():
+        """Treina um dicionário de compressão com as mensagens recentes."""
+        with app.app_context(), db.engine.begin() as connection:
+            dict_id = compression.train_dictionary(connection)
+        if dict_id is None:
+            logger.info("Mensagens insuficientes para treinar um dicionário (ou banco não é SQLite)")
+        else:
+            logger.info(f"Dicionário {dict_id} ativo para novas mensagens")
 
-# Inicializar SocketIO
-socketio = SocketIO(app, cors_allowed_origins=cors_origins, async_mode='threading')
+    # Retenção: sessões ociosas inativadas e mensagens antigas arquivadas (opt-in)
+    app.config['RETENTION_IDLE_DAYS'] = int(os.getenv('RETENTION_IDLE_DAYS', 7))
+    app.config['RETENTION_ARCHIVE_DAYS'] = int(os.getenv('RETENTION_ARCHIVE_DAYS', 30))
+    retention_service.init_app(app, socketio)
+    if os.getenv('RETENTION_ENABLED', 'False').lower() == 'true':
+        retention_service.start()
 
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    # Controle de admissão: modo degradado por fila de jobs ou latência da IA
+    app.config['ADMISSION_MAX_ACTIVE_JOBS'] = int(os.getenv('ADMISSION_MAX_ACTIVE_JOBS', 16))
+    app.config['ADMISSION_MAX_LATENCY_MS'] = int(os.getenv('ADMISSION_MAX_LATENCY_MS', 20000))
+    admission.init_app(app, socketio)
+    admission.start()
 
-# Inicializar banco de dados
-db.init_app(app)
-with app.app_context():
-    db.create_all()
+    # Fila justa da IA: vagas no provedor, limites por usuário e pesos por plano
+    app.config['FAIR_MAX_CONCURRENT'] = int(os.getenv('FAIR_MAX_CONCURRENT', 8))
+    app.config['FAIR_USER_MAX_CONCURRENT'] = int(os.getenv('FAIR_USER_MAX_CONCURRENT', 2))
+    app.config['FAIR_USER_TOKENS_PER_MINUTE'] = int(os.getenv('FAIR_USER_TOKENS_PER_MINUTE', 20000))
+    app.config['FAIR_INTERACTIVE_WAIT_MS'] = int(os.getenv('FAIR_INTERACTIVE_WAIT_MS', 2000))
+    app.config['FAIR_TIER_WEIGHTS'] = os.getenv('FAIR_TIER_WEIGHTS', 'free:1,pro:4')
+    app.config['FAIR_USER_TIERS'] = os.getenv('FAIR_USER_TIERS', '')
+    fair_scheduler.init_app(app)
+
+    # Gravação anonimizada do tráfego para o benchmark de replay (desativada sem caminho)
+    app.config['TRAFFIC_RECORD_PATH'] = os.getenv('TRAFFIC_RECORD_PATH', '')
+    app.config['TRAFFIC_RECORD_SAMPLE'] = float(os.getenv('TRAFFIC_RECORD_SAMPLE', 1.0))
+    app.config['TRAFFIC_RECORD_MAX_EVENTS'] = int(os.getenv('TRAFFIC_RECORD_MAX_EVENTS', 100000))
+    app.config['TRAFFIC_RECORD_SALT'] = os.getenv('TRAFFIC_RECORD_SALT', '')
+    traffic_recorder.init_app(app)
+
+    # Cliente da OpenAI criado em segundo plano, fora do caminho do boot
+    socketio.start_background_task(ai_service.warm_up)
+
+    return app
 
 # Eventos WebSocket
 @socketio.on('connect')
@@ -58,42 +183,97 @@ def on_disconnect():
 @socketio.on('message')
 def on_message(data):
     logger.info(f"Mensagem recebida: {data}")
-    socketio.start_background_task(handle_message, data)
+    traffic_recorder.record_event('message', data)
+    session_id = data.get('session_id')
+    content = data.get('content', '').strip()
+    # Sob sobrecarga, mensagens curtas e conversacionais têm resposta local
+    # imediata, sem passar pela fila justa da IA
+    local_reply = admission.local_reply(content) if session_id and content else None
+    if local_reply is not None:
+        handler, fair_key = partial(handle_message, local_reply=local_reply), None
+    else:
+        handler, fair_key = handle_message, fair_share_key(session_id) if session_id else None
+    # Nova mensagem substitui a geração ainda em andamento na mesma sessão
+    job = job_manager.submit(request.sid, session_id, 'message', handler, data, supersede=True,
+                             fair_key=fair_key, cost=message_cost(content))
+    return {'job_id': job.id}
 
 @socketio.on('analyze_file')
 def on_analyze_file(data):
     logger.info(f"Análise de arquivo solicitada: {data}")
-    socketio.start_background_task(handle_file_analysis, data)
-
-# Rota para servir arquivos estáticos (frontend)
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    traffic_recorder.record_event('analyze_file', data)
+    sid = request.sid
+    session_id = data.get('session_id')
+    fair_key = fair_share_key(session_id) if session_id else None
+    submit = lambda: job_manager.submit(sid, session_id, 'analyze_file', handle_file_analysis, data,
+                                        fair_key=fair_key, cost=FILE_ANALYSIS_TOKENS_ESTIMATE)
+    # Em modo degradado, análises (baixa prioridade) esperam a carga normalizar
+    if admission.defer(submit):
+        return {'deferred': True}
+    return {'job_id': submit().id}
+
+@socketio.on('cancel')
+def on_cancel(data=None):
+    logger.info(f"Cancelamento solicitado: {data}")
+    return handle_cancel(data)
+
+def _register_routes(app):
+    # Manifesto dos arquivos estáticos (varrido uma vez na inicialização)
+    static_manifest = StaticManifest(app.static_folder)
+
+    # Rota para servir arquivos estáticos (frontend)
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if app.static_folder is None:
+            return "Static folder not configured", 404
+
+        entry = static_manifest.lookup(path)
+        if entry is None:
             return "Backend API está funcionando! Frontend será servido pelo GitHub Pages.", 200
 
-# Rota para servir uploads
-@app.route('/uploads/<session_id>/<filename>')
-def serve_upload(session_id, filename):
-    upload_dir = os.path.join(os.path.dirname(__file__), 'uploads', session_id)
-    return send_from_directory(upload_dir, filename)
+        return static_manifest.response(entry)
+
+    # Rota para servir uploads (Range, 304 e miniaturas via ?thumb=<tamanho>)
+    @app.route('/uploads/<session_id>/<filename>')
+    def serve_upload(session_id, filename):
+        thumb = request.args.get('thumb', type=int)
+        return send_upload(app.config['UPLOAD_FOLDER'], session_id, filename, thumb)
+
+    # Rota de health check
+    @app.route('/api/health')
+    def health_check():
+        return {
+            'status': 'healthy',
+            'service': 'AI Vice Backend',
+            'prompt_cache': ai_service.get_usage_stats(),
+            'emitter': room_emitter.get_stats(),
+            'cpu_pool': cpu_pool.get_stats(),
+            'shards': shard_router.get_stats(),
+            'sessions': lazy_sessions.get_stats(),
+            'admission': admission.get_stats(),
+            'fair_share': fair_scheduler.get_stats(),
+            'compression': compression.get_stats(),
+            'traffic_recorder': traffic_recorder.get_stats(),
+            'json_backend': json_backend()
+        }
+
+
+_app = None
+
+
+def __getattr__(name):
+    # `from src.main import app` cria o app sob demanda (compatibilidade)
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Rota de health check
-@app.route('/api/health')
-def health_check():
-    return {'status': 'healthy', 'service': 'AI Vice Backend'}
 
 if __name__ == '__main__':
+    app = create_app()
     host = os.getenv('HOST', '0.0.0.0')
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('DEBUG', 'True').lower() == 'true'
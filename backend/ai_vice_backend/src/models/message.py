@@ -1,27 +1,78 @@
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import uuid
+from sqlalchemy import and_, event, func, or_, select, update
+from src.models.user import db
+from src.services.serialization import EncodedJSON
+from src.services.compression import CompressedText
 
-db = SQLAlchemy()
+# Estados de resposta de uma mensagem do usuário
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_ANSWERED = 'answered'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Ordem determinística por sessão: histórico e paginação são range scans
+        db.Index('ix_messages_session_seq', 'session_id', 'seq', unique=True),
+        # Busca de pendências: uma única consulta indexada
+        db.Index('ix_messages_status_timestamp', 'status', 'timestamp'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = db.Column(db.String(36), nullable=False, index=True)
+    seq = db.Column(db.Integer, nullable=False)  # Sequência monotônica por sessão (atribuída no INSERT)
     user_id = db.Column(db.String(100), nullable=True)  # Para identificar usuários únicos
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(CompressedText, nullable=False)  # Comprimido/internado no banco, texto no ORM
     message_type = db.Column(db.String(20), nullable=False, default='text')  # text, file, image
     sender = db.Column(db.String(10), nullable=False)  # 'user' ou 'ai'
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     file_url = db.Column(db.String(500), nullable=True)  # Para arquivos anexados
     file_name = db.Column(db.String(255), nullable=True)
     file_size = db.Column(db.Integer, nullable=True)
+    status = db.Column(db.String(12), nullable=True)  # Apenas mensagens de texto do usuário
+    reply_to = db.Column(db.String(36), nullable=True, index=True)  # Mensagem respondida (respostas da IA)
+    claimed_at = db.Column(db.DateTime, nullable=True)  # Quando um worker assumiu a resposta
     
-    def to_dict(self):
+    # Campos expostos pela API (projeções devem ser subconjuntos destes)
+    SERIALIZED_FIELDS = (
+        'id', 'session_id', 'seq', 'user_id', 'content', 'message_type',
+        'sender', 'timestamp', 'file_url', 'file_name', 'file_size', 'reply_to'
+    )
+    
+    # Serialização em cache (não persistida): invalidada quando uma coluna muda
+    _encoded = None
+    
+    def to_dict(self, fields=None):
+        if fields is not None:
+            # Representação compacta: apenas os campos pedidos
+            return {field: self._field_value(field) for field in fields}
+        if self._encoded is not None:
+            return self._encoded.data
+        return self._build_dict()
+    
+    def _field_value(self, field):
+        if field == 'timestamp':
+            return self.timestamp.isoformat()
+        return getattr(self, field)
+    
+    def to_payload(self) -> EncodedJSON:
+        """Payload para Socket.IO, codificado em JSON uma única vez por mensagem"""
+        if self._encoded is None:
+            encoded = EncodedJSON(self._build_dict())
+            if self.id is None:
+                # Ainda não persistida: defaults (id, timestamp) virão no flush
+                return encoded
+            self._encoded = encoded
+        return self._encoded
+    
+    def _build_dict(self):
         return {
             'id': self.id,
             'session_id': self.session_id,
+            'seq': self.seq,
             'user_id': self.user_id,
             'content': self.content,
             'message_type': self.message_type,
@@ -29,11 +80,62 @@ class Message(db.Model):
             'timestamp': self.timestamp.isoformat(),
             'file_url': self.file_url,
             'file_name': self.file_name,
-            'file_size': self.file_size
+            'file_size': self.file_size,
+            'reply_to': self.reply_to
         }
+    
+    @classmethod
+    def claim(cls, message_id, stale_before=None) -> bool:
+        """
+        Assume atomicamente a resposta de uma mensagem pendente (ou de uma em
+        processamento cujo worker parou antes de `stale_before`). Apenas um
+        worker/processo consegue o claim; retorna se este foi o vencedor.
+        """
+        claimable = cls.status == STATUS_PENDING
+        if stale_before is not None:
+            claimable = or_(claimable, and_(cls.status == STATUS_PROCESSING,
+                                            cls.claimed_at < stale_before))
+        result = db.session.execute(
+            update(cls)
+            .where(cls.id == message_id, claimable)
+            .values(status=STATUS_PROCESSING, claimed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+@event.listens_for(Message, 'before_insert')
+def _before_insert(mapper, connection, target):
+    """
+    Mensagens de texto do usuário nascem pendentes de resposta.
+    
+    Atribui `seq` no próprio INSERT (MAX(seq) + 1 da sessão), de forma atômica
+    em relação a outras escritas; o índice único (session_id, seq) impede
+    duplicatas em bancos com escritores concorrentes.
+    """
+    if target.status is None and target.sender == 'user' and (target.message_type or 'text') == 'text':
+        target.status = STATUS_PENDING
+    if target.seq is None:
+        # Sessões com mensagens arquivadas continuam a partir do último seq arquivado
+        archived_seq = select(func.max(ArchiveSegment.last_seq))\
+            .where(ArchiveSegment.session_id == target.session_id)\
+            .scalar_subquery()
+        target.seq = select(func.coalesce(func.max(Message.seq), archived_seq, 0) + 1)\
+            .where(Message.session_id == target.session_id)\
+            .scalar_subquery()
+
+def _invalidate_encoded(target, value, oldvalue, initiator):
+    target._encoded = None
+
+for _column in Message.__table__.columns:
+    event.listen(getattr(Message, _column.key), 'set', _invalidate_encoded)
 
 class ChatSession(db.Model):
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        # Varredura de sessões ociosas pelo job de retenção
+        db.Index('ix_chat_sessions_active_activity', 'is_active', 'last_activity'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(100), nullable=True)
@@ -49,3 +151,62 @@ class ChatSession(db.Model):
             'last_activity': self.last_activity.isoformat(),
             'is_active': self.is_active
         }
+
+class ArchiveSegment(db.Model):
+    __tablename__ = 'archive_segments'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(36), nullable=False, index=True)
+    path = db.Column(db.String(500), nullable=False)  # Relativo à pasta de arquivo
+    message_count = db.Column(db.Integer, nullable=False)
+    first_seq = db.Column(db.Integer, nullable=False)
+    last_seq = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'message_count': self.message_count,
+            'first_seq': self.first_seq,
+            'last_seq': self.last_seq,
+            'created_at': self.created_at.isoformat()
+        }
+
+class MessageSearch(db.Model):
+    __tablename__ = 'message_search'
+    
+    # rowid estável (INTEGER PRIMARY KEY) usado como rowid do índice FTS5 `messages_fts`
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.String(36), nullable=False, unique=True)
+    session_id = db.Column(db.String(36), nullable=False, index=True)
+
+class DocumentChunk(db.Model):
+    __tablename__ = 'document_chunks'
+    __table_args__ = (
+        db.Index('ix_document_chunks_session_position', 'session_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(36), nullable=False)
+    message_id = db.Column(db.String(36), nullable=False)  # Mensagem do upload
+    file_name = db.Column(db.String(255), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # Ordem do trecho no arquivo
+    content = db.Column(db.Text, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)  # float32 normalizado (L2)
+
+class CompressionDictionary(db.Model):
+    __tablename__ = 'compression_dictionaries'
+    
+    # Imutável: o id vai no cabeçalho de cada conteúdo comprimido com ele
+    id = db.Column(db.Integer, primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)  # 'raw' (zlib/zstd) ou 'zstd' (treinado)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class InternedText(db.Model):
+    __tablename__ = 'interned_texts'
+    
+    # Textos repetidos (ex.: boas-vindas) gravados nas mensagens só pelo id
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text, nullable=False, unique=True)
@@ -0,0 +1,175 @@
+"""
+Migrações de schema para bancos SQLite já existentes.
+
+`db.create_all()` cria tabelas novas mas não altera as existentes; cada
+migração aqui é idempotente e verifica o schema antes de aplicar.
+
+`upgrade_schema` roda tudo isso uma única vez por versão: a versão aplicada
+fica em `PRAGMA user_version`, e um boot com o banco em dia faz só essa
+leitura em vez de inspecionar todas as tabelas.
+"""
+
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from src.services import compression
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def add_message_seq(connection):
+    """
+    Adiciona `messages.seq` e preenche a sequência por sessão na ordem de
+    `timestamp` (empates resolvidos pela ordem de inserção).
+    """
+    if 'seq' in _columns(connection, 'messages'):
+        return False
+
+    connection.execute(text("ALTER TABLE messages ADD COLUMN seq INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text("""
+        UPDATE messages SET seq = (
+            SELECT numbered.seq FROM (
+                SELECT rowid AS rid,
+                       ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY timestamp, rowid) AS seq
+                FROM messages
+            ) AS numbered
+            WHERE numbered.rid = messages.rowid
+        )
+    """))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_messages_session_seq ON messages (session_id, seq)"
+    ))
+    return True
+
+
+def add_message_reply_state(connection):
+    """
+    Adiciona o estado de resposta (`status`, `reply_to`, `claimed_at`).
+    Mensagens antigas de usuário são marcadas como respondidas para não
+    serem reprocessadas.
+    """
+    if 'status' in _columns(connection, 'messages'):
+        return False
+
+    connection.execute(text("ALTER TABLE messages ADD COLUMN status VARCHAR(12)"))
+    connection.execute(text("ALTER TABLE messages ADD COLUMN reply_to VARCHAR(36)"))
+    connection.execute(text("ALTER TABLE messages ADD COLUMN claimed_at DATETIME"))
+    connection.execute(text(
+        "UPDATE messages SET status = 'answered' WHERE sender = 'user' AND message_type = 'text'"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_status_timestamp ON messages (status, timestamp)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_reply_to ON messages (reply_to)"
+    ))
+    return True
+
+
+def add_session_activity_index(connection):
+    """
+    Índice usado pelo job de retenção para achar sessões ociosas.
+    """
+    indexes = {index['name'] for index in inspect(connection).get_indexes('chat_sessions')}
+    if 'ix_chat_sessions_active_activity' in indexes:
+        return False
+
+    connection.execute(text(
+        "CREATE INDEX ix_chat_sessions_active_activity ON chat_sessions (is_active, last_activity)"
+    ))
+    return True
+
+
+def add_message_search_index(connection):
+    """
+    Cria o índice FTS5 `messages_fts` e indexa as mensagens existentes.
+    O rowid do FTS é a chave de `message_search` (estável após VACUUM).
+    Sem suporte a FTS5 no SQLite, a busca fica desativada.
+    """
+    if connection.dialect.name != 'sqlite' or inspect(connection).has_table('messages_fts'):
+        return False
+
+    try:
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, file_name, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    except OperationalError as e:
+        logger.warning(f"FTS5 indisponível, busca desativada: {str(e)}")
+        return False
+
+    connection.execute(text(
+        "INSERT OR IGNORE INTO message_search (message_id, session_id) "
+        "SELECT id, session_id FROM messages ORDER BY session_id, seq"
+    ))
+    connection.execute(text(
+        "INSERT INTO messages_fts (rowid, content, file_name) "
+        "SELECT s.id, m.content, m.file_name FROM message_search s JOIN messages m ON m.id = s.message_id"
+    ))
+    return True
+
+
+def compress_message_content(connection):
+    """
+    Registra o dicionário inicial e os textos internados e regrava o
+    conteúdo das mensagens existentes em formato compacto (só SQLite).
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    compression.ensure_defaults(connection)
+    compression.load(connection)
+    return compression.compress_existing(connection) > 0
+
+
+# Incrementar ao adicionar modelos (tabelas) ou migrações
+SCHEMA_VERSION = 6
+
+MIGRATIONS = (
+    add_message_seq,
+    add_message_reply_state,
+    add_session_activity_index,
+    add_message_search_index,
+    compress_message_content,
+)
+
+
+def run_migrations(engine):
+    """
+    Aplica as migrações pendentes em uma única transação.
+    """
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            if migration(connection):
+                logger.info(f"Migração aplicada: {migration.__name__}")
+
+
+def schema_version(engine) -> int:
+    """
+    Versão de schema registrada no banco (0 em bancos novos ou não-SQLite).
+    """
+    if engine.dialect.name != 'sqlite':
+        return 0
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def upgrade_schema(db) -> bool:
+    """
+    Cria as tabelas e aplica as migrações se o banco estiver abaixo de
+    SCHEMA_VERSION. Retorna se houve atualização. Requer app context.
+    """
+    current = schema_version(db.engine)
+    if current >= SCHEMA_VERSION:
+        return False
+
+    db.create_all()
+    run_migrations(db.engine)
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(f"Schema atualizado da versão {current} para {SCHEMA_VERSION}")
+    return True
@@ -0,0 +1,92 @@
+import hmac
+import logging
+from flask import Blueprint, Response, current_app, jsonify, request
+from src.models.message import ChatSession, Message
+from src.routes.chat import active_sessions, job_manager, shard_router
+from src.services.profiling import CPUProfiler, MemoryProfiler, object_counts, thread_dump
+from src.services.serialization import EncodedJSON
+
+logger = logging.getLogger(__name__)
+
+admin_bp = Blueprint('admin', __name__)
+memory_profiler = MemoryProfiler()
+cpu_profiler = CPUProfiler()
+
+GROUP_BY_OPTIONS = ('lineno', 'filename', 'traceback')
+
+@admin_bp.before_request
+def require_admin_token():
+    """Rotas de admin só existem com ADMIN_TOKEN configurado e exigem o token"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'success': False, 'error': 'Não encontrado'}), 404
+    provided = request.headers.get('Authorization', '')
+    provided = provided[7:] if provided.startswith('Bearer ') else request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), token.encode('utf-8')):
+        logger.warning(f"Acesso negado a {request.path} de {request.remote_addr}")
+        return jsonify({'success': False, 'error': 'Não autorizado'}), 401
+
+@admin_bp.route('/memory/snapshot', methods=['POST'])
+def memory_snapshot():
+    """Maiores alocações (tracemalloc) e diferença para o snapshot anterior"""
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUP_BY_OPTIONS:
+        return jsonify({'success': False, 'error': f"group_by deve ser um de: {', '.join(GROUP_BY_OPTIONS)}"}), 400
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    frames = min(request.args.get('frames', 10, type=int), 50)
+    return jsonify({'success': True, **memory_profiler.snapshot(limit, group_by, frames)})
+
+@admin_bp.route('/memory', methods=['DELETE'])
+def memory_stop():
+    """Desligar o tracemalloc"""
+    return jsonify({'success': True, 'stopped': memory_profiler.stop()})
+
+@admin_bp.route('/cpu/profile', methods=['POST'])
+def cpu_profile():
+    """Amostrar as pilhas por N segundos (collapsed stacks para flamegraph)"""
+    seconds = request.args.get('seconds', 10, type=float)
+    max_seconds = current_app.config['PROFILER_MAX_SECONDS']
+    if not 0 < seconds <= max_seconds:
+        return jsonify({'success': False, 'error': f"seconds deve estar entre 0 e {max_seconds}"}), 400
+    interval = max(request.args.get('interval_ms', 10, type=float), 1) / 1000
+    include_idle = request.args.get('idle', 'false').lower() == 'true'
+
+    logger.info(f"Perfil de CPU por {seconds}s solicitado")
+    collapsed = cpu_profiler.profile(seconds, interval, include_idle, request.args.get('thread'))
+    if collapsed is None:
+        return jsonify({'success': False, 'error': 'Outro perfil de CPU em andamento'}), 409
+    return Response(collapsed, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename="cpu.collapsed"'})
+
+@admin_bp.route('/threads', methods=['GET'])
+def threads():
+    """Pilha atual de cada thread (tarefas de fundo, workers dos shards)"""
+    dump = thread_dump()
+    if request.args.get('format') == 'text':
+        text = "\n".join(f"--- {thread['name']} (daemon={thread['daemon']})\n{''.join(thread['stack'])}"
+                         for thread in dump)
+        return Response(text, mimetype='text/plain')
+    return jsonify({'success': True, 'count': len(dump), 'threads': dump})
+
+@admin_bp.route('/objects', methods=['GET'])
+def objects():
+    """Contagem de objetos vivos e tamanho das estruturas por sessão"""
+    limit = min(request.args.get('limit', 30, type=int), 500)
+    counts = object_counts(limit, tracked=(Message, ChatSession, EncodedJSON))
+    shards = {
+        name: {
+            'replay_sessions': len(shard.replay.session_ids()),
+            'document_sessions': len(shard.documents.session_ids()),
+            'sessions': len(shard.session_ids())
+        }
+        for name, shard in list(shard_router.shards.items())
+    }
+    return jsonify({
+        'success': True,
+        **counts,
+        'sessions': {
+            'active_sessions': len(active_sessions),
+            'active_jobs': job_manager.count(),
+            'shards': shards
+        }
+    })
@@ -1,8 +1,28 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_socketio import emit, join_room, leave_room
-from src.models.message import db, Message, ChatSession
-from src.services.ai_service import AIService
+from werkzeug.security import safe_join
+from src.models.message import (
+    db, Message, ChatSession, STATUS_ANSWERED, STATUS_CANCELLED, STATUS_FAILED, STATUS_PROCESSING
+)
+from src.services.admission import AdmissionController
+from src.services.ai_service import AIService, GenerationCancelled
+from src.services.emitter import RoomEmitter
+from src.services.fair_share import (
+    CONTEXT_TOKENS_ESTIMATE, FILE_ANALYSIS_TOKENS_ESTIMATE, RESPONSE_TOKENS_ESTIMATE, FairShareScheduler,
+    estimate_tokens
+)
+from src.services.jobs import JobManager
+from src.services.retention import RetentionService
+from src.services.sessions import LazySessions
+from src.services.sharding import ShardRouter
+from src.services.traffic import TrafficRecorder
+from src.services.workers import CPUPool
+from src.services import cpu_tasks
+from src.services import search
+from src.services.serialization import json_response
 from datetime import datetime
+import asyncio
+import time
 import uuid
 import os
 import logging
@@ -10,37 +30,54 @@ import logging
 logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
-ai_service = AIService()
+cpu_pool = CPUPool()
+ai_service = AIService(cpu_pool)
+room_emitter = RoomEmitter()
+shard_router = ShardRouter()
+fair_scheduler = FairShareScheduler()
+job_manager = JobManager(emitter=room_emitter, router=shard_router, scheduler=fair_scheduler)
+retention_service = RetentionService(router=shard_router)
+admission = AdmissionController(job_manager=job_manager)
+traffic_recorder = TrafficRecorder()
+lazy_sessions = LazySessions()
+
+# Máximo de mensagens reenviadas no delta-sync antes de pedir recarga completa
+SYNC_MAX_MESSAGES = 100
+
+# Mensagens do histórico enviadas à IA (incluindo a nova)
+HISTORY_SIZE = 10
 
 # Armazenar sessões ativas
 active_sessions = {}
 
+@chat_bp.before_request
+def route_to_owner_node():
+    """
+    Com vários nós, rotas de uma sessão só são atendidas pelo nó dono (buffer
+    de replay e índice de documentos vivem lá); as demais são redirecionadas
+    """
+    session_id = (request.view_args or {}).get('session_id')
+    if not session_id or request.endpoint == 'chat.get_session_shard' or shard_router.is_local(session_id):
+        return None
+    owner = shard_router.owner_node(session_id)
+    response = jsonify({'success': False, 'error': 'Sessão atendida por outro nó', 'node': owner})
+    response.status_code = 307
+    response.headers['Location'] = owner.rstrip('/') + request.full_path.rstrip('?')
+    return response
+
 @chat_bp.route('/sessions', methods=['POST'])
 def create_session():
-    """Criar nova sessão de chat"""
+    """Criar nova sessão de chat (gravada só na primeira mensagem ou upload)"""
     try:
         data = request.get_json() or {}
         user_id = data.get('user_id', f"user_{uuid.uuid4().hex[:8]}")
         
-        session = ChatSession(user_id=user_id)
-        db.session.add(session)
-        db.session.commit()
-        
-        # Adicionar mensagem de boas-vindas
-        welcome_msg = Message(
-            session_id=session.id,
-            user_id=user_id,
-            content=ai_service.get_welcome_message(),
-            sender='ai',
-            message_type='text'
-        )
-        db.session.add(welcome_msg)
-        db.session.commit()
+        session, welcome_message = lazy_sessions.issue(user_id, is_local=shard_router.is_local)
         
         return jsonify({
             'success': True,
-            'session': session.to_dict(),
-            'welcome_message': welcome_msg.to_dict()
+            'session': session,
+            'welcome_message': welcome_message
         })
         
     except Exception as e:
@@ -54,13 +91,39 @@ def get_messages(session_id):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         
+        # Projeção opcional de campos (?fields=id,content,sender,timestamp)
+        fields = request.args.get('fields')
+        if fields:
+            fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+            invalid = [f for f in fields if f not in Message.SERIALIZED_FIELDS]
+            if invalid:
+                return jsonify({'success': False, 'error': f"Campos inválidos: {', '.join(invalid)}"}), 400
+        else:
+            fields = None
+        
+        # Paginação por cursor (?before=<seq>): range scan no índice, sem COUNT(*)
+        before = request.args.get('before', type=int)
+        if before is not None:
+            items = Message.query.filter(Message.session_id == session_id, Message.seq < before)\
+                                 .order_by(Message.seq.desc())\
+                                 .limit(per_page + 1).all()
+            return json_response({
+                'success': True,
+                'messages': [msg.to_dict(fields) for msg in reversed(items[:per_page])] or _pending_page(session_id, fields),
+                'has_more': len(items) > per_page
+            })
+        
         messages = Message.query.filter_by(session_id=session_id)\
-                               .order_by(Message.timestamp.desc())\
+                               .order_by(Message.seq.desc())\
                                .paginate(page=page, per_page=per_page, error_out=False)
         
-        return jsonify({
+        if not messages.items and page == 1:
+            pending = _pending_page(session_id, fields)
+            return json_response({'success': True, 'messages': pending, 'has_more': False, 'total': len(pending)})
+        
+        return json_response({
             'success': True,
-            'messages': [msg.to_dict() for msg in reversed(messages.items)],
+            'messages': [msg.to_dict(fields) for msg in reversed(messages.items)],
             'has_more': messages.has_next,
             'total': messages.total
         })
@@ -69,6 +132,57 @@ def get_messages(session_id):
         logger.error(f"Erro ao obter mensagens: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@chat_bp.route('/sessions/<session_id>/archive', methods=['GET'])
+def get_archived_messages(session_id):
+    """Obter mensagens arquivadas de uma sessão (lidas dos segmentos comprimidos)"""
+    try:
+        return json_response({
+            'success': True,
+            'messages': retention_service.load_archive(session_id)
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao obter arquivo da sessão: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@chat_bp.route('/search', methods=['GET'])
+def search_messages():
+    """Busca full-text nas mensagens, ranqueada e com trechos destacados"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Parâmetro q é obrigatório'}), 400
+        if not search.is_enabled():
+            return jsonify({'success': False, 'error': 'Busca indisponível neste servidor'}), 501
+        
+        results = search.search_messages(
+            db.session,
+            query,
+            session_id=request.args.get('session_id'),
+            user_id=request.args.get('user_id'),
+            limit=request.args.get('limit', 20, type=int)
+        )
+        
+        return json_response({
+            'success': True,
+            'query': query,
+            'results': results
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro na busca de mensagens: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@chat_bp.route('/sessions/<session_id>/shard', methods=['GET'])
+def get_session_shard(session_id):
+    """Nó e shard que atendem a sessão (para roteamento entre nós)"""
+    return jsonify({
+        'success': True,
+        'node': shard_router.owner_node(session_id),
+        'local': shard_router.is_local(session_id),
+        'shard': shard_router.shard_for(session_id).name
+    })
+
 @chat_bp.route('/sessions/<session_id>/upload', methods=['POST'])
 def upload_file(session_id):
     """Upload de arquivo para uma sessão"""
@@ -81,7 +195,7 @@ def upload_file(session_id):
             return jsonify({'success': False, 'error': 'Nome do arquivo vazio'}), 400
         
         # Criar diretório de uploads se não existir
-        upload_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads', session_id)
+        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], session_id)
         os.makedirs(upload_dir, exist_ok=True)
         
         # Salvar arquivo
@@ -90,115 +204,346 @@ def upload_file(session_id):
         file.save(file_path)
         
         # Salvar informações no banco
-        file_msg = Message(
-            session_id=session_id,
-            content=f"Arquivo enviado: {file.filename}",
-            sender='user',
-            message_type='file',
-            file_url=f"/uploads/{session_id}/{filename}",
-            file_name=file.filename,
-            file_size=os.path.getsize(file_path)
-        )
-        db.session.add(file_msg)
-        db.session.commit()
+        shard = shard_router.shard_for(session_id)
+        fields = {
+            'session_id': session_id,
+            'content': f"Arquivo enviado: {file.filename}",
+            'sender': 'user',
+            'message_type': 'file',
+            'file_url': f"/uploads/{session_id}/{filename}",
+            'file_name': file.filename,
+            'file_size': os.path.getsize(file_path)
+        }
+        welcome = lazy_sessions.announce(session_id)
+        if welcome is not None:
+            shard.replay.record(session_id, welcome, new_session=True)
+        payload = _persist_file_message(fields)
+        shard.replay.record(session_id, payload)
+        
+        # Indexar trechos do arquivo para perguntas seguintes (falha não impede o upload)
+        try:
+            chunks = cpu_pool.call(cpu_tasks.prepare_chunks, file_path, file.filename)
+            shard.documents.add_chunks(session_id, payload.data['id'], file.filename, chunks)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao indexar arquivo {file.filename}: {str(e)}")
         
         return jsonify({
             'success': True,
-            'message': file_msg.to_dict()
+            'message': payload.data
         })
         
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Erro no upload: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _messages_after(session_id, last_message_id):
+    """
+    Mensagens da sessão posteriores a `last_message_id` (buffer de replay ou banco).
+    Retorna (payloads, completo); incompleto significa que o cliente deve recarregar.
+    """
+    payloads = shard_router.shard_for(session_id).replay.since(session_id, last_message_id)
+    if payloads is not None:
+        return payloads, True
+    if lazy_sessions.is_pending(session_id):
+        # Sessão ainda não gravada: o cliente já tem as boas-vindas
+        return [], True
+    
+    anchor = db.session.get(Message, last_message_id)
+    if anchor is None or anchor.session_id != session_id:
+        return [], False
+    
+    messages = Message.query.filter(Message.session_id == session_id,
+                                    Message.seq > anchor.seq)\
+                            .order_by(Message.seq.asc())\
+                            .limit(SYNC_MAX_MESSAGES + 1).all()
+    if len(messages) > SYNC_MAX_MESSAGES:
+        return [], False
+    return [msg.to_payload() for msg in messages], True
+
+def _publish(job, msg):
+    """Registrar no buffer de replay e emitir uma mensagem persistida"""
+    payload = msg.to_payload()
+    job.shard.replay.record(msg.session_id, payload)
+    job.emit('message', payload)
+
 # Eventos WebSocket
 def handle_connect(auth):
     """Usuário conectado"""
     session_id = auth.get('session_id') if auth else None
     if session_id:
+        # Com vários nós, cada sessão é atendida só pelo nó dono
+        if not shard_router.is_local(session_id):
+            raise ConnectionRefusedError({'message': 'Sessão atendida por outro nó',
+                                          'node': shard_router.owner_node(session_id)})
         join_room(session_id)
         active_sessions[request.sid] = session_id
         emit('connected', {'status': 'connected', 'session_id': session_id})
         logger.info(f"Cliente conectado à sessão {session_id}")
+        
+        # Reconexão: reenviar apenas as mensagens que o cliente não viu
+        last_message_id = auth.get('last_message_id')
+        if last_message_id:
+            payloads, complete = _messages_after(session_id, last_message_id)
+            emit('sync', {'session_id': session_id, 'messages': payloads, 'complete': complete})
+        
+        if admission.degraded:
+            emit('status', admission.status_payload())
 
 def handle_disconnect():
     """Usuário desconectado"""
+    # Jobs deste socket não têm mais destinatário
+    job_manager.cancel_sid(request.sid)
     session_id = active_sessions.pop(request.sid, None)
     if session_id:
         leave_room(session_id)
         logger.info(f"Cliente desconectado da sessão {session_id}")
 
-async def handle_message(data):
-    """Processar mensagem do usuário"""
+def handle_cancel(data):
+    """Cancelar geração em andamento (um job específico ou todos do socket)"""
+    job_id = (data or {}).get('job_id')
+    if job_id:
+        cancelled = int(job_manager.cancel(job_id, sid=request.sid))
+    else:
+        cancelled = job_manager.cancel_sid(request.sid, reason='cancelado pelo cliente')
+    return {'cancelled': cancelled}
+
+def fair_share_key(session_id):
+    """
+    Chave da fila justa da IA: o dono gravado da sessão (o `user_id` enviado
+    a cada mensagem é do cliente e pode mudar à vontade); a sessão quando anônima
+    """
+    return lazy_sessions.owner(session_id) or f"session:{session_id}"
+
+def message_cost(content):
+    """Custo estimado (tokens) de uma mensagem antes de montar o prompt"""
+    return estimate_tokens(content) + CONTEXT_TOKENS_ESTIMATE + RESPONSE_TOKENS_ESTIMATE
+
+def _recent_history(replay_buffer, session_id, limit=HISTORY_SIZE):
+    """
+    Últimas mensagens da sessão para o prompt: do buffer de replay quando ele
+    tem o histórico completo, do banco (semeando o buffer) caso contrário.
+    """
+    history = replay_buffer.recent(session_id, limit)
+    if history is not None:
+        return history
+    
+    messages = Message.query.filter_by(session_id=session_id)\
+                            .order_by(Message.seq.desc())\
+                            .limit(replay_buffer.maxlen).all()
+    payloads = [msg.to_payload() for msg in reversed(messages)]
+    replay_buffer.seed(session_id, payloads)
+    return [payload.data for payload in payloads[-limit:]]
+
+def _pending_page(session_id, fields):
+    """Página de uma sessão ainda não gravada: apenas as boas-vindas"""
+    welcome = lazy_sessions.pending_welcome(session_id)
+    if welcome is None:
+        return []
+    return [{field: welcome[field] for field in fields} if fields else welcome]
+
+# Escritas executadas pelo thread de write-behind (cada uma em seu app context)
+def _touch_session(session_id, timestamp):
+    """Registrar atividade na sessão (reativando-a se a retenção a marcou inativa)"""
+    db.session.execute(
+        ChatSession.__table__.update()
+        .where(ChatSession.id == session_id)
+        .values(last_activity=timestamp, is_active=True)
+    )
+
+def _persist_user_message(fields, job):
+    """Gravar a mensagem do usuário (e a sessão, se pendente) e emiti-la para a sala"""
+    if not lazy_sessions.materialize(fields['session_id'], fields['user_id']):
+        _touch_session(fields['session_id'], fields['timestamp'])
+    user_msg = Message(**fields)
+    db.session.add(user_msg)
+    db.session.commit()
+    _publish(job, user_msg)
+
+def _persist_file_message(fields):
+    """Gravar a mensagem de upload (e a sessão, se pendente); retorna o payload"""
+    if not lazy_sessions.materialize(fields['session_id']):
+        _touch_session(fields['session_id'], datetime.utcnow())
+    file_msg = Message(**fields)
+    db.session.add(file_msg)
+    db.session.commit()
+    return file_msg.to_payload()
+
+def _persist_reply(fields, user_message_id, replay_buffer):
+    """
+    Gravar a resposta, marcar a mensagem do usuário como respondida e atualizar
+    a sessão; no buffer de replay, a versão emitida dá lugar à gravada (com seq)
+    """
+    reply = Message(**fields)
+    db.session.add(reply)
+    db.session.execute(
+        Message.__table__.update()
+        .where(Message.id == user_message_id)
+        .values(status=STATUS_ANSWERED)
+    )
+    _touch_session(fields['session_id'], fields['timestamp'])
+    db.session.commit()
+    replay_buffer.replace(fields['session_id'], reply.to_payload())
+
+def _set_message_status(message_id, status):
+    """Registrar o estado final de uma mensagem do usuário que não foi respondida"""
+    db.session.execute(
+        Message.__table__.update()
+        .where(Message.id == message_id)
+        .values(status=status)
+    )
+    db.session.commit()
+
+async def handle_message(data, job, local_reply=None):
+    """
+    Processar mensagem do usuário.
+    
+    `local_reply` é a resposta local decidida na chegada (modo degradado); sem
+    ela, o job já chega aqui com a vaga da fila justa da IA.
+    
+    O banco fica fora do caminho crítico: o prompt é montado a partir do
+    histórico em cache, a gravação da mensagem do usuário corre em paralelo à
+    chamada da IA e a resposta é emitida antes de ser gravada (write-behind).
+    
+    Garantias: a resposta só é emitida depois que a mensagem do usuário foi
+    gravada; se a gravação da resposta falhar, ela sai do buffer de replay
+    (delta-sync e histórico do prompt), a mensagem do usuário é marcada como
+    falha e o cliente recebe um erro.
+    """
+    user_write = None
+    user_message_id = str(uuid.uuid4())
     try:
         session_id = data.get('session_id')
         content = data.get('content', '').strip()
         user_id = data.get('user_id')
         
         if not session_id or not content:
-            emit('error', {'message': 'Dados inválidos'})
+            job.emit_error('Dados inválidos')
             return
         
-        # Salvar mensagem do usuário
-        user_msg = Message(
-            session_id=session_id,
-            user_id=user_id,
-            content=content,
-            sender='user',
-            message_type='text'
-        )
-        db.session.add(user_msg)
-        db.session.commit()
+        # Histórico antes da nova mensagem (cache; banco apenas em sessões frias)
+        shard = job.shard
+        welcome = lazy_sessions.announce(session_id)
+        if welcome is not None:
+            # Primeira mensagem de uma sessão pendente: boas-vindas iniciam o buffer
+            shard.replay.record(session_id, welcome, new_session=True)
+        messages_for_ai = _recent_history(shard.replay, session_id, HISTORY_SIZE - 1)
         
-        # Emitir mensagem do usuário para todos na sala
-        emit('message', user_msg.to_dict(), room=session_id)
+        # Mensagem do usuário já assumida por este job (workers de pendências
+        # não a disputam), gravada e emitida enquanto a IA gera a resposta
+        now = datetime.utcnow()
+        user_fields = {
+            'id': user_message_id,
+            'session_id': session_id,
+            'user_id': user_id,
+            'content': content,
+            'sender': 'user',
+            'message_type': 'text',
+            'timestamp': now,
+            'status': STATUS_PROCESSING,
+            'claimed_at': now
+        }
+        user_write = shard.writer.submit(_persist_user_message, user_fields, job)
+        messages_for_ai.append(user_fields)
         
-        # Obter histórico de mensagens
-        recent_messages = Message.query.filter_by(session_id=session_id)\
-                                     .order_by(Message.timestamp.desc())\
-                                     .limit(10).all()
+        ai_response = local_reply
+        if ai_response is None:
+            # Trechos dos arquivos da sessão relevantes para a pergunta
+            context_chunks = shard.documents.retrieve(session_id, content)
+            prompt_tokens = estimate_tokens(*(msg.get('content') for msg in messages_for_ai),
+                                            *(chunk.get('content') for chunk in context_chunks))
+            used_tokens = None
+            try:
+                # Gerar resposta da IA
+                started = time.monotonic()
+                ai_response = await ai_service.generate_response(messages_for_ai, session_id, job.cancel_event,
+                                                                 context_chunks)
+                admission.record_latency(time.monotonic() - started)
+                used_tokens = prompt_tokens + estimate_tokens(ai_response)
+            finally:
+                # Vaga da IA devolvida antes das escritas, com o uso estimado real
+                job.release_slot(used_tokens)
+        job.raise_if_cancelled()
         
-        messages_for_ai = [msg.to_dict() for msg in reversed(recent_messages)]
+        # Durabilidade: nunca responder a uma mensagem que não foi gravada
+        await asyncio.wrap_future(user_write)
         
-        # Gerar resposta da IA
-        ai_response = await ai_service.generate_response(messages_for_ai, session_id)
+        # Emitir a resposta já com id e timestamp definitivos; o seq só existe
+        # depois da gravação, feita em seguida pelo write-behind, e vai como
+        # null. O buffer de replay guarda esta versão até o commit, quando
+        # `_persist_reply` a troca pela gravada, com seq
+        ai_fields = {
+            'id': str(uuid.uuid4()),
+            'session_id': session_id,
+            'content': ai_response,
+            'sender': 'ai',
+            'message_type': 'text',
+            'timestamp': datetime.utcnow(),
+            'reply_to': user_message_id
+        }
+        payload = Message(**ai_fields).to_payload()
+        shard.replay.record(session_id, payload)
+        job.emit('message', payload)
         
-        # Salvar resposta da IA
-        ai_msg = Message(
-            session_id=session_id,
-            content=ai_response,
-            sender='ai',
-            message_type='text'
-        )
-        db.session.add(ai_msg)
+        def reply_written(future):
+            if future.exception() is not None:
+                shard.replay.discard(session_id, ai_fields['id'])
+                shard.writer.submit(_set_message_status, user_message_id, STATUS_FAILED)
+                job.emit_error('Erro ao salvar resposta')
         
-        # Atualizar última atividade da sessão
-        session = ChatSession.query.get(session_id)
-        if session:
-            session.last_activity = datetime.utcnow()
-        
-        db.session.commit()
-        
-        # Emitir resposta da IA
-        emit('message', ai_msg.to_dict(), room=session_id)
+        shard.writer.submit(_persist_reply, ai_fields, user_message_id, shard.replay)\
+             .add_done_callback(reply_written)
         
+    except GenerationCancelled:
+        if user_write is not None:
+            job.shard.writer.submit(_set_message_status, user_message_id, STATUS_CANCELLED)
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar mensagem: {str(e)}")
-        emit('error', {'message': 'Erro ao processar mensagem'})
+        if user_write is not None:
+            job.shard.writer.submit(_set_message_status, user_message_id, STATUS_FAILED)
+        job.emit_error('Erro ao processar mensagem')
+
+def _resolve_upload(session_id, data):
+    """
+    Caminho no disco de um upload da sessão, indicado pelo id da mensagem
+    (`message_id`) ou pela URL `/uploads/...` (`file_path`). Retorna
+    (caminho, nome original) ou None se não for um upload da sessão.
+    """
+    query = Message.query.filter_by(session_id=session_id, message_type='file')
+    if data.get('message_id'):
+        message = query.filter_by(id=data['message_id']).first()
+    elif data.get('file_path'):
+        message = query.filter_by(file_url=data['file_path']).first()
+    else:
+        return None
+    prefix = f"/uploads/{session_id}/"
+    if message is None or not (message.file_url or '').startswith(prefix):
+        return None
+    # Mesmo caminho servido por `send_upload`: nada fora da pasta da sessão
+    file_path = safe_join(current_app.config['UPLOAD_FOLDER'], session_id, message.file_url[len(prefix):])
+    if file_path is None or not os.path.isfile(file_path):
+        return None
+    return file_path, message.file_name
 
-async def handle_file_analysis(data):
+async def handle_file_analysis(data, job):
     """Analisar arquivo enviado"""
     try:
         session_id = data.get('session_id')
-        file_path = data.get('file_path')
-        file_name = data.get('file_name')
+        upload = _resolve_upload(session_id, data) if session_id else None
         
-        if not all([session_id, file_path, file_name]):
-            emit('error', {'message': 'Dados do arquivo inválidos'})
+        if upload is None:
+            job.emit_error('Dados do arquivo inválidos')
             return
+        file_path, file_name = upload
         
-        # Analisar arquivo com IA
-        analysis = await ai_service.analyze_file(file_path, file_name)
+        # Analisar arquivo com IA (vaga da fila justa obtida na chegada do job)
+        try:
+            analysis = await ai_service.analyze_file(file_path, file_name, job.cancel_event)
+        finally:
+            job.release_slot()
+        job.raise_if_cancelled()
         
         # Salvar análise como mensagem da IA
         ai_msg = Message(
@@ -211,8 +556,10 @@ async def handle_file_analysis(data):
         db.session.commit()
         
         # Emitir análise
-        emit('message', ai_msg.to_dict(), room=session_id)
+        _publish(job, ai_msg)
         
+    except GenerationCancelled:
+        raise
     except Exception as e:
         logger.error(f"Erro ao analisar arquivo: {str(e)}")
-        emit('error', {'message': 'Erro ao analisar arquivo'})
+        job.emit_error('Erro ao analisar arquivo')
@@ -0,0 +1,186 @@
+"""
+Controle de admissão e modo degradado sob sobrecarga.
+
+O modo degradado liga quando há jobs de IA demais em andamento
+(`ADMISSION_MAX_ACTIVE_JOBS`) ou quando a latência p90 da IA nos últimos
+`LATENCY_WINDOW_SECONDS` passa de `ADMISSION_MAX_LATENCY_MS`. Enquanto ligado:
+
+- mensagens curtas com intenção conversacional reconhecida são respondidas na
+  hora pelo respondedor local (`local_responder`);
+- análises de arquivo são adiadas até a carga normalizar (ou até
+  `ADMISSION_MAX_DEFER_SECONDS`);
+- os clientes recebem o evento `status` (`{degraded, reason}`).
+
+O modo só desliga com a carga abaixo da metade dos limites (histerese), para
+não alternar a cada mensagem.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.services.local_responder import local_reply
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW_SECONDS = 60
+LATENCY_WINDOW_SIZE = 200
+
+
+class AdmissionController:
+    """
+    Decide, por mensagem, entre a IA e o respondedor local, e adia trabalho
+    de baixa prioridade enquanto o servidor está sobrecarregado.
+    """
+
+    def __init__(self, app=None, socketio=None, job_manager=None):
+        self.app = app
+        self.socketio = socketio
+        self.job_manager = job_manager
+        self.is_running = False
+        self.degraded = False
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self._deferred: Deque[Tuple[float, Callable[[], Any]]] = deque()
+        self.local_replies = 0
+        self.deferred_total = 0
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.config.setdefault('ADMISSION_MAX_ACTIVE_JOBS', 16)
+        app.config.setdefault('ADMISSION_MAX_LATENCY_MS', 20000)
+        app.config.setdefault('ADMISSION_SHORT_MESSAGE_WORDS', 12)
+        app.config.setdefault('ADMISSION_MAX_DEFER_SECONDS', 300)
+        app.config.setdefault('ADMISSION_CHECK_INTERVAL', 2)
+
+    def start(self):
+        """
+        Reavalia a carga periodicamente (sai do modo degradado e libera
+        trabalho adiado mesmo sem novas mensagens).
+        """
+        if not self.is_running:
+            self.is_running = True
+            self.socketio.start_background_task(self._loop)
+
+    def stop(self):
+        self.is_running = False
+
+    def _loop(self):
+        while self.is_running:
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.error(f"Erro no controle de admissão: {str(e)}")
+            self.socketio.sleep(self.app.config['ADMISSION_CHECK_INTERVAL'])
+
+    def record_latency(self, seconds: float):
+        """
+        Registra a duração de uma chamada à IA concluída.
+        """
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+
+    def latency_p90_ms(self) -> float:
+        cutoff = time.monotonic() - LATENCY_WINDOW_SECONDS
+        with self._lock:
+            recent = sorted(seconds for at, seconds in self._latencies if at >= cutoff)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(len(recent) * 0.9))] * 1000
+
+    def evaluate(self) -> bool:
+        """
+        Atualiza o estado (com histerese), notifica os clientes em mudanças e
+        libera o trabalho adiado quando permitido. Retorna se está degradado.
+        """
+        config = self.app.config
+        active = self.job_manager.count() if self.job_manager is not None else 0
+        p90 = self.latency_p90_ms()
+        # Para sair do modo degradado, a carga precisa cair abaixo da metade dos limites
+        factor = 0.5 if self.degraded else 1.0
+
+        reason = None
+        if active >= config['ADMISSION_MAX_ACTIVE_JOBS'] * factor:
+            reason = f"{active} gerações em andamento"
+        elif p90 >= config['ADMISSION_MAX_LATENCY_MS'] * factor:
+            reason = f"latência p90 da IA em {p90 / 1000:.1f}s"
+
+        with self._lock:
+            changed = (reason is not None) != self.degraded
+            self.degraded = reason is not None
+            self.reason = reason
+
+        if changed:
+            if self.degraded:
+                logger.warning(f"Modo degradado ativado: {reason}")
+            else:
+                logger.info("Modo degradado desativado")
+            self.socketio.emit('status', self.status_payload())
+
+        self._release_deferred()
+        return self.degraded
+
+    def local_reply(self, content: str) -> Optional[str]:
+        """
+        Resposta local para mensagens curtas e conversacionais em modo
+        degradado; None se a mensagem deve seguir para a IA.
+        """
+        if not self.evaluate():
+            return None
+        if len(content.split()) > self.app.config['ADMISSION_SHORT_MESSAGE_WORDS']:
+            return None
+        reply = local_reply(content)
+        if reply is not None:
+            with self._lock:
+                self.local_replies += 1
+        return reply
+
+    def defer(self, submit: Callable[[], Any]) -> bool:
+        """
+        Adia `submit` (trabalho de baixa prioridade) se o modo degradado
+        estiver ativo. Retorna False quando o trabalho pode seguir agora.
+        """
+        if not self.evaluate():
+            return False
+        with self._lock:
+            self._deferred.append((time.monotonic(), submit))
+            self.deferred_total += 1
+        return True
+
+    def _release_deferred(self):
+        """
+        Executa o trabalho adiado: tudo, fora do modo degradado; só o que
+        esperou mais que ADMISSION_MAX_DEFER_SECONDS, dentro dele.
+        """
+        expired_before = time.monotonic() - self.app.config['ADMISSION_MAX_DEFER_SECONDS']
+        ready: List[Callable[[], Any]] = []
+        with self._lock:
+            while self._deferred and (not self.degraded or self._deferred[0][0] < expired_before):
+                ready.append(self._deferred.popleft()[1])
+
+        for submit in ready:
+            try:
+                submit()
+            except Exception as e:
+                logger.error(f"Erro ao liberar trabalho adiado: {str(e)}")
+
+    def status_payload(self) -> Dict[str, Any]:
+        return {'degraded': self.degraded, 'reason': self.reason}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            deferred = len(self._deferred)
+        return {
+            'degraded': self.degraded,
+            'reason': self.reason,
+            'latency_p90_ms': round(self.latency_p90_ms(), 1),
+            'local_replies': self.local_replies,
+            'deferred': deferred,
+            'deferred_total': self.deferred_total
+        }
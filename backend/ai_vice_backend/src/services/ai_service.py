@@ -3,63 +3,180 @@ import asyncio
 from typing import List, Dict, Any, Optional
 import json
 import logging
-from openai import OpenAI
+import threading
+from src.services.coalescing import SingleFlight, request_key
+from src.services import cpu_tasks
+from src.services.extractors import get_extractor
+from src.services.prompts import (
+    CHAT_CACHE_KEY,
+    FILE_ANALYSIS_CACHE_KEY,
+    WELCOME_MESSAGE,
+    PromptCacheStats,
+    build_chat_messages,
+    build_file_analysis_messages
+)
 
 logger = logging.getLogger(__name__)
 
+class GenerationCancelled(Exception):
+    """
+    A geração foi cancelada (cliente desconectou, nova mensagem ou evento `cancel`).
+    """
+
 class AIService:
-    def __init__(self):
+    def __init__(self, cpu_pool=None):
         """
         Inicializa o serviço de IA com integração real à OpenAI API.
+        
+        `cpu_pool` (CPUPool) recebe a extração de arquivos; sem ele, a
+        extração roda na thread atual.
         """
-        self.client = OpenAI()  # API key e base URL já configuradas nas variáveis de ambiente
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model = "gpt-4.1-mini"  # Modelo disponível no ambiente
+        self.cache_stats = PromptCacheStats()
+        self.single_flight = SingleFlight()
+        self.cpu_pool = cpu_pool
+    
+    @property
+    def client(self):
+        """
+        Cliente da OpenAI, criado no primeiro uso: importar o SDK custa
+        centenas de milissegundos e fica fora da inicialização do servidor.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI()  # API key e base URL já configuradas nas variáveis de ambiente
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        with self._client_lock:
+            self._client = client
+    
+    def warm_up(self):
+        """
+        Cria o cliente em segundo plano, depois que o servidor já está de pé,
+        para que a primeira mensagem não pague a importação do SDK.
+        """
+        try:
+            self.client
+        except Exception as e:
+            logger.error(f"Erro ao inicializar o cliente da OpenAI: {str(e)}")
         
-    async def generate_response(self, messages: List[Dict[str, str]], session_id: str) -> str:
+    async def generate_response(self, messages: List[Dict[str, str]], session_id: str,
+                                cancel_event: Optional[threading.Event] = None,
+                                context_chunks: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         Gera uma resposta da IA baseada no histórico de mensagens usando a OpenAI API.
+        
+        `context_chunks` são trechos dos arquivos da sessão recuperados para a
+        pergunta atual (ver DocumentIndex.retrieve).
+        
+        Com `cancel_event`, a resposta é obtida via streaming e a conexão com a API
+        é fechada assim que o evento for sinalizado (levanta GenerationCancelled).
         """
         try:
             # Formatar mensagens para a API
             formatted_messages = self._format_messages_for_api(messages)
             
-            # Adicionar mensagem de sistema para definir o comportamento da IA
-            system_message = {
-                "role": "system",
-                "content": """Você é o AI Vice, um assistente de IA conversacional inteligente e prestativo. 
-                
-Características:
-- Responda sempre em português brasileiro
-- Seja amigável, profissional e útil
-- Forneça respostas detalhadas e informativas
-- Quando analisar arquivos, seja específico e detalhado
-- Mantenha o contexto da conversa
-- Se não souber algo, seja honesto sobre suas limitações
-- Use formatação markdown quando apropriado para melhor legibilidade
-
-Seu objetivo é ajudar os usuários com suas perguntas, análise de documentos e tarefas diversas."""
-            }
-            
-            api_messages = [system_message] + formatted_messages
+            # Prefixo de sistema fixo + histórico (prefixo estável para o cache do provedor)
+            api_messages = build_chat_messages(formatted_messages, context_chunks)
             
             # Fazer chamada para a API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=api_messages,
-                max_tokens=1000,
-                temperature=0.7,
-                stream=False
-            )
-            
-            ai_response = response.choices[0].message.content
+            if cancel_event is not None:
+                ai_response = self._stream_completion(
+                    session_id,
+                    cancel_event,
+                    model=self.model,
+                    messages=api_messages,
+                    max_tokens=1000,
+                    temperature=0.7,
+                    prompt_cache_key=CHAT_CACHE_KEY
+                )
+            else:
+                response = self._create_completion(
+                    session_id,
+                    model=self.model,
+                    messages=api_messages,
+                    max_tokens=1000,
+                    temperature=0.7,
+                    stream=False,
+                    prompt_cache_key=CHAT_CACHE_KEY
+                )
+                ai_response = response.choices[0].message.content
             logger.info(f"OpenAI API gerou resposta para sessão {session_id}: {ai_response[:100]}...")
             
             return ai_response
             
+        except GenerationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Erro ao gerar resposta da IA via OpenAI API: {str(e)}")
             return "Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente em alguns instantes."
     
+    def _create_completion(self, context: str, **params):
+        """
+        Chama a API de chat completions coalescendo requisições idênticas em
+        andamento: a chave é o hash do prompt e dos parâmetros da chamada.
+        """
+        def call():
+            response = self.client.chat.completions.create(**params)
+            self._record_usage(getattr(response, "usage", None), context)
+            return response
+        
+        return self.single_flight.do(request_key(params), call)
+    
+    def _stream_completion(self, context: str, cancel_event: threading.Event, **params) -> str:
+        """
+        Chama a API em modo streaming, verificando o cancelamento a cada chunk.
+        
+        Chamadas canceláveis pertencem a um único job e por isso não passam pela
+        coalescência: cancelar uma não pode derrubar as demais.
+        """
+        if cancel_event.is_set():
+            raise GenerationCancelled(context)
+        
+        stream = self.client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **params
+        )
+        parts = []
+        usage = None
+        try:
+            for chunk in stream:
+                if cancel_event.is_set():
+                    raise GenerationCancelled(context)
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            # Fecha a conexão HTTP: interrompe a geração no provedor se cancelada
+            stream.close()
+        
+        self._record_usage(usage, context)
+        return "".join(parts)
+    
+    def _record_usage(self, usage, context: str):
+        """
+        Registra o uso de tokens da resposta, incluindo acertos do cache de prefixo.
+        """
+        cached = self.cache_stats.record(usage)
+        if cached is not None:
+            logger.info(f"Uso de tokens ({context}): prompt={usage.prompt_tokens} cache={cached}")
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas acumuladas de tokens e cache de prompt.
+        """
+        stats = self.cache_stats.to_dict()
+        stats["coalescing"] = self.single_flight.get_stats()
+        return stats
+    
     def _format_messages_for_api(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """
         Formata mensagens do banco de dados para o formato esperado pela OpenAI API.
@@ -81,66 +198,69 @@ Seu objetivo é ajudar os usuários com suas perguntas, análise de documentos e
         
         return formatted
     
-    async def analyze_file(self, file_path: str, file_name: str) -> str:
+    async def analyze_file(self, file_path: str, file_name: str,
+                           cancel_event: Optional[threading.Event] = None) -> str:
         """
         Analisa um arquivo enviado pelo usuário usando a OpenAI API.
+        
+        A chamada é compartilhada entre análises idênticas, então o cancelamento
+        apenas descarta o resultado para o job cancelado.
         """
         try:
             file_extension = os.path.splitext(file_name)[1].lower()
             
-            # Ler conteúdo do arquivo se for texto
-            if file_extension in [".txt", ".md", ".py", ".js", ".html", ".css", ".json", ".xml", ".csv"]:
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                except UnicodeDecodeError:
-                    # Tentar com encoding latin-1 se UTF-8 falhar
-                    with open(file_path, "r", encoding="latin-1") as f:
-                        content = f.read()
-                
-                # Limitar o tamanho do conteúdo para não exceder limites da API
-                if len(content) > 8000:
-                    content = content[:8000] + "\n\n[Conteúdo truncado devido ao tamanho...]"
-                
-                # Criar prompt para análise
-                analysis_prompt = f"""Analise o seguinte arquivo:
+            # Extração (decodificação, parsing de PDF/CSV, EXIF) em um processo
+            # separado para não disputar o GIL com as threads do Socket.IO
+            extraction = {"kind": "unsupported", "content": None}
+            if get_extractor(file_name) is not None:
+                if self.cpu_pool is not None:
+                    extraction = await self.cpu_pool.run(cpu_tasks.extract_file, file_path, file_name)
+                else:
+                    extraction = cpu_tasks.extract_file(file_path, file_name)
+            
+            if extraction["content"] is None:
+                return self._unsupported_file_message(file_name, file_extension, extraction["kind"])
+            
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled(file_name)
+            
+            # Fazer chamada para a API com o template pré-computado
+            # (análises idênticas em andamento compartilham a mesma chamada)
+            response = self._create_completion(
+                file_name,
+                model=self.model,
+                messages=build_file_analysis_messages(file_name, file_extension, extraction["content"]),
+                max_tokens=1500,
+                temperature=0.3,
+                prompt_cache_key=FILE_ANALYSIS_CACHE_KEY
+            )
+            
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled(file_name)
+            
+            return response.choices[0].message.content
+            
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Erro ao analisar arquivo via OpenAI API: {str(e)}")
+            return f"""❌ **Erro na Análise**
 
-Nome do arquivo: {file_name}
-Tipo: {file_extension}
-Conteúdo:
-```
-{content}
-```
+Recebi o arquivo `{file_name}`, mas ocorreu um erro durante a análise. O arquivo foi salvo com sucesso.
 
-Por favor, forneça uma análise detalhada incluindo:
-1. Resumo do conteúdo
-2. Estrutura e organização
-3. Pontos principais ou funcionalidades (se aplicável)
-4. Qualidade do código (se for um arquivo de programação)
-5. Sugestões de melhoria (se apropriado)
-6. Qualquer observação relevante"""
+Você pode tentar:
+• Reenviar o arquivo
+• Descrever o conteúdo manualmente para que eu possa ajudar
+• Verificar se o arquivo não está corrompido
 
-                # Fazer chamada para a API
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "Você é um especialista em análise de arquivos e documentos. Forneça análises detalhadas e úteis em português brasileiro."
-                        },
-                        {
-                            "role": "user",
-                            "content": analysis_prompt
-                        }
-                    ],
-                    max_tokens=1500,
-                    temperature=0.3
-                )
-                
-                return response.choices[0].message.content
-            
-            elif file_extension in [".jpg", ".jpeg", ".png", ".gif"]:
-                return f"""📸 **Análise de Imagem: {file_name}**
+Como posso ajudar você de outra forma?"""
+    
+    def _unsupported_file_message(self, file_name: str, file_extension: str, kind: str) -> str:
+        """
+        Resposta fixa para arquivos cujo conteúdo não pôde ser extraído.
+        """
+        if kind == "image":
+            return f"""📸 **Análise de Imagem: {file_name}**
 
 Recebi sua imagem! Infelizmente, no momento não posso processar o conteúdo visual de imagens diretamente, mas posso ajudar você de outras formas:
 
@@ -149,9 +269,9 @@ Recebi sua imagem! Infelizmente, no momento não posso processar o conteúdo vis
 • Se for um screenshot de código ou texto, você pode digitar o conteúdo que eu analiso
 
 Como posso ajudar você com esta imagem?"""
-            
-            elif file_extension == ".pdf":
-                return f"""📄 **Análise de PDF: {file_name}**
+        
+        if kind == "pdf":
+            return f"""📄 **Análise de PDF: {file_name}**
 
 Recebi seu arquivo PDF! Para uma análise mais detalhada, eu precisaria extrair o texto do documento. No momento, posso ajudar você:
 
@@ -160,9 +280,8 @@ Recebi seu arquivo PDF! Para uma análise mais detalhada, eu precisaria extrair
 • Posso ajudar com conversão de formatos, compressão, etc.
 
 Você poderia compartilhar o conteúdo textual que gostaria que eu analisasse?"""
-            
-            else:
-                return f"""📁 **Arquivo Recebido: {file_name}**
+        
+        return f"""📁 **Arquivo Recebido: {file_name}**
 
 Recebi seu arquivo com extensão `{file_extension}`. Este tipo de arquivo não pode ser analisado automaticamente no momento, mas posso ajudar você:
 
@@ -171,46 +290,9 @@ Recebi seu arquivo com extensão `{file_extension}`. Este tipo de arquivo não p
 • Se for possível converter para um formato de texto, posso analisar o conteúdo
 
 Como posso ajudar você com este arquivo?"""
-                
-        except Exception as e:
-            logger.error(f"Erro ao analisar arquivo via OpenAI API: {str(e)}")
-            return f"""❌ **Erro na Análise**
-
-Recebi o arquivo `{file_name}`, mas ocorreu um erro durante a análise. O arquivo foi salvo com sucesso.
-
-Você pode tentar:
-• Reenviar o arquivo
-• Descrever o conteúdo manualmente para que eu possa ajudar
-• Verificar se o arquivo não está corrompido
-
-Como posso ajudar você de outra forma?"""
     
     def get_welcome_message(self) -> str:
         """
         Retorna uma mensagem de boas-vindas personalizada.
         """
-        return """👋 **Olá! Eu sou o AI Vice!**
-
-Sou seu assistente de IA conversacional, powered by **GPT-4.1-mini**. Estou aqui para ajudar você com:
-
-🤖 **Conversas Inteligentes**
-• Responder perguntas sobre qualquer assunto
-• Explicar conceitos complexos de forma simples
-• Ajudar com pesquisas e análises
-
-📁 **Análise de Arquivos**
-• Analisar códigos, documentos e textos
-• Revisar e sugerir melhorias
-• Explicar estruturas e funcionalidades
-
-💡 **Assistência Técnica**
-• Programação e desenvolvimento
-• Escrita e redação
-• Resolução de problemas
-
-✨ **Como usar:**
-• Digite suas perguntas normalmente
-• Use o botão 📎 para enviar arquivos
-• Mantenha a conversa fluindo naturalmente
-
-**Como posso ajudar você hoje?** 🚀"""
+        return WELCOME_MESSAGE
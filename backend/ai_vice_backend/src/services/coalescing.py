@@ -0,0 +1,82 @@
+"""
+Coalescência de requisições idênticas em andamento (single-flight).
+
+Quando várias sessões pedem a mesma chamada ao mesmo tempo (por exemplo, a
+análise do mesmo arquivo ou um `analyze_file` reenviado após reconexão), só a
+primeira vai ao provedor; as demais aguardam e recebem o mesmo resultado.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(*parts: Any) -> str:
+    """
+    Gera uma chave determinística (SHA-256) a partir do prompt e dos parâmetros.
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Garante no máximo uma execução em andamento por chave.
+
+    Funciona entre threads (cada tarefa em background do SocketIO roda na sua),
+    por isso usa `threading.Lock` e `concurrent.futures.Future`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Executa `fn` se não houver chamada igual em andamento; caso contrário,
+        aguarda o resultado (ou a exceção) da chamada existente.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            logger.info(f"Requisição coalescida com chamada em andamento ({key[:12]})")
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight)
+            }
@@ -0,0 +1,359 @@
+"""
+Compressão transparente de `Message.content` no banco.
+
+A coluna usa o tipo `CompressedText`, e o ORM vê sempre o texto original. No
+SQLite, o valor gravado é um de três:
+
+- texto puro (TEXT), para mensagens curtas (< `CONTENT_COMPRESS_MIN_SIZE` bytes)
+  ou que não encolhem;
+- referência a um texto internado (BLOB `01 <id>`): textos de sistema repetidos,
+  como a mensagem de boas-vindas gravada em toda sessão nova, viram 3 bytes;
+- conteúdo comprimido com dicionário (BLOB `02|03 <id do dicionário> <dados>`):
+  zstd quando o pacote `zstandard` está instalado, senão zlib com dicionário
+  predefinido (`zdict`).
+
+Mensagens curtas comprimem mal sozinhas; o dicionário (trechos típicos das
+respostas) resolve isso. Dicionários e textos internados ficam no banco
+(`compression_dictionaries`, `interned_texts`) e nunca mudam depois de
+gravados: o id no cabeçalho de cada valor continua decodificável mesmo que os
+prompts do código mudem. `flask train-content-dict` treina um dicionário novo
+a partir das mensagens recentes; ele passa a valer para as novas gravações.
+
+O formato depende da tipagem dinâmica do SQLite (BLOB numa coluna `Text`,
+`typeof()` na migração). Com outro banco em `DATABASE_URL`, o conteúdo é
+gravado e lido como texto puro.
+
+Com vários processos/nós no mesmo banco, um id ainda desconhecido neste
+processo (dicionário treinado ou texto internado por outro nó) faz recarregar
+as tabelas antes de falhar.
+"""
+
+import logging
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Text, inspect, text
+from sqlalchemy.types import TypeDecorator
+
+from src.services.prompts import (
+    CHAT_SYSTEM_PROMPT,
+    FILE_ANALYSIS_SYSTEM_PROMPT,
+    FILE_ANALYSIS_TEMPLATE,
+    WELCOME_MESSAGE
+)
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_INTERNED = 0x01
+FORMAT_ZLIB = 0x02
+FORMAT_ZSTD = 0x03
+HEADER_SIZE = 3
+
+# Dicionários 'raw' servem aos dois codecs; 'zstd' (treinados) só ao zstd
+CODEC_RAW = 'raw'
+CODEC_ZSTD = 'zstd'
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+# O zlib só aproveita os últimos 32 KB do dicionário
+ZLIB_MAX_DICT_SIZE = 32 * 1024
+TRAINED_DICT_SIZE = 16 * 1024
+TRAINING_SAMPLES = 2000
+
+# Textos do sistema que entram no dicionário inicial
+SEED_TEXTS = (
+    CHAT_SYSTEM_PROMPT,
+    FILE_ANALYSIS_SYSTEM_PROMPT,
+    FILE_ANALYSIS_TEMPLATE,
+    WELCOME_MESSAGE,
+    "Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente em alguns instantes.",
+    "\n\n## Resumo\n\n", "\n\n### Exemplo\n\n```python\n", "\n```\n\n",
+    "\n\n**Observação:** ", "\n- **", "\n1. **", "Aqui está ", "Claro! ", "Por exemplo, ",
+    "Se precisar de mais alguma coisa, é só perguntar! 😊",
+)
+
+# Textos internados: conteúdo gravado como referência em vez de cópia
+INTERNED_TEXTS = (WELCOME_MESSAGE,)
+
+# Estado global, carregado do banco por `init_compression`
+_lock = threading.RLock()
+_engine = None
+_min_size = 512
+_dictionaries: Dict[int, Tuple[str, bytes]] = {}
+_active: Optional[Tuple[int, str, bytes]] = None
+_interned_by_id: Dict[int, str] = {}
+_interned_ids: Dict[str, int] = {}
+_zstd_cache: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+_stats = {'compressed': 0, 'interned': 0, 'plain': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+def seed_dictionary() -> bytes:
+    # Mais frequentes por último: o zlib alcança melhor o fim do dicionário
+    return "\n".join(reversed(SEED_TEXTS)).encode('utf-8')[-ZLIB_MAX_DICT_SIZE:]
+
+
+def _usable(codec: str) -> bool:
+    return codec == CODEC_RAW or (codec == CODEC_ZSTD and zstandard is not None)
+
+
+def load(connection):
+    """
+    Carrega dicionários e textos internados do banco (tabelas criadas pelo
+    `create_all`). Chamado na inicialização e pelas migrações.
+    """
+    global _active
+    dictionaries = {row.id: (row.codec, bytes(row.data)) for row in connection.execute(
+        text("SELECT id, codec, data FROM compression_dictionaries")
+    )}
+    interned = {row.id: row.content for row in connection.execute(
+        text("SELECT id, content FROM interned_texts")
+    )}
+    with _lock:
+        _dictionaries.clear()
+        _dictionaries.update(dictionaries)
+        _zstd_cache.clear()
+        usable = [dict_id for dict_id, (codec, _) in dictionaries.items() if _usable(codec)]
+        _active = (max(usable),) + dictionaries[max(usable)] if usable else None
+        _interned_by_id.clear()
+        _interned_by_id.update(interned)
+        _interned_ids.clear()
+        _interned_ids.update({content: text_id for text_id, content in interned.items()})
+
+
+def ensure_defaults(connection) -> bool:
+    """
+    Registra o dicionário inicial e os textos internados atuais (ex.: uma
+    nova versão da mensagem de boas-vindas ganha um novo id).
+    """
+    changed = False
+    if connection.execute(text("SELECT COUNT(*) FROM compression_dictionaries")).scalar() == 0:
+        connection.execute(
+            text("INSERT INTO compression_dictionaries (codec, data, created_at) VALUES (:codec, :data, CURRENT_TIMESTAMP)"),
+            {'codec': CODEC_RAW, 'data': seed_dictionary()}
+        )
+        changed = True
+    existing = {row.content for row in connection.execute(text("SELECT content FROM interned_texts"))}
+    for content in INTERNED_TEXTS:
+        if content not in existing:
+            connection.execute(text("INSERT INTO interned_texts (content) VALUES (:content)"), {'content': content})
+            changed = True
+    return changed
+
+
+def configure(min_size: int):
+    """
+    Tamanho mínimo (bytes UTF-8) para comprimir; vale também para a migração.
+    """
+    global _min_size
+    _min_size = min_size
+
+
+def init_compression(engine):
+    """
+    Garante os registros padrão e ativa a compressão para novas gravações.
+    Com o schema desatualizado (sem as tabelas), o conteúdo segue em texto puro.
+    """
+    global _engine
+    if engine.dialect.name != 'sqlite':
+        logger.info("Compressão de mensagens desativada: requer SQLite")
+        return
+    if not inspect(engine).has_table('compression_dictionaries'):
+        logger.warning("Compressão de mensagens desativada: schema desatualizado")
+        return
+    with engine.begin() as connection:
+        ensure_defaults(connection)
+        load(connection)
+    _engine = engine
+    if _active is not None:
+        codec = 'zstd' if zstandard is not None else 'zlib'
+        logger.info(f"🗜️ Compressão de mensagens ativa ({codec}, dicionário {_active[0]})")
+
+
+def _count(kind: str, bytes_in: int = 0, bytes_out: int = 0):
+    with _lock:
+        _stats[kind] += 1
+        _stats['bytes_in'] += bytes_in
+        _stats['bytes_out'] += bytes_out
+
+
+def _lookup(table: Dict[int, object], ref: int, what: str):
+    # Id gravado por outro processo depois do nosso `load`: recarrega e tenta de novo
+    found = table.get(ref)
+    if found is not None:
+        return found
+    with _lock:
+        if ref not in table and _engine is not None:
+            logger.info(f"{what} {ref} desconhecido neste processo: recarregando do banco")
+            with _engine.connect() as connection:
+                load(connection)
+        found = table.get(ref)
+    if found is None:
+        raise ValueError(f"{what} {ref} não encontrado no banco")
+    return found
+
+
+def _zstd_dict(dict_id: int, data: bytes):
+    cached = _zstd_cache.get(dict_id)
+    if cached is None:
+        cached = zstandard.ZstdCompressionDict(data)
+        cached.precompute_compress(level=ZSTD_LEVEL)
+        _zstd_cache[dict_id] = cached
+    return cached
+
+
+def encode(value: Optional[str]):
+    """
+    Representação gravada no banco (texto, referência ou BLOB comprimido).
+    """
+    if value is None or _active is None:
+        return value
+
+    text_id = _interned_ids.get(value)
+    if text_id is not None:
+        _count('interned')
+        return bytes((FORMAT_INTERNED,)) + text_id.to_bytes(2, 'big')
+
+    raw = value.encode('utf-8')
+    if len(raw) < _min_size:
+        _count('plain')
+        return value
+
+    dict_id, codec, data = _active
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dict(dict_id, data))
+        payload = compressor.compress(raw)
+        fmt = FORMAT_ZSTD
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=data[-ZLIB_MAX_DICT_SIZE:])
+        payload = compressor.compress(raw) + compressor.flush()
+        fmt = FORMAT_ZLIB
+
+    if len(payload) + HEADER_SIZE >= len(raw):
+        _count('plain')
+        return value
+    _count('compressed', len(raw), len(payload) + HEADER_SIZE)
+    return bytes((fmt,)) + dict_id.to_bytes(2, 'big') + payload
+
+
+def decode(value):
+    """
+    Texto original a partir do valor gravado.
+    """
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    fmt, ref = value[0], int.from_bytes(value[1:HEADER_SIZE], 'big')
+    if fmt == FORMAT_INTERNED:
+        return _lookup(_interned_by_id, ref, "Texto internado")
+    if fmt not in (FORMAT_ZLIB, FORMAT_ZSTD):
+        raise ValueError(f"Formato de conteúdo desconhecido: {fmt}")
+
+    _, data = _lookup(_dictionaries, ref, "Dicionário de compressão")
+    payload = value[HEADER_SIZE:]
+    if fmt == FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Mensagem comprimida com zstd: instale o pacote 'zstandard'")
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dict(ref, data)).decompress(payload).decode('utf-8')
+    decompressor = zlib.decompressobj(-15, zdict=data[-ZLIB_MAX_DICT_SIZE:])
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+class CompressedText(TypeDecorator):
+    """
+    Texto comprimido/internado de forma transparente para o ORM.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'sqlite':
+            return value
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+def _raw_dictionary(samples: Iterable[str]) -> bytes:
+    # Sem zstd: linhas/trechos mais frequentes, os mais comuns no fim
+    counts = Counter(line for sample in samples for line in sample.splitlines(keepends=True)
+                     if len(line.strip()) >= 8)
+    lines: List[bytes] = []
+    size = 0
+    for line, count in counts.most_common():
+        if count < 2:
+            break
+        encoded = line.encode('utf-8')
+        if size + len(encoded) > ZLIB_MAX_DICT_SIZE:
+            break
+        lines.append(encoded)
+        size += len(encoded)
+    return seed_dictionary()[-(ZLIB_MAX_DICT_SIZE - size):] + b"".join(reversed(lines)) if lines else b""
+
+
+def train_dictionary(connection) -> Optional[int]:
+    """
+    Treina um dicionário com as mensagens longas mais recentes e o ativa.
+    Retorna o id, ou None se não houver amostras suficientes (ou sem SQLite).
+    """
+    if connection.dialect.name != 'sqlite':
+        return None
+    rows = connection.execute(
+        text("SELECT content FROM messages WHERE sender = 'ai' ORDER BY timestamp DESC LIMIT :limit"),
+        {'limit': TRAINING_SAMPLES}
+    )
+    samples = [decode(row.content) for row in rows]
+    samples = [sample for sample in samples if sample and len(sample.encode('utf-8')) >= _min_size]
+    if len(samples) < 20:
+        return None
+
+    if zstandard is not None:
+        trained = zstandard.train_dictionary(TRAINED_DICT_SIZE, [sample.encode('utf-8') for sample in samples])
+        codec, data = CODEC_ZSTD, trained.as_bytes()
+    else:
+        codec, data = CODEC_RAW, _raw_dictionary(samples)
+        if not data:
+            return None
+
+    result = connection.execute(
+        text("INSERT INTO compression_dictionaries (codec, data, created_at) VALUES (:codec, :data, CURRENT_TIMESTAMP)"),
+        {'codec': codec, 'data': data}
+    )
+    load(connection)
+    return result.lastrowid
+
+
+def compress_existing(connection) -> int:
+    """
+    Regrava em formato compacto as mensagens antigas guardadas como texto
+    puro (longas ou internadas). Retorna quantas mudaram.
+    """
+    rows = connection.execute(text(
+        "SELECT id, content FROM messages WHERE typeof(content) = 'text' "
+        "AND (length(CAST(content AS BLOB)) >= :min_size OR content IN (SELECT content FROM interned_texts))"
+    ), {'min_size': _min_size}).fetchall()
+    updates = []
+    for row in rows:
+        encoded = encode(row.content)
+        if isinstance(encoded, bytes):
+            updates.append({'id': row.id, 'content': encoded})
+    if updates:
+        connection.execute(text("UPDATE messages SET content = :content WHERE id = :id"), updates)
+    return len(updates)
+
+
+def get_stats() -> Dict[str, object]:
+    with _lock:
+        stats = dict(_stats)
+    stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+    stats['dictionary'] = _active[0] if _active is not None else None
+    stats['codec'] = 'zstd' if zstandard is not None else 'zlib'
+    return stats
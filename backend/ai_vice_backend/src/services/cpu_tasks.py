@@ -0,0 +1,32 @@
+"""
+Tarefas de CPU executadas no pool de processos (`CPUPool`).
+
+Cada tarefa é uma função de módulo com argumentos e retorno simples
+(serializáveis por pickle): recebe caminhos, não objetos abertos, e devolve
+apenas o necessário para o processo principal.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from src.services.extractors import extract
+from src.services.retrieval import chunk_text, embed, read_text_file, TEXT_EXTENSIONS
+
+
+def extract_file(file_path: str, file_name: str) -> Dict[str, Any]:
+    """
+    Extrai o conteúdo de um upload para análise (ver `extractors.extract`).
+    """
+    return extract(file_path, file_name)
+
+
+def prepare_chunks(file_path: str, file_name: str) -> List[Tuple[int, str, bytes]]:
+    """
+    Decodifica, divide em trechos e vetoriza um arquivo de texto.
+    Retorna (posição, conteúdo, vetor float32) por trecho.
+    """
+    if not file_name.lower().endswith(TEXT_EXTENSIONS):
+        return []
+    chunks = chunk_text(read_text_file(file_path))
+    # O nome do arquivo entra no vetor: "o que diz o relatorio.md?" acha o arquivo
+    return [(position, content, embed(f"{file_name}\n{content}").tobytes())
+            for position, content in enumerate(chunks)]
@@ -0,0 +1,82 @@
+"""
+Emissão de eventos por sala com micro-lotes opcionais.
+
+Com `SOCKETIO_BATCH_WINDOW_MS` > 0, eventos destinados à mesma sala dentro da
+janela são agrupados em um único frame `batch` (`[[evento, payload], ...]`).
+Um evento isolado na janela continua sendo emitido normalmente.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RoomEmitter:
+    """
+    Ponto único de emissão para salas de sessão.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.socketio = socketio
+        self.window = 0.0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[str, Any]]] = {}
+        self.frames = 0
+        self.events = 0
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.window = app.config.get('SOCKETIO_BATCH_WINDOW_MS', 0) / 1000.0
+
+    def emit(self, event: str, data: Any, room: str):
+        """
+        Emite (ou enfileira no lote da sala) um evento.
+        """
+        if self.window <= 0:
+            self._send(event, data, room)
+            return
+
+        with self._lock:
+            pending = self._pending.setdefault(room, [])
+            pending.append((event, data))
+            first = len(pending) == 1
+
+        if first:
+            self.socketio.start_background_task(self._flush_later, room)
+
+    def _flush_later(self, room: str):
+        self.socketio.sleep(self.window)
+        self.flush(room)
+
+    def flush(self, room: Optional[str] = None):
+        """
+        Envia imediatamente os eventos pendentes (de uma sala ou de todas).
+        """
+        with self._lock:
+            rooms = [room] if room is not None else list(self._pending)
+            batches = [(r, self._pending.pop(r, [])) for r in rooms]
+
+        for r, events in batches:
+            if len(events) == 1:
+                self._send(events[0][0], events[0][1], r)
+            elif events:
+                self._send('batch', [[event, data] for event, data in events], r, count=len(events))
+
+    def _send(self, event: str, data: Any, room: str, count: int = 1):
+        self.socketio.emit(event, data, room=room)
+        with self._lock:
+            self.frames += 1
+            self.events += count
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'window_ms': int(self.window * 1000),
+                'frames': self.frames,
+                'events': self.events,
+                'pending_rooms': len(self._pending)
+            }
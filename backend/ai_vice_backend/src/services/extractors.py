@@ -0,0 +1,334 @@
+"""
+Extração de conteúdo de arquivos enviados, por tipo.
+
+Cada extrator é registrado para um conjunto de extensões e devolve o texto que
+vai para o modelo — nunca o arquivo bruto quando há algo mais compacto:
+
+- texto/código: conteúdo decodificado (UTF-8, fallback latin-1), truncado;
+- PDF: texto extraído página a página, parando ao atingir o limite
+  (requer `pypdf`, opcional);
+- CSV: perfil local (schema, contagem de linhas, estatísticas por coluna
+  calculadas em blocos) e algumas linhas de amostra;
+- imagens: formato, dimensões e EXIF (requer Pillow, opcional).
+
+Os extratores são funções puras de módulo, executadas no pool de processos
+(`cpu_tasks.extract_file`) para que o parsing pesado não bloqueie as threads
+do Socket.IO.
+"""
+
+import csv
+import logging
+import math
+import os
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Limite de caracteres enviados ao modelo por arquivo
+MAX_CONTENT_CHARS = 8000
+TRUNCATED_NOTICE = "\n\n[Conteúdo truncado devido ao tamanho...]"
+
+CSV_CHUNK_ROWS = 5000
+CSV_SAMPLE_ROWS = 5
+CSV_MAX_COLUMNS = 50
+CSV_MAX_DISTINCT = 1000
+
+EXIF_FIELDS = (
+    "Make", "Model", "Software", "DateTime", "DateTimeOriginal", "Orientation",
+    "ExposureTime", "FNumber", "ISOSpeedRatings", "FocalLength", "LensModel", "ImageDescription"
+)
+
+EXTRACTORS: Dict[str, Callable[[str], Dict[str, Any]]] = {}
+
+
+def register(*extensions: str):
+    """
+    Registra um extrator para as extensões informadas (com ponto, minúsculas).
+    """
+    def decorator(func):
+        for extension in extensions:
+            EXTRACTORS[extension] = func
+        return func
+    return decorator
+
+
+def get_extractor(file_name: str) -> Optional[Callable[[str], Dict[str, Any]]]:
+    return EXTRACTORS.get(os.path.splitext(file_name)[1].lower())
+
+
+# Dependências opcionais importadas no primeiro arquivo do tipo (no processo do pool)
+@lru_cache(maxsize=None)
+def _pdf_reader():
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    return PdfReader
+
+
+@lru_cache(maxsize=None)
+def _pil():
+    try:
+        from PIL import ExifTags, Image
+    except ImportError:
+        return None, None
+    return Image, ExifTags
+
+
+def _truncate(content: str) -> str:
+    if len(content) > MAX_CONTENT_CHARS:
+        return content[:MAX_CONTENT_CHARS] + TRUNCATED_NOTICE
+    return content
+
+
+def _read_text(file_path: str, limit: Optional[int] = None) -> str:
+    with open(file_path, "rb") as f:
+        raw = f.read() if limit is None else f.read(limit)
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Leitura parcial pode cortar um caractere multibyte no final
+        if limit is not None and e.start >= len(raw) - 3:
+            return raw[:e.start].decode("utf-8")
+        return raw.decode("latin-1")
+
+
+@register(".txt", ".md", ".py", ".js", ".html", ".css", ".json", ".xml")
+def extract_text(file_path: str) -> Dict[str, Any]:
+    # Lê só o necessário (4 bytes por caractere no pior caso)
+    content = _read_text(file_path, limit=MAX_CONTENT_CHARS * 4 + 1)
+    return {
+        "kind": "text",
+        "content": _truncate(content),
+        "metadata": {"size": os.path.getsize(file_path)}
+    }
+
+
+@register(".pdf")
+def extract_pdf(file_path: str) -> Dict[str, Any]:
+    PdfReader = _pdf_reader()
+    if PdfReader is None:
+        return {"kind": "pdf", "content": None, "metadata": {"error": "Extração de PDF requer o pacote 'pypdf'"}}
+
+    reader = PdfReader(file_path)
+    parts = []
+    length = 0
+    pages_read = 0
+    # Página a página: para assim que o limite é atingido, sem processar o resto
+    for page in reader.pages:
+        text = (page.extract_text() or "").strip()
+        pages_read += 1
+        if text:
+            parts.append(f"--- Página {pages_read} ---\n{text}")
+            length += len(parts[-1])
+        if length >= MAX_CONTENT_CHARS:
+            break
+
+    metadata = {"pages": len(reader.pages), "pages_read": pages_read}
+    if reader.metadata:
+        metadata.update({key.lstrip("/").lower(): str(value) for key, value in reader.metadata.items()
+                         if key in ("/Title", "/Author", "/Subject", "/Producer")})
+    if not parts:
+        return {"kind": "pdf", "content": None, "metadata": dict(metadata, error="PDF sem texto extraível (digitalizado?)")}
+
+    header = f"PDF com {metadata['pages']} página(s)"
+    if metadata.get("title"):
+        header += f" — título: {metadata['title']}"
+    return {"kind": "pdf", "content": _truncate(header + "\n\n" + "\n\n".join(parts)), "metadata": metadata}
+
+
+def _parse_number(value: str) -> Optional[float]:
+    """
+    Número em notação americana ou brasileira ("1,5"); None se não for numérico.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        if value.count(",") != 1 or "." in value:
+            return None
+        try:
+            number = float(value.replace(",", "."))
+        except ValueError:
+            return None
+    return None if math.isnan(number) or math.isinf(number) else number
+
+
+class _ColumnProfile:
+    """
+    Estatísticas incrementais de uma coluna (Welford para média e desvio).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.empty = 0
+        self.numeric = 0
+        self.integer = True
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.max_length = 0
+        self.distinct = set()
+
+    def update(self, values):
+        for value in values:
+            value = value.strip()
+            self.count += 1
+            if not value:
+                self.empty += 1
+                continue
+            if len(self.distinct) < CSV_MAX_DISTINCT:
+                self.distinct.add(value)
+            self.max_length = max(self.max_length, len(value))
+            number = _parse_number(value)
+            if number is None:
+                continue
+            self.numeric += 1
+            self.integer = self.integer and number.is_integer()
+            delta = number - self.mean
+            self.mean += delta / self.numeric
+            self.m2 += delta * (number - self.mean)
+            self.minimum = min(self.minimum, number)
+            self.maximum = max(self.maximum, number)
+
+    def to_dict(self) -> Dict[str, Any]:
+        filled = self.count - self.empty
+        is_numeric = filled > 0 and self.numeric == filled
+        profile = {
+            "name": self.name,
+            "type": ("integer" if self.integer else "float") if is_numeric else "text",
+            "empty": self.empty,
+            "distinct": len(self.distinct) if len(self.distinct) < CSV_MAX_DISTINCT else f"{CSV_MAX_DISTINCT}+"
+        }
+        if is_numeric:
+            profile.update({
+                "min": self.minimum,
+                "max": self.maximum,
+                "mean": round(self.mean, 4),
+                "std": round(math.sqrt(self.m2 / (self.numeric - 1)), 4) if self.numeric > 1 else 0.0
+            })
+        else:
+            profile["max_length"] = self.max_length
+        return profile
+
+
+@register(".csv", ".tsv")
+def extract_csv(file_path: str) -> Dict[str, Any]:
+    with open(file_path, "rb") as f:
+        head = f.read(64 * 1024)
+    try:
+        head.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        encoding = "utf-8-sig" if e.start >= len(head) - 3 else "latin-1"
+
+    with open(file_path, "r", encoding=encoding, errors="replace", newline="") as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel_tab if file_path.lower().endswith(".tsv") else csv.excel
+        f.seek(0)
+        reader = csv.reader(f, dialect)
+
+        header = next(reader, None)
+        if header is None:
+            return {"kind": "csv", "content": None, "metadata": {"error": "CSV vazio"}}
+        header = [name.strip() or f"coluna_{i + 1}" for i, name in enumerate(header)]
+        width = len(header)
+        # Só as primeiras colunas são perfiladas (e mostradas na amostra)
+        columns = [_ColumnProfile(name) for name in header[:CSV_MAX_COLUMNS]]
+        profiled = len(columns)
+
+        sample = []
+        rows = 0
+        ragged = 0
+        # Blocos de linhas transpostos em colunas: cada perfil processa uma coluna inteira por vez
+        while True:
+            chunk = list(islice(reader, CSV_CHUNK_ROWS))
+            if not chunk:
+                break
+            if len(sample) < CSV_SAMPLE_ROWS:
+                sample.extend(chunk[:CSV_SAMPLE_ROWS - len(sample)])
+            for row in chunk:
+                if len(row) != width:
+                    ragged += 1
+                    row.extend([""] * (width - len(row)))
+            rows += len(chunk)
+            for profile, values in zip(columns, zip(*(row[:profiled] for row in chunk))):
+                profile.update(values)
+
+    profiles = [profile.to_dict() for profile in columns]
+    lines = [
+        f"CSV com {rows} linha(s) de dados e {width} coluna(s) (delimitador {dialect.delimiter!r})."
+    ]
+    if ragged:
+        lines.append(f"{ragged} linha(s) com número de colunas diferente do cabeçalho.")
+    if profiled < width:
+        lines.append(f"\nPerfil das primeiras {profiled} colunas (demais omitidas):")
+    else:
+        lines.append("\nPerfil das colunas:")
+    for profile in profiles:
+        details = ", ".join(f"{key}={value}" for key, value in profile.items() if key not in ("name", "type"))
+        lines.append(f"- {profile['name']} ({profile['type']}): {details}")
+    lines.append("\nAmostra:")
+    lines.append(dialect.delimiter.join(header[:profiled]))
+    lines.extend(dialect.delimiter.join(row[:profiled]) for row in sample)
+
+    return {
+        "kind": "csv",
+        "content": _truncate("\n".join(lines)),
+        "metadata": {"rows": rows, "columns": width, "profiled_columns": profiled, "profile": profiles}
+    }
+
+
+@register(".jpg", ".jpeg", ".png", ".gif", ".webp", ".tiff", ".bmp")
+def extract_image(file_path: str) -> Dict[str, Any]:
+    Image, ExifTags = _pil()
+    if Image is None:
+        return {"kind": "image", "content": None, "metadata": {"error": "Metadados de imagem requerem Pillow"}}
+
+    # Image.open lê apenas o cabeçalho; os pixels nunca são decodificados
+    with Image.open(file_path) as image:
+        metadata = {
+            "format": image.format,
+            "mode": image.mode,
+            "width": image.width,
+            "height": image.height,
+            "frames": getattr(image, "n_frames", 1)
+        }
+        exif = {}
+        raw_exif = image.getexif()
+        if raw_exif:
+            tags = dict(raw_exif)
+            tags.update(raw_exif.get_ifd(ExifTags.IFD.Exif))
+            for tag, value in tags.items():
+                name = ExifTags.TAGS.get(tag)
+                if name in EXIF_FIELDS:
+                    exif[name] = value.decode("utf-8", "replace").strip("\x00") if isinstance(value, bytes) else str(value)
+        metadata["exif"] = exif
+
+    lines = [
+        f"Imagem {metadata['format']} de {metadata['width']}x{metadata['height']} pixels, modo {metadata['mode']}"
+        + (f", {metadata['frames']} quadros" if metadata["frames"] > 1 else "") + "."
+    ]
+    if exif:
+        lines.append("EXIF:")
+        lines.extend(f"- {name}: {value}" for name, value in exif.items())
+    else:
+        lines.append("Sem metadados EXIF.")
+    return {"kind": "image", "content": "\n".join(lines), "metadata": metadata}
+
+
+def extract(file_path: str, file_name: str) -> Dict[str, Any]:
+    """
+    Executa o extrator registrado para o arquivo. `content` é None quando o
+    tipo não é suportado ou a extração não produziu texto.
+    """
+    extractor = get_extractor(file_name)
+    if extractor is None:
+        return {"kind": "unsupported", "content": None, "metadata": {}}
+    return extractor(file_path)
+
@@ -0,0 +1,310 @@
+"""
+Escalonamento justo (weighted fair queuing) das chamadas à IA por usuário.
+
+Sem isso, um usuário que envia centenas de mensagens por script ocupa a
+capacidade do provedor na ordem de chegada. Aqui cada chamada recebe uma
+etiqueta de término virtual (self-clocked fair queuing):
+
+    término = max(tempo virtual, último término do usuário) + custo / peso
+
+e a próxima vaga (`FAIR_MAX_CONCURRENT`) vai para a menor etiqueta entre os
+usuários elegíveis. O custo é a estimativa de tokens; o peso vem do plano do
+usuário (`FAIR_TIER_WEIGHTS`, `FAIR_USER_TIERS`). Quem tem muitas chamadas na
+fila acumula etiquetas distantes, e uma mensagem isolada de outro usuário
+passa na frente.
+
+Limites por usuário: no máximo `FAIR_USER_MAX_CONCURRENT` chamadas simultâneas
+e um balde de `FAIR_USER_TOKENS_PER_MINUTE` tokens por minuto (multiplicado
+pelo peso do plano). Usuário sem saldo não é rejeitado: espera o balde encher.
+Só usuários com chamadas na fila ou em andamento têm estado completo; de quem
+fica ocioso com o balde incompleto guardamos apenas o saldo, até ele encher.
+
+A vez é pedida pelo `JobManager` ao receber o job, antes de ele ocupar um
+worker do shard: chamadas na fila não prendem threads. A chave é o dono
+gravado da sessão, não o `user_id` enviado a cada mensagem pelo cliente.
+
+Métrica de justiça: uma chamada "interativa" (a única do usuário em fila ou em
+andamento) que espera mais de `FAIR_INTERACTIVE_WAIT_MS` conta como violação,
+exceto quando a espera veio do limite de tokens do próprio usuário.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Estimativas de custo (tokens) quando o uso real ainda não é conhecido
+CHARS_PER_TOKEN = 4
+RESPONSE_TOKENS_ESTIMATE = 500
+FILE_ANALYSIS_TOKENS_ESTIMATE = 3000
+# Histórico e trechos de documentos, ainda não montados quando o job entra na fila
+CONTEXT_TOKENS_ESTIMATE = 1000
+
+DEFAULT_TIER = 'free'
+
+
+def estimate_tokens(*texts: str) -> int:
+    """
+    Estimativa de tokens de prompt a partir do tamanho dos textos.
+    """
+    return sum(len(text or '') for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    # "chave:valor,chave:valor"
+    pairs = (item.split(':', 1) for item in value.split(',') if ':' in item)
+    return {key.strip(): val.strip() for key, val in pairs if key.strip()}
+
+
+class _Ticket:
+    __slots__ = ('user', 'tier', 'cost', 'finish', 'future', 'queued_at', 'interactive', 'throttled')
+
+    def __init__(self, user: str, tier: str, cost: int, finish: float, interactive: bool):
+        self.user = user
+        self.tier = tier
+        self.cost = cost
+        self.finish = finish
+        self.future: Future = Future()
+        self.queued_at = time.monotonic()
+        self.interactive = interactive
+        # Esperou pelo balde do próprio usuário (não conta como violação)
+        self.throttled = False
+
+
+class _UserState:
+    __slots__ = ('queue', 'active', 'last_finish', 'tokens', 'refilled_at')
+
+    def __init__(self, capacity: float):
+        self.queue: Deque[_Ticket] = deque()
+        self.active = 0
+        self.last_finish = 0.0
+        self.tokens = capacity
+        self.refilled_at = time.monotonic()
+
+
+class FairShareScheduler:
+    """
+    Fila justa entre usuários na frente do `AIService`.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.max_concurrent = 8
+        self.user_max_concurrent = 2
+        self.tokens_per_minute = 20000
+        self.interactive_wait = 2.0
+        self.tier_weights: Dict[str, float] = {DEFAULT_TIER: 1.0}
+        self.user_tiers: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        # Usuários com chamadas na fila ou em andamento
+        self._users: Dict[str, _UserState] = {}
+        # Ociosos com o balde incompleto: usuário -> (saldo, horário do saldo, horário em que enche)
+        self._idle: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._active = 0
+        self._virtual_time = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self.dispatched = 0
+        self.cancelled = 0
+        self.throttled = 0
+        self.violations = 0
+        self._waits: Dict[str, Deque[float]] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('FAIR_MAX_CONCURRENT', 8)
+        app.config.setdefault('FAIR_USER_MAX_CONCURRENT', 2)
+        app.config.setdefault('FAIR_USER_TOKENS_PER_MINUTE', 20000)
+        app.config.setdefault('FAIR_INTERACTIVE_WAIT_MS', 2000)
+        app.config.setdefault('FAIR_TIER_WEIGHTS', 'free:1,pro:4')
+        app.config.setdefault('FAIR_USER_TIERS', '')
+        self.max_concurrent = int(app.config['FAIR_MAX_CONCURRENT'])
+        self.user_max_concurrent = int(app.config['FAIR_USER_MAX_CONCURRENT'])
+        self.tokens_per_minute = int(app.config['FAIR_USER_TOKENS_PER_MINUTE'])
+        self.interactive_wait = int(app.config['FAIR_INTERACTIVE_WAIT_MS']) / 1000
+        weights = {tier: float(weight) for tier, weight in _parse_mapping(app.config['FAIR_TIER_WEIGHTS']).items()}
+        self.tier_weights = {DEFAULT_TIER: 1.0, **weights}
+        self.user_tiers = _parse_mapping(app.config['FAIR_USER_TIERS'])
+
+    def tier_for(self, user: str) -> str:
+        tier = self.user_tiers.get(user, DEFAULT_TIER)
+        return tier if tier in self.tier_weights else DEFAULT_TIER
+
+    def _capacity(self, tier: str) -> float:
+        return self.tokens_per_minute * self.tier_weights[tier]
+
+    def _refill(self, state: _UserState, tier: str, now: float):
+        capacity = self._capacity(tier)
+        state.tokens = min(capacity, state.tokens + (now - state.refilled_at) * capacity / 60)
+        state.refilled_at = now
+
+    def submit(self, user: str, cost: int) -> _Ticket:
+        """
+        Enfileira uma chamada de custo `cost` (tokens estimados). `ticket.future`
+        é resolvido quando a chamada pode seguir para o provedor (os callbacks
+        rodam fora do lock do escalonador).
+        """
+        tier = self.tier_for(user)
+        with self._lock:
+            state = self._users.get(user)
+            if state is None:
+                state = self._users[user] = _UserState(self._capacity(tier))
+                balance = self._idle.pop(user, None)
+                if balance is not None:
+                    state.tokens, state.refilled_at, _ = balance
+            interactive = not state.queue and not state.active
+            finish = max(self._virtual_time, state.last_finish) + cost / self.tier_weights[tier]
+            state.last_finish = finish
+            ticket = _Ticket(user, tier, cost, finish, interactive)
+            state.queue.append(ticket)
+            granted = self._dispatch()
+        self._grant(granted)
+        return ticket
+
+    @staticmethod
+    def _grant(tickets: List[_Ticket]):
+        # Fora do lock: os callbacks dos futures iniciam os jobs
+        for ticket in tickets:
+            ticket.future.set_result(ticket)
+
+    def _dispatch(self) -> List[_Ticket]:
+        # Chamado com o lock: escolhe as menores etiquetas elegíveis para as vagas livres
+        now = time.monotonic()
+        retry_in = None
+        granted = []
+        while self._active < self.max_concurrent:
+            best = None
+            for user, state in self._users.items():
+                if not state.queue or state.active >= self.user_max_concurrent:
+                    continue
+                head = state.queue[0]
+                self._refill(state, head.tier, now)
+                # Chamadas maiores que o balde inteiro passam quando ele está cheio
+                needed = min(head.cost, self._capacity(head.tier))
+                if state.tokens < needed:
+                    head.throttled = True
+                    wait = (needed - state.tokens) * 60 / self._capacity(head.tier)
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                    continue
+                if best is None or head.finish < best[1].finish:
+                    best = (state, head)
+            if best is None:
+                break
+
+            state, ticket = best
+            state.queue.popleft()
+            state.active += 1
+            state.tokens -= ticket.cost
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, ticket.finish)
+            self.dispatched += 1
+            waited = now - ticket.queued_at
+            self._waits.setdefault(ticket.tier, deque(maxlen=500)).append(waited)
+            if ticket.interactive and not ticket.throttled and waited > self.interactive_wait:
+                self.violations += 1
+                logger.warning(f"Chamada interativa de {ticket.user} esperou {waited:.1f}s na fila da IA")
+            granted.append(ticket)
+
+        if retry_in is not None and self._timer is None:
+            # Há usuários sem saldo: reavaliar quando o balde encher
+            self.throttled += 1
+            self._timer = threading.Timer(retry_in + 0.01, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+        return granted
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            granted = self._dispatch()
+        self._grant(granted)
+
+    def _forget_idle(self, user: str, state: _UserState):
+        # Usuário sem chamadas sai de `_users`; só o saldo fica, se o balde não estiver cheio
+        if state.queue or state.active:
+            return
+        self._users.pop(user, None)
+        now = time.monotonic()
+        tier = self.tier_for(user)
+        capacity = self._capacity(tier)
+        self._refill(state, tier, now)
+        if state.tokens < capacity:
+            full_at = now + (capacity - state.tokens) * 60 / capacity
+            self._idle[user] = (state.tokens, state.refilled_at, full_at)
+            self._idle.move_to_end(user)
+        # Saldos que já encheram não precisam ser guardados (ordem aproximada de saída)
+        while self._idle:
+            _, (_, _, full_at) = next(iter(self._idle.items()))
+            if full_at > now:
+                break
+            self._idle.popitem(last=False)
+
+    def withdraw(self, ticket: _Ticket) -> bool:
+        """
+        Retira a chamada se ela ainda estiver na fila (o future é cancelado).
+        Retorna False quando a vaga já foi concedida.
+        """
+        with self._lock:
+            state = self._users.get(ticket.user)
+            if state is None or ticket not in state.queue:
+                return False
+            state.queue.remove(ticket)
+            self.cancelled += 1
+            granted = self._dispatch()
+            self._forget_idle(ticket.user, state)
+        ticket.future.cancel()
+        self._grant(granted)
+        return True
+
+    def cancel(self, ticket: _Ticket):
+        """
+        Retira a chamada da fila; se a vaga já tinha sido concedida, libera-a.
+        """
+        if not self.withdraw(ticket) and ticket.future.done() and not ticket.future.cancelled():
+            self.release(ticket)
+
+    def release(self, ticket: _Ticket, used_tokens: Optional[int] = None):
+        """
+        Devolve a vaga. Com `used_tokens`, corrige o balde pela diferença
+        entre o custo estimado e o real.
+        """
+        with self._lock:
+            state = self._users.get(ticket.user)
+            if state is None:
+                return
+            state.active -= 1
+            self._active -= 1
+            if used_tokens is not None:
+                state.tokens = min(self._capacity(ticket.tier), state.tokens + ticket.cost - used_tokens)
+            granted = self._dispatch()
+            self._forget_idle(ticket.user, state)
+        self._grant(granted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {user: len(state.queue) for user, state in self._users.items() if state.queue}
+            waits = {
+                tier: {
+                    'avg_ms': round(sum(values) / len(values) * 1000, 1),
+                    'max_ms': round(max(values) * 1000, 1)
+                }
+                for tier, values in self._waits.items() if values
+            }
+            return {
+                'active': self._active,
+                'max_concurrent': self.max_concurrent,
+                'queued': sum(queued.values()),
+                'users_queued': len(queued),
+                'users_tracked': len(self._users) + len(self._idle),
+                'top_queued': dict(sorted(queued.items(), key=lambda item: -item[1])[:5]),
+                'dispatched': self.dispatched,
+                'cancelled': self.cancelled,
+                'throttled': self.throttled,
+                'fairness_violations': self.violations,
+                'wait_by_tier': waits
+            }
@@ -0,0 +1,209 @@
+"""
+Jobs de IA canceláveis, vinculados ao socket e à sessão que os iniciou.
+
+Cada evento `message`/`analyze_file` vira um `AIJob` executado na fila do shard
+da sessão (`ShardRouter`) ou, sem roteador, em uma tarefa de background do
+SocketIO. Com `fair_key`, o job antes espera a vez na fila justa da IA
+(`FairShareScheduler`) sem ocupar worker; a vaga é devolvida pelo handler
+(`release_slot`) ou ao fim do job.
+
+O job pode ser cancelado quando o cliente desconecta, envia uma nova mensagem
+na mesma sessão ou emite o evento `cancel`; o `AIService` verifica o
+`cancel_event` durante o streaming e fecha a conexão com o provedor.
+"""
+
+import asyncio
+import logging
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.services.ai_service import GenerationCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class AIJob:
+    """
+    Uma geração de IA em andamento.
+    """
+
+    def __init__(self, manager: "JobManager", sid: Optional[str], session_id: str, kind: str):
+        self.id = uuid.uuid4().hex
+        self.manager = manager
+        self.sid = sid
+        self.session_id = session_id
+        self.kind = kind
+        # Shard dono da sessão durante todo o job (caches e escritor)
+        self.shard = None
+        self.cancel_event = threading.Event()
+        self.cancel_reason: Optional[str] = None
+        # Vaga na fila justa da IA (None sem escalonamento ou já devolvida)
+        self.ticket = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self, reason: str):
+        if not self.cancel_event.is_set():
+            self.cancel_reason = reason
+            self.cancel_event.set()
+            logger.info(f"Job {self.id} ({self.kind}) da sessão {self.session_id} cancelado: {reason}")
+            if self.ticket is not None:
+                # Ainda na fila justa: sai dela sem chegar a um worker
+                self.manager.scheduler.withdraw(self.ticket)
+
+    def release_slot(self, used_tokens: Optional[int] = None):
+        """
+        Devolve a vaga da fila justa (com o uso real de tokens, se conhecido).
+        """
+        ticket, self.ticket = self.ticket, None
+        if ticket is not None:
+            self.manager.scheduler.release(ticket, used_tokens)
+
+    def raise_if_cancelled(self):
+        if self.cancel_event.is_set():
+            raise GenerationCancelled(self.cancel_reason or "cancelado")
+
+    def emit(self, event: str, data: Any, room: Optional[str] = None):
+        """
+        Emite um evento fora do contexto de requisição (sala da sessão por padrão).
+        """
+        self.manager.emitter.emit(event, data, room=room or self.session_id)
+
+    def emit_error(self, message: str):
+        """
+        Envia um erro apenas ao socket que iniciou o job.
+        """
+        if self.sid:
+            self.manager.socketio.emit('error', {'message': message}, to=self.sid)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'session_id': self.session_id,
+            'kind': self.kind,
+            'cancelled': self.cancelled
+        }
+
+
+class JobManager:
+    """
+    Registro dos jobs ativos por id, socket e sessão.
+    """
+
+    def __init__(self, app=None, socketio=None, emitter=None, router=None, scheduler=None):
+        self.app = app
+        self.socketio = socketio
+        self.emitter = emitter
+        self.router = router
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, AIJob] = {}
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+
+    def submit(self, sid: Optional[str], session_id: str, kind: str,
+               handler: Callable[[Dict[str, Any], AIJob], Awaitable[Any]],
+               data: Dict[str, Any], supersede: bool = False,
+               fair_key: Optional[str] = None, cost: int = 0) -> AIJob:
+        """
+        Cria e inicia um job. Com `supersede=True`, cancela os jobs do mesmo
+        tipo ainda em andamento na sessão (ex.: nova mensagem antes da resposta).
+        Com `fair_key`, o job só vai para o worker quando a fila justa conceder
+        a vaga (custo `cost` em tokens estimados).
+        """
+        if supersede and session_id:
+            self.cancel_session(session_id, kind=kind, reason='substituído por nova mensagem')
+
+        job = AIJob(self, sid, session_id, kind)
+        with self._lock:
+            self._jobs[job.id] = job
+
+        if self.router is not None and session_id:
+            job.shard = self.router.shard_for(session_id)
+
+        if fair_key is not None and self.scheduler is not None:
+            job.ticket = self.scheduler.submit(fair_key, cost)
+            if job.cancelled:
+                # Cancelado antes de a vaga ser pedida
+                self.scheduler.withdraw(job.ticket)
+            job.ticket.future.add_done_callback(lambda future: self._admitted(job, handler, data, future))
+        else:
+            self._start(job, handler, data)
+        return job
+
+    def _admitted(self, job: AIJob, handler, data: Dict[str, Any], future):
+        # Vaga concedida (ou job retirado da fila por cancelamento)
+        if future.cancelled():
+            self._finish(job)
+            job.emit('cancelled', {'job_id': job.id, 'reason': job.cancel_reason})
+            return
+        try:
+            self._start(job, handler, data)
+        except Exception as e:
+            logger.error(f"Erro ao iniciar job {job.id} ({job.kind}): {str(e)}")
+            job.release_slot()
+            self._finish(job)
+
+    def _start(self, job: AIJob, handler, data: Dict[str, Any]):
+        if job.shard is not None:
+            job.shard.submit(job.session_id, self._run, job, handler, data)
+        else:
+            self.socketio.start_background_task(self._run, job, handler, data)
+
+    def _finish(self, job: AIJob):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def _run(self, job: AIJob, handler, data: Dict[str, Any]):
+        try:
+            with self.app.app_context():
+                asyncio.run(handler(data, job))
+        except GenerationCancelled:
+            job.emit('cancelled', {'job_id': job.id, 'reason': job.cancel_reason})
+        except Exception as e:
+            logger.error(f"Erro no job {job.id} ({job.kind}): {str(e)}")
+        finally:
+            job.release_slot()
+            self._finish(job)
+
+    def _matching(self, predicate: Callable[[AIJob], bool]) -> List[AIJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if predicate(job)]
+
+    def cancel(self, job_id: str, sid: Optional[str] = None, reason: str = 'cancelado pelo cliente') -> bool:
+        """
+        Cancela um job pelo id (restrito ao socket informado, se houver).
+        """
+        jobs = self._matching(lambda job: job.id == job_id and (sid is None or job.sid == sid))
+        for job in jobs:
+            job.cancel(reason)
+        return bool(jobs)
+
+    def cancel_sid(self, sid: str, reason: str = 'cliente desconectado') -> int:
+        jobs = self._matching(lambda job: job.sid == sid)
+        for job in jobs:
+            job.cancel(reason)
+        return len(jobs)
+
+    def cancel_session(self, session_id: str, kind: Optional[str] = None,
+                       reason: str = 'sessão encerrada') -> int:
+        jobs = self._matching(
+            lambda job: job.session_id == session_id and (kind is None or job.kind == kind)
+        )
+        for job in jobs:
+            job.cancel(reason)
+        return len(jobs)
+
+    def count(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if kind is None or job.kind == kind)
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in self._matching(lambda job: True)]
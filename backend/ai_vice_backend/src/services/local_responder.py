@@ -0,0 +1,63 @@
+"""
+Respostas locais por palavra-chave para mensagens conversacionais curtas.
+
+Intenções conversacionais e respostas do `ManusAIIntegration._generate_response`
+do `server.py`, usadas em modo degradado (ver `AdmissionController`): saudações,
+agradecimentos e afins são respondidos na hora, sem chamar a IA. As intenções
+de tema (programação, criatividade) e a resposta genérica ficam de fora: essas
+mensagens são perguntas de verdade e seguem para a IA.
+"""
+
+import re
+import unicodedata
+from typing import Optional, Tuple
+
+_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+INTENTS: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("olá", "oi", "hello", "hey"),
+     "Olá! 👋 Que bom te ver aqui! Sou o AI Vice, seu assistente de IA. Como posso ajudar você hoje?"),
+    (("como você está", "tudo bem", "como vai"),
+     "Estou muito bem, obrigado por perguntar! 😊 Estou aqui, funcionando perfeitamente e pronto para ajudar você com qualquer coisa. E você, como está se sentindo hoje?"),
+    (("quem é você", "o que você é", "quem você é"),
+     "Eu sou o AI Vice! 🤖 Sou um assistente de inteligência artificial criado para ser seu companheiro digital. Posso ajudar com perguntas, conversas, análises, programação, criatividade e muito mais. Minha missão é tornar sua experiência mais produtiva e agradável!"),
+    (("obrigado", "obrigada", "valeu", "thanks"),
+     "De nada! 😊 Fico muito feliz em poder ajudar. É sempre um prazer conversar com você. Se precisar de mais alguma coisa, estarei aqui!"),
+    (("tchau", "até logo", "bye", "adeus"),
+     "Até logo! 👋 Foi ótimo conversar com você hoje. Espero te ver em breve por aqui. Tenha um dia maravilhoso!"),
+    (("ajuda", "help", "socorro"),
+     """Claro! Estou aqui para ajudar! 🌟 Posso te auxiliar com:
+
+• 💬 Conversas sobre qualquer assunto
+• 🧠 Perguntas e explicações
+• 💻 Programação e tecnologia
+• 📝 Escrita e criatividade
+• 🔍 Pesquisas e análises
+• 🎯 Resolução de problemas
+
+O que você gostaria de explorar hoje?"""),
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD_PATTERN.findall(text))
+
+
+# Comparação por palavras inteiras ("oi" não casa com "oito")
+_COMPILED_INTENTS = tuple(
+    (tuple(f" {_normalize(keyword)} " for keyword in keywords), reply)
+    for keywords, reply in INTENTS
+)
+
+
+def local_reply(message: str) -> Optional[str]:
+    """
+    Resposta local para a mensagem, ou None se nenhuma intenção for reconhecida.
+    """
+    normalized = f" {_normalize(message)} "
+    for keywords, reply in _COMPILED_INTENTS:
+        if any(keyword in normalized for keyword in keywords):
+            return reply
+    return None
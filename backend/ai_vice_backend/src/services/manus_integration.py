@@ -1,21 +1,31 @@
 import asyncio
 import logging
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
-from src.models.message import db, Message, ChatSession
+from sqlalchemy import and_, or_
+from src.models.message import (
+    db, Message, ChatSession, STATUS_ANSWERED, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING
+)
 from src.services.ai_service import AIService
 
 logger = logging.getLogger(__name__)
 
+# Janela de mensagens consideradas para resposta automática
+PENDING_WINDOW_MINUTES = 5
+# Mensagens em processamento há mais tempo que isso são retomadas por outro worker
+CLAIM_TIMEOUT_SECONDS = 120
+PENDING_BATCH_SIZE = 20
+
 class ManusIntegrationService:
     """
     Serviço de integração direta com Manus para processar mensagens em tempo real
     """
     
-    def __init__(self, socketio_instance):
+    def __init__(self, socketio_instance, ai_service: Optional[AIService] = None):
         self.socketio = socketio_instance
-        self.ai_service = AIService()
+        # Reaproveita o serviço de IA do app quando fornecido (um único cliente OpenAI)
+        self.ai_service = ai_service or AIService()
         self.is_running = False
         self.active_sessions = {}
         
@@ -55,28 +65,18 @@ class ManusIntegrationService:
         Busca mensagens de usuários que precisam de resposta
         """
         try:
-            # Buscar mensagens de usuários dos últimos 5 minutos que não têm resposta da IA
-            recent_time = datetime.utcnow().replace(second=0, microsecond=0)
-            
-            # Query para encontrar mensagens de usuário sem resposta subsequente da IA
-            user_messages = db.session.query(Message).filter(
-                Message.sender == 'user',
-                Message.timestamp >= recent_time.replace(minute=recent_time.minute - 5)
-            ).order_by(Message.timestamp.desc()).all()
-            
-            pending = []
-            for msg in user_messages:
-                # Verificar se já existe uma resposta da IA para esta mensagem
-                ai_response = db.session.query(Message).filter(
-                    Message.session_id == msg.session_id,
-                    Message.sender == 'ai',
-                    Message.timestamp > msg.timestamp
-                ).first()
-                
-                if not ai_response:
-                    pending.append(msg)
-            
-            return pending
+            # Uma única consulta indexada por status: pendentes recentes e
+            # mensagens em processamento cujo worker parou (claim expirado)
+            recent_time = datetime.utcnow() - timedelta(minutes=PENDING_WINDOW_MINUTES)
+            stale_before = datetime.utcnow() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+            
+            return db.session.query(Message).filter(
+                Message.timestamp >= recent_time,
+                or_(
+                    Message.status == STATUS_PENDING,
+                    and_(Message.status == STATUS_PROCESSING, Message.claimed_at < stale_before)
+                )
+            ).order_by(Message.timestamp.asc()).limit(PENDING_BATCH_SIZE).all()
             
         except Exception as e:
             logger.error(f"Erro ao buscar mensagens pendentes: {str(e)}")
@@ -86,9 +86,16 @@ class ManusIntegrationService:
         """
         Processa uma mensagem individual do usuário
         """
+        claimed = False
         try:
             session_id = message.session_id
             
+            # Claim atômico: vários workers/processos podem dividir as pendências
+            stale_before = datetime.utcnow() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+            claimed = Message.claim(message.id, stale_before=stale_before)
+            if not claimed:
+                return
+            
             # Log da mensagem recebida
             logger.info(f"📨 Nova mensagem de {message.user_id or 'usuário anônimo'}: {message.content[:100]}...")
             
@@ -104,9 +111,11 @@ class ManusIntegrationService:
                 session_id=session_id,
                 content=ai_response,
                 sender='ai',
-                message_type='text'
+                message_type='text',
+                reply_to=message.id
             )
             db.session.add(ai_message)
+            message.status = STATUS_ANSWERED
             
             # Atualizar última atividade da sessão
             session = ChatSession.query.get(session_id)
@@ -116,13 +125,17 @@ class ManusIntegrationService:
             db.session.commit()
             
             # Emitir resposta via WebSocket
-            self.socketio.emit('message', ai_message.to_dict(), room=session_id)
+            self.socketio.emit('message', ai_message.to_payload(), room=session_id)
             
             # Log da resposta enviada
             logger.info(f"✅ Resposta enviada para sessão {session_id}: {ai_response[:100]}...")
             
         except Exception as e:
             logger.error(f"Erro ao processar mensagem do usuário: {str(e)}")
+            db.session.rollback()
+            if claimed:
+                message.status = STATUS_FAILED
+                db.session.commit()
     
     def _get_conversation_history(self, session_id: str) -> list:
         """
@@ -130,7 +143,7 @@ class ManusIntegrationService:
         """
         try:
             messages = Message.query.filter_by(session_id=session_id)\
-                                  .order_by(Message.timestamp.desc())\
+                                  .order_by(Message.seq.desc())\
                                   .limit(20).all()
             
             return [msg.to_dict() for msg in reversed(messages)]
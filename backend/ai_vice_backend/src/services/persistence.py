@@ -0,0 +1,122 @@
+"""
+Escrita em segundo plano (write-behind) para o caminho quente das mensagens.
+
+Um único thread escritor aplica as escritas na ordem de envio (FIFO): o SQLite
+aceita um escritor por vez, e a ordem garante, por exemplo, que a mensagem do
+usuário seja gravada antes da resposta que a referencia. Cada escrita roda em
+seu próprio app context e é repetida com backoff quando o banco está ocupado.
+
+`submit` devolve um Future: quem precisa da garantia de durabilidade (ex.: não
+emitir uma resposta para uma mensagem que não foi gravada) espera por ele.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.exc import OperationalError
+
+from src.models.message import db
+
+logger = logging.getLogger(__name__)
+
+WRITE_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.05
+
+
+class WriteBehind:
+    """
+    Fila FIFO de escritas executadas por um thread dedicado.
+    """
+
+    def __init__(self, app=None, name: str = 'write-behind'):
+        self.app = app
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Enfileira `fn(*args)`; executada em um app context, com commit a cargo de `fn`.
+        """
+        if self.app is None:
+            raise RuntimeError("WriteBehind não inicializado (chame init_app)")
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def stop(self):
+        """
+        Encerra o thread depois das escritas já enfileiradas.
+        """
+        self._queue.put(None)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                with self._lock:
+                    self._thread = None
+                return
+            fn, args, future, queued_at = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self._apply(fn, args)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Erro na escrita em segundo plano ({fn.__name__}): {str(e)}")
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.completed += 1
+                    self.total_seconds += time.perf_counter() - queued_at
+                future.set_result(result)
+
+    def _apply(self, fn: Callable[..., Any], args) -> Any:
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            with self.app.app_context():
+                try:
+                    return fn(*args)
+                except OperationalError:
+                    # Banco bloqueado/ocupado: desfaz e tenta de novo
+                    db.session.rollback()
+                    if attempt == WRITE_ATTEMPTS:
+                        raise
+                    with self._lock:
+                        self.retries += 1
+                except Exception:
+                    db.session.rollback()
+                    raise
+            time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'completed': self.completed,
+                'failed': self.failed,
+                'retries': self.retries,
+                'avg_latency_ms': round(self.total_seconds / (self.completed or 1) * 1000, 2)
+            }
@@ -0,0 +1,210 @@
+"""
+Ferramentas de diagnóstico para um processo em produção (usadas pelas rotas
+de admin).
+
+- Memória: snapshots do `tracemalloc` com as maiores alocações e a diferença
+  em relação ao snapshot anterior. O rastreamento só começa no primeiro
+  snapshot (tem custo de CPU e memória) e pode ser desligado depois.
+- CPU: amostragem das pilhas de todas as threads (`sys._current_frames`) por
+  alguns segundos, no formato "collapsed stacks" aceito por flamegraph.pl,
+  speedscope e inferno. Não precisa de dependência nem de reinício.
+- Threads: pilha atual de cada thread (workers dos shards, escritores,
+  retenção, admissão...).
+- Objetos: contagem de instâncias por tipo via `gc`.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+# Frames do próprio tracemalloc/import não interessam nos snapshots
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+# Folhas de pilha de threads paradas esperando (omitidas por padrão no perfil de CPU)
+IDLE_LEAVES = {
+    ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'), ('queue.py', 'get'), ('socket.py', 'accept'),
+    ('socket.py', 'readinto'), ('socketserver.py', 'serve_forever'),
+}
+
+MAX_STACK_DEPTH = 64
+
+
+def _rss_kb() -> Optional[int]:
+    # RSS atual (Linux); None em outros sistemas
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryProfiler:
+    """
+    Snapshots do tracemalloc sob demanda, com diferença entre snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def snapshot(self, limit: int = 20, group_by: str = 'lineno', frames: int = 10) -> Dict[str, Any]:
+        """
+        Maiores alocações vivas e diferença para o snapshot anterior. A
+        primeira chamada só liga o rastreamento (alocações anteriores não
+        aparecem).
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._previous = None
+                return {'tracing': True, 'started': True, 'rss_kb': _rss_kb()}
+
+            snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            previous, self._previous = self._previous, snapshot
+            current, peak = tracemalloc.get_traced_memory()
+
+        result = {
+            'tracing': True,
+            'started': False,
+            'rss_kb': _rss_kb(),
+            'traced_kb': current // 1024,
+            'traced_peak_kb': peak // 1024,
+            'top': [
+                {'location': self._location(stat.traceback, group_by), 'size_kb': round(stat.size / 1024, 1),
+                 'count': stat.count}
+                for stat in snapshot.statistics(group_by)[:limit]
+            ]
+        }
+        if previous is not None:
+            result['diff'] = [
+                {'location': self._location(stat.traceback, group_by), 'size_diff_kb': round(stat.size_diff / 1024, 1),
+                 'size_kb': round(stat.size / 1024, 1), 'count_diff': stat.count_diff}
+                for stat in snapshot.compare_to(previous, group_by)[:limit]
+            ]
+        return result
+
+    @staticmethod
+    def _location(trace: tracemalloc.Traceback, group_by: str):
+        if group_by == 'traceback':
+            return [f"{frame.filename}:{frame.lineno}" for frame in trace]
+        frame = trace[0]
+        return frame.filename if group_by == 'filename' else f"{frame.filename}:{frame.lineno}"
+
+    def stop(self) -> bool:
+        with self._lock:
+            self._previous = None
+            if not tracemalloc.is_tracing():
+                return False
+            tracemalloc.stop()
+            return True
+
+
+class CPUProfiler:
+    """
+    Profiler por amostragem: uma execução por vez, por tempo limitado.
+    """
+
+    def __init__(self):
+        self._running = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._running.locked()
+
+    def profile(self, seconds: float, interval: float = 0.01, include_idle: bool = False,
+                thread_prefix: Optional[str] = None) -> Optional[str]:
+        """
+        Amostra as pilhas por `seconds` segundos na thread atual e retorna
+        as pilhas agregadas ("thread;frame;...;frame contagem" por linha).
+        Retorna None se outra amostragem já estiver em andamento.
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            counts: Counter = Counter()
+            own = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    name = names.get(ident, f"thread-{ident}")
+                    if thread_prefix and not name.startswith(thread_prefix):
+                        continue
+                    stack = self._stack(frame)
+                    if not include_idle and stack[-1][0] in IDLE_LEAVES:
+                        continue
+                    counts[(name,) + tuple(label for _, label in stack)] += 1
+                time.sleep(interval)
+        finally:
+            self._running.release()
+
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common())
+
+    @staticmethod
+    def _stack(frame) -> List:
+        # (chave de ociosidade, rótulo) do frame mais externo ao mais interno
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            file_name = os.path.basename(code.co_filename)
+            label = f"{file_name}:{code.co_qualname}".replace(';', ':').replace(' ', '_')
+            stack.append(((file_name, code.co_name), label))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+
+def thread_dump() -> List[Dict[str, Any]]:
+    """
+    Pilha atual de cada thread viva.
+    """
+    frames = sys._current_frames()
+    dump = []
+    for thread in sorted(threading.enumerate(), key=lambda thread: thread.name):
+        frame = frames.get(thread.ident)
+        dump.append({
+            'name': thread.name,
+            'ident': thread.ident,
+            'daemon': thread.daemon,
+            'stack': traceback.format_stack(frame) if frame is not None else []
+        })
+    return dump
+
+
+def object_counts(limit: int = 30, tracked: Iterable[type] = ()) -> Dict[str, Any]:
+    """
+    Instâncias vivas por tipo (as `limit` mais numerosas) e a contagem exata
+    dos tipos em `tracked`.
+    """
+    gc.collect()
+    counts: Counter = Counter()
+    tracked = tuple(tracked)
+    tracked_counts = {cls.__name__: 0 for cls in tracked}
+    for obj in gc.get_objects():
+        cls = type(obj)
+        counts[cls.__qualname__] += 1
+        if tracked and isinstance(obj, tracked):
+            tracked_counts[cls.__name__] = tracked_counts.get(cls.__name__, 0) + 1
+    return {
+        'total': sum(counts.values()),
+        'tracked': tracked_counts,
+        'top': dict(counts.most_common(limit))
+    }
@@ -0,0 +1,187 @@
+"""
+Montagem de prompts do AI Vice.
+
+Os textos de sistema e templates são pré-computados uma única vez na importação
+e nunca mutados. Toda requisição começa exatamente pelos mesmos bytes (mensagem
+de sistema primeiro, conteúdo variável por último), o que permite que o cache
+de prefixo do provedor seja reaproveitado entre turnos e sessões.
+"""
+
+import hashlib
+import logging
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHAT_SYSTEM_PROMPT = """Você é o AI Vice, um assistente de IA conversacional inteligente e prestativo.
+
+Características:
+- Responda sempre em português brasileiro
+- Seja amigável, profissional e útil
+- Forneça respostas detalhadas e informativas
+- Quando analisar arquivos, seja específico e detalhado
+- Mantenha o contexto da conversa
+- Se não souber algo, seja honesto sobre suas limitações
+- Use formatação markdown quando apropriado para melhor legibilidade
+
+Seu objetivo é ajudar os usuários com suas perguntas, análise de documentos e tarefas diversas."""
+
+# As instruções fixas da análise ficam no prompt de sistema para que apenas
+# o conteúdo do arquivo (a parte variável) venha depois do prefixo estável.
+FILE_ANALYSIS_SYSTEM_PROMPT = """Você é um especialista em análise de arquivos e documentos. Forneça análises detalhadas e úteis em português brasileiro.
+
+Para cada arquivo recebido, forneça uma análise detalhada incluindo:
+1. Resumo do conteúdo
+2. Estrutura e organização
+3. Pontos principais ou funcionalidades (se aplicável)
+4. Qualidade do código (se for um arquivo de programação)
+5. Sugestões de melhoria (se apropriado)
+6. Qualquer observação relevante"""
+
+FILE_ANALYSIS_TEMPLATE = """Analise o seguinte arquivo:
+
+Nome do arquivo: {file_name}
+Tipo: {file_extension}
+Conteúdo:
+```
+{content}
+```"""
+
+WELCOME_MESSAGE = """👋 **Olá! Eu sou o AI Vice!**
+
+Sou seu assistente de IA conversacional, powered by **GPT-4.1-mini**. Estou aqui para ajudar você com:
+
+🤖 **Conversas Inteligentes**
+• Responder perguntas sobre qualquer assunto
+• Explicar conceitos complexos de forma simples
+• Ajudar com pesquisas e análises
+
+📁 **Análise de Arquivos**
+• Analisar códigos, documentos e textos
+• Revisar e sugerir melhorias
+• Explicar estruturas e funcionalidades
+
+💡 **Assistência Técnica**
+• Programação e desenvolvimento
+• Escrita e redação
+• Resolução de problemas
+
+✨ **Como usar:**
+• Digite suas perguntas normalmente
+• Use o botão 📎 para enviar arquivos
+• Mantenha a conversa fluindo naturalmente
+
+**Como posso ajudar você hoje?** 🚀"""
+
+# Trechos dos arquivos da sessão recuperados para a pergunta atual
+RETRIEVED_CONTEXT_TEMPLATE = """Trechos relevantes dos arquivos enviados nesta conversa (use-os para fundamentar a resposta):
+
+{chunks}"""
+
+RETRIEVED_CHUNK_TEMPLATE = """[{file_name} — trecho {position}]
+{content}"""
+
+CHAT_SYSTEM_MESSAGE = MappingProxyType({"role": "system", "content": CHAT_SYSTEM_PROMPT})
+FILE_ANALYSIS_SYSTEM_MESSAGE = MappingProxyType({"role": "system", "content": FILE_ANALYSIS_SYSTEM_PROMPT})
+
+
+def _prefix_key(name: str, system_prompt: str) -> str:
+    """
+    Gera uma chave curta e estável para o parâmetro `prompt_cache_key`,
+    agrupando no mesmo nó do provedor as requisições que compartilham o prefixo.
+    """
+    digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+    return f"ai-vice-{name}-{digest}"
+
+
+CHAT_CACHE_KEY = _prefix_key("chat", CHAT_SYSTEM_PROMPT)
+FILE_ANALYSIS_CACHE_KEY = _prefix_key("file", FILE_ANALYSIS_SYSTEM_PROMPT)
+
+
+def build_chat_messages(history: List[Dict[str, str]],
+                        context_chunks: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, str]]:
+    """
+    Monta a lista de mensagens do chat: prefixo de sistema fixo seguido do
+    histórico já formatado, em ordem cronológica.
+    
+    Trechos recuperados entram logo antes da última mensagem, preservando o
+    prefixo estável (sistema + histórico) para o cache do provedor.
+    """
+    messages = [dict(CHAT_SYSTEM_MESSAGE)] + list(history)
+    if context_chunks:
+        chunks = "\n\n".join(RETRIEVED_CHUNK_TEMPLATE.format(
+            file_name=chunk["file_name"],
+            position=chunk["position"] + 1,
+            content=chunk["content"]
+        ) for chunk in context_chunks)
+        messages.insert(len(messages) - 1 if history else len(messages), {
+            "role": "system",
+            "content": RETRIEVED_CONTEXT_TEMPLATE.format(chunks=chunks)
+        })
+    return messages
+
+
+def build_file_analysis_messages(file_name: str, file_extension: str, content: str) -> List[Dict[str, str]]:
+    """
+    Monta a lista de mensagens para análise de arquivo a partir do template fixo.
+    """
+    return [
+        dict(FILE_ANALYSIS_SYSTEM_MESSAGE),
+        {
+            "role": "user",
+            "content": FILE_ANALYSIS_TEMPLATE.format(
+                file_name=file_name,
+                file_extension=file_extension,
+                content=content
+            )
+        }
+    ]
+
+
+def extract_cached_tokens(usage: Any) -> int:
+    """
+    Extrai a quantidade de tokens de prompt servidos pelo cache do provedor.
+    """
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    return getattr(details, "cached_tokens", None) or 0
+
+
+class PromptCacheStats:
+    """
+    Acumula o uso de tokens e os acertos de cache de prefixo reportados pela API.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage: Any) -> Optional[int]:
+        """
+        Registra o `usage` de uma resposta e retorna os tokens em cache.
+        """
+        if usage is None:
+            return None
+
+        cached = extract_cached_tokens(usage)
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_tokens += cached
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        return cached
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            hit_ratio = self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_hit_ratio": round(hit_ratio, 4)
+            }
@@ -0,0 +1,145 @@
+"""
+Buffer de replay por sala para sincronização incremental (delta-sync).
+
+Guardamos em memória os últimos payloads de mensagem de cada sessão. Quando um
+cliente reconecta informando a última mensagem que viu, respondemos apenas com
+as mensagens posteriores — do buffer quando possível, do banco como fallback —
+em vez de recarregar páginas inteiras de histórico.
+
+Salas marcadas como completas (criadas junto com a sessão ou semeadas a partir
+do banco) também servem de cache do histórico recente para o prompt.
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.services.serialization import EncodedJSON
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayBuffer:
+    """
+    Últimos `maxlen` payloads de até `max_rooms` sessões (LRU por sessão).
+    """
+
+    def __init__(self, maxlen: int = 50, max_rooms: int = 1000):
+        self.maxlen = maxlen
+        self.max_rooms = max_rooms
+        self._lock = threading.Lock()
+        self._rooms: "OrderedDict[str, Deque[Tuple[str, EncodedJSON]]]" = OrderedDict()
+        # Salas cujo buffer contém toda a cauda da conversa (nada foi gravado sem passar por aqui)
+        self._complete = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _new_room(self, session_id: str) -> Deque[Tuple[str, EncodedJSON]]:
+        buffer = self._rooms[session_id] = deque(maxlen=self.maxlen)
+        while len(self._rooms) > self.max_rooms:
+            evicted, _ = self._rooms.popitem(last=False)
+            self._complete.discard(evicted)
+        return buffer
+
+    def record(self, session_id: str, payload: EncodedJSON, new_session: bool = False):
+        """
+        Registra uma mensagem emitida na sala. `new_session` indica a primeira
+        mensagem de uma sessão recém-criada (o buffer passa a ser completo).
+        """
+        message_id = payload.data.get('id')
+        with self._lock:
+            buffer = self._rooms.get(session_id)
+            if buffer is None:
+                buffer = self._new_room(session_id)
+                if new_session:
+                    self._complete.add(session_id)
+            else:
+                self._rooms.move_to_end(session_id)
+            buffer.append((message_id, payload))
+
+    def replace(self, session_id: str, payload: EncodedJSON) -> bool:
+        """
+        Substitui na sala a mensagem de mesmo id (ex.: a versão gravada, já com
+        `seq`). Retorna se ela ainda estava no buffer.
+        """
+        message_id = payload.data.get('id')
+        with self._lock:
+            buffer = self._rooms.get(session_id)
+            for index, (entry_id, _) in enumerate(buffer or ()):
+                if entry_id == message_id:
+                    buffer[index] = (message_id, payload)
+                    return True
+        return False
+
+    def discard(self, session_id: str, message_id: str):
+        """
+        Remove uma mensagem da sala (ex.: resposta cuja gravação falhou).
+        """
+        with self._lock:
+            buffer = self._rooms.get(session_id)
+            for index, (entry_id, _) in enumerate(buffer or ()):
+                if entry_id == message_id:
+                    del buffer[index]
+                    return
+
+    def seed(self, session_id: str, payloads: List[EncodedJSON]):
+        """
+        Preenche a sala com a cauda do histórico lida do banco (ordem cronológica),
+        marcando-a como completa.
+        """
+        with self._lock:
+            if session_id in self._complete:
+                return
+            buffer = self._new_room(session_id)
+            buffer.extend((payload.data.get('id'), payload) for payload in payloads)
+            self._complete.add(session_id)
+
+    def recent(self, session_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Últimas `limit` mensagens da sala (dicts, ordem cronológica), ou None
+        se o buffer não tiver o histórico completo da sessão.
+        """
+        with self._lock:
+            if session_id not in self._complete or limit > self.maxlen:
+                return None
+            self._rooms.move_to_end(session_id)
+            entries = list(self._rooms[session_id])[-limit:]
+        return [payload.data for _, payload in entries]
+
+    def since(self, session_id: str, last_message_id: str) -> Optional[List[EncodedJSON]]:
+        """
+        Mensagens posteriores a `last_message_id`, ou None se ela não estiver
+        mais no buffer (o chamador deve recorrer ao banco).
+        """
+        with self._lock:
+            buffer = self._rooms.get(session_id)
+            entries = list(buffer) if buffer else []
+
+        for index, (message_id, _) in enumerate(entries):
+            if message_id == last_message_id:
+                with self._lock:
+                    self.hits += 1
+                return [payload for _, payload in entries[index + 1:]]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._rooms.pop(session_id, None)
+            self._complete.discard(session_id)
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rooms)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'complete_rooms': len(self._complete),
+                'hits': self.hits,
+                'misses': self.misses
+            }
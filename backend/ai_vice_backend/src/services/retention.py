@@ -0,0 +1,251 @@
+"""
+Retenção e arquivamento de sessões antigas.
+
+Um job periódico mantém as tabelas quentes pequenas:
+
+1. marca como inativas as sessões sem atividade há `RETENTION_IDLE_DAYS`;
+2. move as mensagens das sessões inativas há `RETENTION_ARCHIVE_DAYS` para
+   segmentos JSONL comprimidos (zstd quando `zstandard` está instalado, gzip
+   caso contrário) em `<ARCHIVE_FOLDER>/<dia>/<sessão>.jsonl.zst|.gz`,
+   registrados em `archive_segments` para leitura sob demanda;
+3. remove os uploads dessas sessões, suas entradas nos índices de busca e
+   de trechos (RAG) e o estado em memória do shard (buffer de replay e
+   índice de documentos);
+4. devolve páginas livres ao sistema de arquivos com `PRAGMA incremental_vacuum`.
+
+Com vários nós, cada um arquiva só as sessões que atende. Uma sessão inativa
+que recebe mensagens volta a ficar ativa.
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from src.models.message import db, ArchiveSegment, ChatSession, DocumentChunk, Message
+from src.services.search import remove_session
+from src.services.serialization import fast_dumps
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Páginas liberadas por execução do incremental_vacuum
+VACUUM_PAGES = 2000
+
+
+def _compress(data: bytes):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), '.jsonl.zst'
+    return gzip.compress(data, compresslevel=9), '.jsonl.gz'
+
+
+def _decompress(path: str, data: bytes) -> bytes:
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Segmento zstd requer o pacote 'zstandard'")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class RetentionService:
+    """
+    Job de retenção executado em background pelo SocketIO.
+    """
+
+    def __init__(self, app=None, socketio=None, router=None):
+        self.app = app
+        self.socketio = socketio
+        self.router = router
+        self.is_running = False
+        self.last_run: Dict[str, Any] = {}
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.config.setdefault('RETENTION_IDLE_DAYS', 7)
+        app.config.setdefault('RETENTION_ARCHIVE_DAYS', 30)
+        app.config.setdefault('RETENTION_INTERVAL_SECONDS', 3600)
+        app.config.setdefault('RETENTION_BATCH_SESSIONS', 100)
+        app.config.setdefault('ARCHIVE_FOLDER', os.path.join(app.root_path, 'archive'))
+
+    def start(self):
+        """
+        Inicia o loop periódico em uma tarefa de background.
+        """
+        if not self.is_running:
+            self.is_running = True
+            self.socketio.start_background_task(self._loop)
+            logger.info("🗄️ Job de retenção iniciado")
+
+    def stop(self):
+        self.is_running = False
+
+    def _loop(self):
+        while self.is_running:
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no job de retenção: {str(e)}")
+            self.socketio.sleep(self.app.config['RETENTION_INTERVAL_SECONDS'])
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Executa um ciclo completo de retenção (requer app context).
+        """
+        config = self.app.config
+        now = datetime.utcnow()
+
+        stats = {'started_at': now.isoformat()}
+        stats['deactivated'] = self.mark_idle_sessions(now - timedelta(days=config['RETENTION_IDLE_DAYS']))
+        stats.update(self.archive_sessions(now - timedelta(days=config['RETENTION_ARCHIVE_DAYS'])))
+        stats['vacuumed_pages'] = self.incremental_vacuum()
+
+        self.last_run = stats
+        logger.info(f"Retenção concluída: {stats}")
+        return stats
+
+    def mark_idle_sessions(self, cutoff: datetime) -> int:
+        result = db.session.execute(
+            ChatSession.__table__.update()
+            .where(ChatSession.is_active.is_(True), ChatSession.last_activity < cutoff)
+            .values(is_active=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def archive_sessions(self, cutoff: datetime) -> Dict[str, int]:
+        """
+        Arquiva as mensagens das sessões inativas há mais tempo que `cutoff`.
+        """
+        candidates = db.session.query(ChatSession.id).filter(
+            ChatSession.is_active.is_(False),
+            ChatSession.last_activity < cutoff,
+            db.session.query(Message.id).filter(Message.session_id == ChatSession.id).exists()
+        )
+        batch_size = self.app.config['RETENTION_BATCH_SESSIONS']
+        if self.router is None:
+            session_ids = [row.id for row in candidates.limit(batch_size)]
+        else:
+            # Caches da sessão vivem no nó dono: ele arquiva e os descarta
+            session_ids = []
+            for row in candidates.yield_per(batch_size):
+                if self.router.is_local(row.id):
+                    session_ids.append(row.id)
+                    if len(session_ids) >= batch_size:
+                        break
+
+        archived_messages = 0
+        removed_uploads = 0
+        for session_id in session_ids:
+            try:
+                archived_messages += self._archive_session(session_id)
+                removed_uploads += self._remove_uploads(session_id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao arquivar sessão {session_id}: {str(e)}")
+
+        return {
+            'archived_sessions': len(session_ids),
+            'archived_messages': archived_messages,
+            'removed_uploads': removed_uploads
+        }
+
+    def _archive_session(self, session_id: str) -> int:
+        messages = Message.query.filter_by(session_id=session_id).order_by(Message.seq.asc()).all()
+        if not messages:
+            return 0
+
+        lines = "\n".join(fast_dumps(msg.to_dict()) for msg in messages) + "\n"
+        data, extension = _compress(lines.encode('utf-8'))
+
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        relative_path = os.path.join(day, f"{session_id}-{messages[0].seq}{extension}")
+        absolute_path = os.path.join(self.app.config['ARCHIVE_FOLDER'], relative_path)
+        os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+
+        # Segmento gravado antes de apagar as linhas; removido se o commit falhar
+        tmp_path = absolute_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, absolute_path)
+
+        try:
+            db.session.add(ArchiveSegment(
+                session_id=session_id,
+                path=relative_path,
+                message_count=len(messages),
+                first_seq=messages[0].seq,
+                last_seq=messages[-1].seq
+            ))
+            Message.query.filter(Message.session_id == session_id,
+                                 Message.seq <= messages[-1].seq).delete(synchronize_session=False)
+            remove_session(db.session, session_id)
+            DocumentChunk.query.filter_by(session_id=session_id).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            os.remove(absolute_path)
+            raise
+
+        if self.router is not None:
+            # Buffer de replay e índice de documentos não podem servir o que foi arquivado
+            self.router.shard_for(session_id).forget(session_id)
+        return len(messages)
+
+    def _remove_uploads(self, session_id: str) -> int:
+        upload_dir = os.path.join(self.app.config['UPLOAD_FOLDER'], session_id)
+        if not os.path.isdir(upload_dir):
+            return 0
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return 1
+
+    def incremental_vacuum(self) -> int:
+        """
+        Libera páginas livres do SQLite. Na primeira execução em um banco sem
+        auto_vacuum incremental, converte o banco (VACUUM completo, uma vez).
+        """
+        if db.engine.dialect.name != 'sqlite':
+            return 0
+
+        with db.engine.connect() as connection:
+            mode = connection.execute(text("PRAGMA auto_vacuum")).scalar()
+            if mode != 2:
+                logger.info("Convertendo banco para auto_vacuum incremental (VACUUM único)")
+                connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+                connection.execute(text("VACUUM"))
+            free_pages = connection.execute(text("PRAGMA freelist_count")).scalar() or 0
+            connection.execute(text(f"PRAGMA incremental_vacuum({VACUUM_PAGES})"))
+            connection.commit()
+        return min(free_pages, VACUUM_PAGES)
+
+    def load_archive(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Lê sob demanda as mensagens arquivadas de uma sessão, em ordem de seq.
+        """
+        messages = []
+        segments = ArchiveSegment.query.filter_by(session_id=session_id)\
+                                       .order_by(ArchiveSegment.first_seq.asc()).all()
+        for segment in segments:
+            path = os.path.join(self.app.config['ARCHIVE_FOLDER'], segment.path)
+            with open(path, 'rb') as f:
+                lines = _decompress(path, f.read()).decode('utf-8')
+            messages.extend(json.loads(line) for line in lines.splitlines() if line)
+        return messages
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'is_running': self.is_running,
+            'last_run': self.last_run
+        }
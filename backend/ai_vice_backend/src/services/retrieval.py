@@ -0,0 +1,279 @@
+"""
+Contexto recuperado dos arquivos enviados (RAG local).
+
+No upload, arquivos de texto são divididos em trechos (no pool de CPU, ver
+`cpu_tasks.prepare_chunks`) e cada trecho vira um vetor por hashing de termos (unigramas e bigramas, sem modelo nem rede),
+persistido em `document_chunks`. Na pergunta, os `k` trechos mais similares
+da sessão (cosseno) entram no prompt, de modo que perguntas seguintes sobre o
+arquivo são respondidas com base nele sem reenviar o arquivo inteiro.
+
+A busca é força bruta sobre a matriz da sessão: com NumPy (opcional) é um
+produto matriz-vetor; sem NumPy, um laço em Python — suficiente para os poucos
+milhares de trechos de uma sessão.
+"""
+
+import logging
+import math
+import re
+import threading
+import unicodedata
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from src.models.message import db, DocumentChunk
+
+try:
+    import numpy
+except ImportError:  # dependência opcional
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = (".txt", ".md", ".py", ".js", ".html", ".css", ".json", ".xml", ".csv")
+
+EMBEDDING_DIM = 1024
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+MAX_CHUNKS_PER_FILE = 500
+TOP_K = 4
+# Similaridade mínima para um trecho entrar no prompt
+MIN_SCORE = 0.06
+
+# Palavras sem `_`: CORS_ORIGINS vira "cors" e "origins"
+_TOKEN_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+# Prefixo usado como radical aproximado (configurar/configurado -> "confi")
+STEM_LENGTH = 5
+
+# Palavras muito frequentes (pt/en, já sem acento) não discriminam trechos
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de do dos e ela ele em entre era essa esse esta este eu foi ha isso
+isto ja la mais mas me meu minha na nao nas no nos o os ou para pela pelo por qual quando que se
+sem ser seu sua so sobre sao tambem tem um uma umas uns voce
+an and are as at be by for from how in is it of on or that the this to was what with
+""".split())
+
+
+def read_text_file(file_path: str) -> str:
+    """
+    Lê um arquivo de texto em UTF-8, com fallback para latin-1.
+    """
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Divide o texto em trechos de até `size` caracteres com sobreposição,
+    preferindo quebrar em fim de parágrafo ou de linha.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text) and len(chunks) < MAX_CHUNKS_PER_FILE:
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = max(text.rfind("\n\n", start + overlap, end), text.rfind("\n", start + overlap, end))
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        # Sobreposição começando em início de palavra
+        next_start = text.find(" ", end - overlap, end)
+        start = next_start + 1 if next_start > start else max(end - overlap, start + 1)
+    return chunks
+
+
+def _tokens(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return [token for token in _TOKEN_PATTERN.findall(normalized)
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> array:
+    """
+    Vetoriza o texto por hashing (feature hashing com sinal) de unigramas,
+    radicais aproximados e bigramas, com tf sublinear e normalização L2.
+    """
+    tokens = _tokens(text)
+    counts: Dict[str, int] = {}
+    for index, token in enumerate(tokens):
+        counts[token] = counts.get(token, 0) + 1
+        if len(token) > STEM_LENGTH:
+            stem = token[:STEM_LENGTH] + "~"
+            counts[stem] = counts.get(stem, 0) + 1
+        if index:
+            bigram = f"{tokens[index - 1]} {token}"
+            counts[bigram] = counts.get(bigram, 0) + 1
+
+    vector = [0.0] * dim
+    for feature, count in counts.items():
+        digest = zlib.crc32(feature.encode("utf-8"))
+        weight = 1.0 + math.log(count)
+        vector[digest % dim] += weight if digest & 0x80000000 else -weight
+
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm:
+        vector = [value / norm for value in vector]
+    return array("f", vector)
+
+
+class _SessionIndex:
+    """
+    Trechos e vetores de uma sessão, em memória, com a frequência de
+    documento por dimensão (idf aplicado à consulta).
+    """
+
+    def __init__(self, chunks: List[Dict[str, Any]], vectors: List[bytes]):
+        self.chunks = []
+        self.vectors = []
+        self.df = [0] * EMBEDDING_DIM
+        self._matrix = None
+        for chunk, vector in zip(chunks, vectors):
+            self.add(chunk, vector)
+
+    def add(self, chunk: Dict[str, Any], vector: bytes):
+        values = array("f")
+        values.frombytes(vector)
+        for position, value in enumerate(values):
+            if value:
+                self.df[position] += 1
+        self.chunks.append(chunk)
+        self.vectors.append(values)
+        self._matrix = None
+
+    def _weighted(self, query: array) -> array:
+        """
+        Pondera a consulta por idf: termos presentes em todos os trechos da
+        sessão (cabeçalhos, nome do arquivo) pesam pouco.
+        """
+        total = len(self.vectors)
+        weighted = [value * math.log(1 + total / (1 + self.df[position])) if value else 0.0
+                    for position, value in enumerate(query)]
+        norm = math.sqrt(sum(value * value for value in weighted)) or 1.0
+        return array("f", [value / norm for value in weighted])
+
+    def scores(self, query: array) -> List[float]:
+        query = self._weighted(query)
+        if numpy is not None:
+            if self._matrix is None:
+                self._matrix = numpy.frombuffer(b"".join(v.tobytes() for v in self.vectors), dtype=numpy.float32)\
+                                    .reshape(len(self.vectors), -1)
+            return (self._matrix @ numpy.frombuffer(query.tobytes(), dtype=numpy.float32)).tolist()
+
+        return [sum(a * b for a, b in zip(vector, query)) for vector in self.vectors]
+
+
+class DocumentIndex:
+    """
+    Índice vetorial por sessão: persistido no banco e mantido em cache LRU.
+    """
+
+    def __init__(self, max_sessions: int = 256):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _SessionIndex]" = OrderedDict()
+        self.ingested_chunks = 0
+        self.queries = 0
+        self.hits = 0
+
+    def _load(self, session_id: str) -> _SessionIndex:
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is not None:
+                self._sessions.move_to_end(session_id)
+                return index
+
+        rows = db.session.query(DocumentChunk.file_name, DocumentChunk.position,
+                                DocumentChunk.content, DocumentChunk.vector)\
+                         .filter(DocumentChunk.session_id == session_id)\
+                         .order_by(DocumentChunk.id.asc()).all()
+        index = _SessionIndex(
+            [{'file_name': row.file_name, 'position': row.position, 'content': row.content} for row in rows],
+            [row.vector for row in rows]
+        )
+        with self._lock:
+            # Outra thread pode ter carregado a sessão no meio tempo
+            index = self._sessions.setdefault(session_id, index)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return index
+
+    def add_chunks(self, session_id: str, message_id: str, file_name: str,
+                   chunks: List[Tuple[int, str, bytes]]) -> int:
+        """
+        Persiste e indexa os trechos de um arquivo enviado, já vetorizados
+        fora do processo principal (`cpu_tasks.prepare_chunks`).
+        """
+        if not chunks:
+            return 0
+
+        rows = [
+            DocumentChunk(
+                session_id=session_id,
+                message_id=message_id,
+                file_name=file_name,
+                position=position,
+                content=content,
+                vector=vector
+            )
+            for position, content, vector in chunks
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+
+        # Sessões fora do cache serão carregadas do banco já com os novos trechos
+        with self._lock:
+            index = self._sessions.get(session_id)
+            if index is not None:
+                for row in rows:
+                    index.add({'file_name': file_name, 'position': row.position, 'content': row.content}, row.vector)
+            self.ingested_chunks += len(rows)
+
+        logger.info(f"Arquivo {file_name} indexado em {len(rows)} trechos (sessão {session_id})")
+        return len(rows)
+
+    def retrieve(self, session_id: str, query: str, k: int = TOP_K) -> List[Dict[str, Any]]:
+        """
+        Os `k` trechos da sessão mais similares à pergunta, acima de MIN_SCORE.
+        """
+        index = self._load(session_id)
+        if not index.chunks:
+            return []
+
+        scores = index.scores(embed(query))
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:k]
+        results = [dict(index.chunks[i], score=scores[i]) for i in ranked if scores[i] >= MIN_SCORE]
+
+        with self._lock:
+            self.queries += 1
+            if results:
+                self.hits += 1
+        return results
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sessions_cached': len(self._sessions),
+                'ingested_chunks': self.ingested_chunks,
+                'queries': self.queries,
+                'hits': self.hits,
+                'backend': 'numpy' if numpy is not None else 'python'
+            }
@@ -0,0 +1,175 @@
+"""
+Busca full-text no histórico de mensagens (SQLite FTS5).
+
+O índice `messages_fts` (conteúdo e nome de arquivo) é mantido de forma
+incremental: cada mensagem inserida pelo ORM (`handle_message`, `upload_file`,
+respostas da IA) entra no índice na mesma transação. O rowid do FTS vem da
+tabela `message_search`, cuja chave INTEGER é estável mesmo após VACUUM, e que
+guarda `session_id` para filtrar e remover sessões inteiras por índice.
+
+Os trechos devolvidos são HTML seguro: o conteúdo é escapado e só os termos
+encontrados vêm envoltos em `<mark>`.
+"""
+
+import html
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import DateTime, event, inspect, text
+
+from src.models.message import Message, MessageSearch
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'messages_fts'
+MAX_RESULTS = 100
+# Marcadores do FTS (uso privado do Unicode), trocados por <mark> após o escape
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Estado global: o índice só é mantido quando a tabela FTS5 existe
+_enabled = False
+
+
+def init_search(engine):
+    """
+    Ativa a manutenção do índice se a tabela FTS5 existir (criada pela
+    migração `add_message_search_index`).
+    """
+    global _enabled
+    with engine.connect() as connection:
+        _enabled = inspect(connection).has_table(FTS_TABLE)
+    if not _enabled:
+        logger.warning("Índice de busca indisponível: endpoint de busca desativado")
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _index_message(connection, message_id: str, session_id: str, content: str, file_name: Optional[str]):
+    result = connection.execute(
+        MessageSearch.__table__.insert().values(message_id=message_id, session_id=session_id)
+    )
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, content, file_name) VALUES (:rowid, :content, :file_name)"),
+        {'rowid': result.inserted_primary_key[0], 'content': content, 'file_name': file_name}
+    )
+
+
+def _unindex_message(connection, message_id: str):
+    connection.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM message_search WHERE message_id = :id)"),
+        {'id': message_id}
+    )
+    connection.execute(text("DELETE FROM message_search WHERE message_id = :id"), {'id': message_id})
+
+
+@event.listens_for(Message, 'after_insert')
+def _after_insert(mapper, connection, target):
+    if _enabled:
+        _index_message(connection, target.id, target.session_id, target.content, target.file_name)
+
+
+@event.listens_for(Message, 'after_update')
+def _after_update(mapper, connection, target):
+    if not _enabled:
+        return
+    state = inspect(target)
+    if state.attrs.content.history.has_changes() or state.attrs.file_name.history.has_changes():
+        _unindex_message(connection, target.id)
+        _index_message(connection, target.id, target.session_id, target.content, target.file_name)
+
+
+@event.listens_for(Message, 'after_delete')
+def _after_delete(mapper, connection, target):
+    if _enabled:
+        _unindex_message(connection, target.id)
+
+
+def remove_session(session, session_id: str):
+    """
+    Remove do índice todas as mensagens de uma sessão (deleções em lote
+    não disparam os eventos do ORM). Executa na transação de `session`.
+    """
+    if not _enabled:
+        return
+    session.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM message_search WHERE session_id = :sid)"),
+        {'sid': session_id}
+    )
+    session.execute(text("DELETE FROM message_search WHERE session_id = :sid"), {'sid': session_id})
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Converte o texto do usuário em uma consulta FTS5 segura: todos os termos
+    (AND), o último como prefixo para busca enquanto se digita.
+    """
+    tokens = _TOKEN_PATTERN.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _marked_html(fragment: Optional[str]) -> Optional[str]:
+    # Texto do usuário escapado; só os marcadores do FTS viram <mark>
+    if fragment is None:
+        return None
+    return html.escape(fragment).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_messages(session, query: str, session_id: Optional[str] = None,
+                    user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Busca ranqueada (bm25, nome de arquivo com peso maior) com trechos destacados.
+    """
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    filters = []
+    params = {'match': match, 'limit': max(1, min(limit, MAX_RESULTS)),
+              'mark_start': MARK_START, 'mark_end': MARK_END}
+    joins = ''
+    if session_id:
+        filters.append("s.session_id = :session_id")
+        params['session_id'] = session_id
+    if user_id:
+        joins = "JOIN chat_sessions c ON c.id = s.session_id"
+        filters.append("c.user_id = :user_id")
+        params['user_id'] = user_id
+
+    where = ''.join(f" AND {condition}" for condition in filters)
+    rows = session.execute(text(f"""
+        SELECT m.id, m.session_id, m.seq, m.sender, m.message_type, m.timestamp,
+               snippet({FTS_TABLE}, 0, :mark_start, :mark_end, '…', 16) AS snippet,
+               highlight({FTS_TABLE}, 1, :mark_start, :mark_end) AS file_name,
+               bm25({FTS_TABLE}, 1.0, 2.0) AS rank
+        FROM {FTS_TABLE}
+        JOIN message_search s ON s.id = {FTS_TABLE}.rowid
+        JOIN messages m ON m.id = s.message_id
+        {joins}
+        WHERE {FTS_TABLE} MATCH :match{where}
+        ORDER BY rank
+        LIMIT :limit
+    """).columns(timestamp=DateTime), params)
+
+    return [
+        {
+            'id': row.id,
+            'session_id': row.session_id,
+            'seq': row.seq,
+            'sender': row.sender,
+            'message_type': row.message_type,
+            'timestamp': row.timestamp.isoformat(),
+            'snippet': _marked_html(row.snippet),
+            'file_name': _marked_html(row.file_name),
+            'score': -row.rank
+        }
+        for row in rows
+    ]
@@ -0,0 +1,150 @@
+"""
+Serialização de payloads REST e Socket.IO.
+
+Um `EncodedJSON` guarda o JSON já codificado de um payload; o módulo `SocketIOJSON`
+(passado ao `SocketIO` como `json=`) insere esses trechos prontos no pacote em
+vez de codificar o dicionário de novo a cada emissão. Quando o `orjson` está
+instalado ele é usado como codificador; caso contrário, o módulo `json` padrão.
+"""
+
+import gzip
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+# Mesmos separadores usados pelo python-socketio ao codificar pacotes
+COMPACT_SEPARATORS = (',', ':')
+
+# Profundidade máxima em que procuramos payloads pré-codificados:
+# pacote [evento, payload] e lote [evento, [[evento, payload], ...]]
+_MAX_DEPTH = 4
+
+
+def fast_dumps(obj: Any) -> str:
+    """
+    Codifica em JSON compacto usando o backend mais rápido disponível.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=COMPACT_SEPARATORS)
+
+
+def json_backend() -> str:
+    return 'orjson' if orjson is not None else 'json'
+
+
+class EncodedJSON:
+    """
+    Payload com o JSON codificado uma única vez.
+    """
+
+    __slots__ = ('data', 'json')
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.json = fast_dumps(data)
+
+    def __repr__(self):
+        return f"EncodedJSON({self.json[:60]}...)"
+
+
+def _has_encoded(obj: Any, depth: int = _MAX_DEPTH) -> bool:
+    if isinstance(obj, EncodedJSON):
+        return True
+    if depth <= 0:
+        return False
+    if isinstance(obj, (list, tuple)):
+        return any(_has_encoded(item, depth - 1) for item in obj)
+    if isinstance(obj, dict):
+        return any(_has_encoded(value, depth - 1) for value in obj.values())
+    return False
+
+
+def _splice(obj: Any, kwargs: Dict[str, Any]) -> str:
+    if isinstance(obj, EncodedJSON):
+        return obj.json
+    item_sep, key_sep = kwargs.get('separators') or (', ', ': ')
+    if isinstance(obj, (list, tuple)):
+        return '[' + item_sep.join(_splice(item, kwargs) for item in obj) + ']'
+    if isinstance(obj, dict) and _has_encoded(obj):
+        return '{' + item_sep.join(
+            json.dumps(str(key)) + key_sep + _splice(value, kwargs)
+            for key, value in obj.items()
+        ) + '}'
+    return json.dumps(obj, **kwargs)
+
+
+class SocketIOJSON:
+    """
+    Módulo JSON compatível com o python-socketio (`dumps`/`loads`).
+    """
+
+    @staticmethod
+    def dumps(obj: Any, *args, **kwargs) -> str:
+        if not _has_encoded(obj):
+            if orjson is not None and not args and set(kwargs) <= {'separators'}:
+                return fast_dumps(obj)
+            return json.dumps(obj, *args, **kwargs)
+        return _splice(obj, kwargs)
+
+    @staticmethod
+    def loads(s, *args, **kwargs) -> Any:
+        return json.loads(s, *args, **kwargs)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provedor JSON do Flask que usa `orjson` quando disponível.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+
+def _preferred_encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    for encoding in ('gzip', 'deflate'):
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def json_response(payload: Any, status: int = 200):
+    """
+    Resposta JSON que é comprimida (gzip/deflate) quando o corpo passa de
+    `JSON_COMPRESS_MIN_SIZE` bytes e o cliente aceita a codificação.
+    """
+    body = current_app.json.dumps(payload).encode('utf-8')
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+
+    min_size = current_app.config.get('JSON_COMPRESS_MIN_SIZE', 0)
+    encoding = _preferred_encoding() if min_size and len(body) >= min_size else None
+    if encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=5))
+    elif encoding == 'deflate':
+        response.set_data(zlib.compress(body, 5))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+
+    return response
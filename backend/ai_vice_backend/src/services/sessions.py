@@ -0,0 +1,273 @@
+"""
+Materialização preguiçosa das sessões de chat.
+
+`POST /api/chat/sessions` só emite um id: a sessão e a mensagem de
+boas-vindas existem apenas em memória (`pending`) até a primeira mensagem ou
+upload. Aí são gravadas na mesma transação que essa primeira escrita.
+Sessões abandonadas (visitas à página inicial) não tocam no banco.
+
+A mensagem de boas-vindas tem id derivado do id da sessão (uuid5) e o horário
+de criação da sessão, então o que o cliente recebeu na criação é exatamente o
+que é gravado depois. Uma sessão pendente esquecida (reinício do processo ou
+limite `LAZY_SESSIONS_MAX_PENDING`) continua válida: é materializada na
+primeira escrita com o horário dessa escrita.
+
+Fluxo de uma escrita: `materialize()` adiciona as linhas que faltam à sessão
+do SQLAlchemy e reserva a sessão pendente para essa transação; o commit a
+confirma (sai de `pending`) e o fim da transação sem commit (rollback ou
+close) libera a reserva. Outra escrita da mesma sessão em paralelo (ex.:
+upload durante a primeira mensagem) espera só essa transação, não a fila do
+escritor.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models.message import db, ChatSession, Message
+from src.services.prompts import WELCOME_MESSAGE
+from src.services.serialization import EncodedJSON
+
+logger = logging.getLogger(__name__)
+
+WELCOME_NAMESPACE = uuid.UUID('6f1d3c2e-8b7a-4f5e-9c1d-2a3b4c5d6e7f')
+
+# Chave em `Session.info`: sessões materializadas pela transação em curso
+SESSION_INFO_KEY = 'lazy_sessions'
+
+# Espera máxima por outra transação que materializa a mesma sessão
+MATERIALIZE_WAIT_SECONDS = 5
+
+# Tentativas de sortear um id atendido por este nó (com N nós, ~N em média)
+ISSUE_MAX_ATTEMPTS = 64
+
+
+def welcome_message_id(session_id: str) -> str:
+    return str(uuid.uuid5(WELCOME_NAMESPACE, session_id))
+
+
+class _PendingSession:
+    __slots__ = ('user_id', 'created_at', 'announced', 'owner')
+
+    def __init__(self, user_id: Optional[str], created_at: datetime):
+        self.user_id = user_id
+        self.created_at = created_at
+        # Boas-vindas já registradas no buffer de replay do shard
+        self.announced = False
+        # Thread cuja transação está gravando a sessão
+        self.owner: Optional[int] = None
+
+
+class LazySessions:
+    """
+    Sessões emitidas e ainda não gravadas (LRU limitado) e sessões que já se
+    sabe estarem no banco, com o dono de cada uma.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.max_pending = 100000
+        self.max_known = 10000
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._pending: "OrderedDict[str, _PendingSession]" = OrderedDict()
+        self._known: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.issued = 0
+        self.materialized = 0
+        self.evicted = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('LAZY_SESSIONS_MAX_PENDING', 100000)
+        self.max_pending = int(app.config['LAZY_SESSIONS_MAX_PENDING'])
+
+    def issue(self, user_id: Optional[str],
+              is_local: Optional[Callable[[str], bool]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Emite uma sessão nova sem gravar nada. Retorna (sessão, boas-vindas)
+        no formato de `ChatSession.to_dict()` e `Message.to_dict()`. Com
+        `is_local`, o id é sorteado até cair neste nó (o estado pendente fica
+        onde a sessão será atendida).
+        """
+        session_id = str(uuid.uuid4())
+        for _ in range(ISSUE_MAX_ATTEMPTS):
+            if is_local is None or is_local(session_id):
+                break
+            session_id = str(uuid.uuid4())
+        created_at = datetime.utcnow()
+        with self._lock:
+            self._pending[session_id] = _PendingSession(user_id, created_at)
+            self.issued += 1
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.evicted += 1
+        session = {
+            'id': session_id,
+            'user_id': user_id,
+            'created_at': created_at.isoformat(),
+            'last_activity': created_at.isoformat(),
+            'is_active': True
+        }
+        return session, self._welcome_dict(session_id, user_id, created_at)
+
+    @staticmethod
+    def _welcome_dict(session_id: str, user_id: Optional[str], created_at: datetime) -> Dict[str, Any]:
+        return {
+            'id': welcome_message_id(session_id),
+            'session_id': session_id,
+            'seq': 1,
+            'user_id': user_id,
+            'content': WELCOME_MESSAGE,
+            'message_type': 'text',
+            'sender': 'ai',
+            'timestamp': created_at.isoformat(),
+            'file_url': None,
+            'file_name': None,
+            'file_size': None,
+            'reply_to': None
+        }
+
+    def is_pending(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._pending
+
+    def pending_welcome(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Boas-vindas de uma sessão ainda não gravada (None se não pendente).
+        """
+        with self._lock:
+            pending = self._pending.get(session_id)
+        if pending is None:
+            return None
+        return self._welcome_dict(session_id, pending.user_id, pending.created_at)
+
+    def announce(self, session_id: str) -> Optional[EncodedJSON]:
+        """
+        Na primeira atividade de uma sessão pendente, o payload das
+        boas-vindas para iniciar o buffer de replay (None nas seguintes).
+        """
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is None or pending.announced:
+                return None
+            pending.announced = True
+        return EncodedJSON(self._welcome_dict(session_id, pending.user_id, pending.created_at))
+
+    def materialize(self, session_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        Adiciona à sessão do banco a `ChatSession` e as boas-vindas, se ainda
+        não existirem (sem commit). Retorna se algo foi adicionado.
+        """
+        own = threading.get_ident()
+        deadline = time.monotonic() + MATERIALIZE_WAIT_SECONDS
+        with self._released:
+            while True:
+                if session_id in self._known:
+                    self._known.move_to_end(session_id)
+                    return False
+                pending = self._pending.get(session_id)
+                if pending is None or pending.owner is None:
+                    break
+                if pending.owner == own:
+                    return False  # já adicionada nesta transação
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._released.wait(remaining)
+            if pending is not None:
+                pending.owner = own
+
+        # Mesmo pendente aqui, outro processo/nó pode já tê-la gravado
+        existing = db.session.get(ChatSession, session_id)
+        if existing is not None:
+            self._confirm(session_id, existing.user_id)
+            return False
+
+        user_id = pending.user_id if pending is not None else user_id
+        created_at = pending.created_at if pending is not None else datetime.utcnow()
+        db.session.add(ChatSession(id=session_id, user_id=user_id, created_at=created_at,
+                                   last_activity=created_at))
+        db.session.add(Message(
+            id=welcome_message_id(session_id),
+            session_id=session_id,
+            user_id=user_id,
+            content=WELCOME_MESSAGE,
+            sender='ai',
+            message_type='text',
+            timestamp=created_at
+        ))
+        db.session.info.setdefault(SESSION_INFO_KEY, []).append((self, session_id, user_id))
+        return True
+
+    def _confirm(self, session_id: str, user_id: Optional[str]):
+        # Depois do commit: a sessão está no banco
+        with self._released:
+            if self._pending.pop(session_id, None) is not None:
+                self.materialized += 1
+            self._released.notify_all()
+        self._remember(session_id, user_id)
+
+    def _release(self, session_id: str):
+        # Transação encerrada sem commit: outra escrita pode materializar a sessão
+        with self._released:
+            pending = self._pending.get(session_id)
+            if pending is not None:
+                pending.owner = None
+            self._released.notify_all()
+
+    def owner(self, session_id: str) -> Optional[str]:
+        """
+        Dono da sessão registrado na criação (memória; banco se desconhecida).
+        """
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is not None:
+                return pending.user_id
+            if session_id in self._known:
+                self._known.move_to_end(session_id)
+                return self._known[session_id]
+        session = db.session.get(ChatSession, session_id)
+        if session is None:
+            return None
+        self._remember(session_id, session.user_id)
+        return session.user_id
+
+    def _remember(self, session_id: str, user_id: Optional[str]):
+        with self._lock:
+            self._known[session_id] = user_id
+            self._known.move_to_end(session_id)
+            while len(self._known) > self.max_known:
+                self._known.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'issued': self.issued,
+                'materialized': self.materialized,
+                'pending': len(self._pending),
+                'evicted': self.evicted
+            }
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    for registry, session_id, user_id in session.info.pop(SESSION_INFO_KEY, ()):
+        registry._confirm(session_id, user_id)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    # Depois do commit a lista já foi consumida; aqui sobra rollback ou close
+    if transaction.parent is not None:
+        return
+    for registry, session_id, _ in session.info.pop(SESSION_INFO_KEY, ()):
+        registry._release(session_id)
@@ -0,0 +1,382 @@
+"""
+Sharding por sessão (afinidade de `session_id`).
+
+Cada sessão pertence a um shard, escolhido por hashing consistente. O shard é
+dono de todo o estado quente da sessão:
+
+- fila de jobs de IA, atendida por `SHARD_WORKERS` threads em round-robin
+  entre sessões, com no máximo `SHARD_SESSION_CONCURRENCY` jobs simultâneos
+  por sessão (uma sessão ruidosa, ex.: análises grandes em sequência, ocupa
+  só a sua fatia e não atrasa as demais);
+- cache de contexto (`ReplayBuffer`) e índice de documentos (`DocumentIndex`);
+- escritor no banco (`WriteBehind`), que preserva a ordem das escritas da sessão.
+
+Rebalanceamento (`resize`): com hashing consistente, adicionar ou remover um
+shard move apenas ~1/N das sessões. Uma sessão movida fica presa ao shard
+antigo até seus jobs terminarem e as escritas pendentes serem aplicadas; só
+então o cache antigo é descartado e o novo shard assume (o cache é refeito a
+partir do banco).
+
+Vários processos ou máquinas: com `SHARD_NODES` (URLs dos nós) e
+`SHARD_NODE_ID` (URL deste nó), o mesmo anel distribui as sessões entre nós;
+conexões de sessões de outro nó são recusadas informando o dono
+(`owner_node`). Todos os nós devem ver o mesmo banco e os mesmos uploads.
+"""
+
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from src.services.persistence import WriteBehind
+from src.services.replay import ReplayBuffer
+from src.services.retrieval import DocumentIndex
+
+logger = logging.getLogger(__name__)
+
+# Pontos por nó no anel: mais pontos, distribuição mais uniforme
+RING_REPLICAS = 160
+
+# Capacidade total dos caches, dividida entre os shards
+REPLAY_MAX_ROOMS = 1000
+INDEX_MAX_SESSIONS = 256
+
+
+def _hash(key: str) -> int:
+    # Estável entre processos e máquinas (ao contrário de hash())
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Anel de hashing consistente com nós virtuais.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = RING_REPLICAS):
+        self.replicas = replicas
+        self._nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class Shard:
+    """
+    Fila de jobs, caches e escritor de um subconjunto das sessões.
+    """
+
+    def __init__(self, index: int, workers: int, session_concurrency: int, shard_count: int,
+                 on_idle: Optional[Callable[["Shard", str], None]] = None):
+        self.index = index
+        self.name = f"shard-{index}"
+        self.workers = workers
+        self.session_concurrency = session_concurrency
+        self.replay = ReplayBuffer(max_rooms=max(1, REPLAY_MAX_ROOMS // shard_count))
+        self.documents = DocumentIndex(max_sessions=max(1, INDEX_MAX_SESSIONS // shard_count))
+        self.writer = WriteBehind(name=f"write-behind-{index}")
+        self._on_idle = on_idle
+        self._cond = threading.Condition()
+        # Tarefas pendentes por sessão; a ordem do dict é a vez de cada sessão
+        self._pending: "OrderedDict[str, Deque[Tuple[Callable[..., Any], Tuple[Any, ...], float]]]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._threads: List[threading.Thread] = []
+        self.closed = False
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def init_app(self, app):
+        self.writer.init_app(app)
+
+    def submit(self, session_id: str, fn: Callable[..., Any], *args: Any):
+        """
+        Enfileira `fn(*args)` para a sessão.
+        """
+        with self._cond:
+            if self.closed:
+                raise RuntimeError(f"{self.name} encerrado")
+            self._pending.setdefault(session_id, deque()).append((fn, args, time.perf_counter()))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._loop, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+    def _next(self):
+        # Primeira sessão na vez com vaga; ela vai para o fim da fila (round-robin)
+        for session_id, tasks in self._pending.items():
+            if self._running.get(session_id, 0) < self.session_concurrency:
+                task = tasks.popleft()
+                if tasks:
+                    self._pending.move_to_end(session_id)
+                else:
+                    del self._pending[session_id]
+                self._running[session_id] = self._running.get(session_id, 0) + 1
+                return session_id, task
+        return None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                item = self._next()
+                while item is None:
+                    if self.closed:
+                        return
+                    self._cond.wait()
+                    item = self._next()
+
+            session_id, (fn, args, queued_at) = item
+            waited = time.perf_counter() - queued_at
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Erro em tarefa do {self.name}: {str(e)}")
+            finally:
+                with self._cond:
+                    running = self._running[session_id] - 1
+                    if running:
+                        self._running[session_id] = running
+                    else:
+                        del self._running[session_id]
+                    idle = not running and session_id not in self._pending
+                    self.completed += 1
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                    self._cond.notify()
+                if idle and self._on_idle is not None:
+                    self._on_idle(self, session_id)
+
+    def is_busy(self, session_id: str) -> bool:
+        with self._cond:
+            return session_id in self._running or session_id in self._pending
+
+    def is_empty(self) -> bool:
+        with self._cond:
+            return not self._running and not self._pending
+
+    def session_ids(self) -> List[str]:
+        """
+        Sessões com estado neste shard (jobs ou caches).
+        """
+        with self._cond:
+            ids = set(self._pending) | set(self._running)
+        return list(ids | set(self.replay.session_ids()) | set(self.documents.session_ids()))
+
+    def forget(self, session_id: str):
+        self.replay.drop(session_id)
+        self.documents.drop(session_id)
+
+    def close(self):
+        """
+        Encerra os workers (as tarefas já enfileiradas são executadas) e o escritor.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self.writer.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                'name': self.name,
+                'queued': sum(len(tasks) for tasks in self._pending.values()),
+                'running': sum(self._running.values()),
+                'sessions': len(set(self._pending) | set(self._running)),
+                'completed': self.completed,
+                'avg_wait_ms': round(self.wait_seconds / (self.completed or 1) * 1000, 2),
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 2)
+            }
+        stats.update({
+            'replay': self.replay.get_stats(),
+            'retrieval': self.documents.get_stats(),
+            'writer': self.writer.get_stats()
+        })
+        return stats
+
+
+def _barrier():
+    # Executada pelo escritor do shard: todas as escritas anteriores já foram aplicadas
+    return None
+
+
+class ShardRouter:
+    """
+    Mapeia `session_id` para o shard local (e para o nó dono, se configurado).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.shards: Dict[str, Shard] = {}
+        self.node_id: Optional[str] = None
+        self._ring = HashRing()
+        self._node_ring: Optional[HashRing] = None
+        self._next_index = 0
+        # Sessões movidas, presas ao shard antigo até ele terminar o trabalho delas
+        self._pins: Dict[str, Shard] = {}
+        self._draining: List[Shard] = []
+        self._lock = threading.RLock()
+        self.rebalances = 0
+        self.moved_sessions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SHARD_COUNT', 4)
+        app.config.setdefault('SHARD_WORKERS', 8)
+        app.config.setdefault('SHARD_SESSION_CONCURRENCY', 2)
+        app.config.setdefault('SHARD_NODES', '')
+        app.config.setdefault('SHARD_NODE_ID', '')
+
+        nodes = [node.strip() for node in app.config['SHARD_NODES'].split(',') if node.strip()]
+        if nodes:
+            self._node_ring = HashRing(nodes)
+            self.node_id = app.config['SHARD_NODE_ID'] or None
+            if self.node_id not in nodes:
+                logger.warning(f"SHARD_NODE_ID {self.node_id!r} não está em SHARD_NODES: nenhuma sessão é local")
+
+        self.resize(int(app.config['SHARD_COUNT']))
+        logger.info(f"🧩 {len(self.shards)} shard(s) de sessão" + (f" no nó {self.node_id}" if nodes else ""))
+
+    def _new_shard(self) -> Shard:
+        config = self.app.config
+        shard = Shard(self._next_index, int(config['SHARD_WORKERS']), int(config['SHARD_SESSION_CONCURRENCY']),
+                      max(1, int(config['SHARD_COUNT'])), on_idle=self._session_idle)
+        shard.init_app(self.app)
+        self._next_index += 1
+        return shard
+
+    def shard_for(self, session_id: str) -> Shard:
+        with self._lock:
+            pinned = self._pins.get(session_id)
+            if pinned is not None:
+                return pinned
+            return self.shards[self._ring.node_for(session_id)]
+
+    def owner_node(self, session_id: str) -> Optional[str]:
+        """
+        Nó dono da sessão (None sem `SHARD_NODES`).
+        """
+        if self._node_ring is None:
+            return None
+        return self._node_ring.node_for(session_id)
+
+    def is_local(self, session_id: str) -> bool:
+        owner = self.owner_node(session_id)
+        return owner is None or owner == self.node_id
+
+    def resize(self, count: int):
+        """
+        Ajusta o número de shards locais e rebalanceia as sessões afetadas.
+        """
+        count = max(1, count)
+        with self._lock:
+            previous = list(self.shards.values())
+            while len(self.shards) < count:
+                shard = self._new_shard()
+                self.shards[shard.name] = shard
+                self._ring.add(shard.name)
+            removed = []
+            while len(self.shards) > count:
+                # Remove os mais recentes: as sessões voltam para onde estavam antes
+                shard = self.shards.pop(max(self.shards.values(), key=lambda s: s.index).name)
+                self._ring.remove(shard.name)
+                removed.append(shard)
+            self._draining.extend(removed)
+
+            if previous:
+                self.rebalances += 1
+                for shard in previous:
+                    self._rebalance(shard)
+            for shard in removed:
+                self._close_if_drained(shard)
+
+    def _rebalance(self, shard: Shard):
+        # Sessões que mudaram de dono ficam presas ao shard antigo até liberadas
+        moved = [session_id for session_id in shard.session_ids()
+                 if session_id not in self._pins and self._ring.node_for(session_id) != shard.name]
+        for session_id in moved:
+            self._pins[session_id] = shard
+        self.moved_sessions += len(moved)
+        idle = [session_id for session_id in moved if not shard.is_busy(session_id)]
+        if idle:
+            self._release(shard, idle)
+        if moved:
+            logger.info(f"Rebalanceamento: {len(moved)} sessão(ões) saindo do {shard.name}")
+
+    def _release(self, shard: Shard, session_ids: List[str]):
+        # Libera depois que as escritas já enfileiradas no shard antigo forem aplicadas
+        shard.writer.submit(_barrier).add_done_callback(lambda _: self._unpin(shard, session_ids))
+
+    def _unpin(self, shard: Shard, session_ids: List[str]):
+        with self._lock:
+            for session_id in session_ids:
+                # Um job novo pode ter chegado enquanto presa: será liberada quando ele terminar
+                if self._pins.get(session_id) is shard and not shard.is_busy(session_id):
+                    del self._pins[session_id]
+                    if self._ring.node_for(session_id) != shard.name:
+                        shard.forget(session_id)
+            self._close_if_drained(shard)
+
+    def _session_idle(self, shard: Shard, session_id: str):
+        with self._lock:
+            if self._pins.get(session_id) is shard:
+                self._release(shard, [session_id])
+
+    def _close_if_drained(self, shard: Shard):
+        if shard in self._draining and shard.is_empty() and shard not in self._pins.values():
+            self._draining.remove(shard)
+            shard.close()
+            logger.info(f"{shard.name} removido")
+
+    def shutdown(self):
+        with self._lock:
+            for shard in list(self.shards.values()) + self._draining:
+                shard.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = list(self.shards.values()) + list(self._draining)
+            stats = {
+                'count': len(self.shards),
+                'node': self.node_id,
+                'nodes': self._node_ring.nodes if self._node_ring is not None else [],
+                'pinned_sessions': len(self._pins),
+                'draining': len(self._draining),
+                'rebalances': self.rebalances,
+                'moved_sessions': self.moved_sessions
+            }
+        stats['shards'] = [shard.get_stats() for shard in shards]
+        return stats
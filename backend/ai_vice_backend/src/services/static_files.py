@@ -0,0 +1,160 @@
+"""
+Servidor de arquivos estáticos baseado em um manifesto em memória.
+
+Na inicialização, a pasta estática é varrida uma única vez: para cada arquivo
+guardamos tamanho, mtime, ETag, o conteúdo (se pequeno) e as variantes
+comprimidas (.gz/.br já existentes em disco, ou gzip gerado em memória para
+tipos de texto). As requisições são respondidas a partir do manifesto, sem
+acessar o sistema de arquivos, com 304 para requisições condicionais e cache
+imutável para os assets com hash do Vite (ex.: `assets/index-DEWmhzux.js`).
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from flask import Response, request
+
+logger = logging.getLogger(__name__)
+
+# Assets gerados pelo Vite (pasta `assets/`, hash de 8 caracteres no nome):
+# podem ficar em cache "para sempre". Outros arquivos com hífen no nome
+# (apple-touch-icon.png, site-background.jpg) são revalidados normalmente.
+HASHED_ASSET_PATTERN = re.compile(
+    r'^assets/(?:[^/]+/)*[^/]+-[A-Za-z0-9_-]{8}\.(js|css|woff2?|ttf|png|jpe?g|gif|svg|webp|avif|ico)$'
+)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 1024
+MAX_MEMORY_FILE_SIZE = 1024 * 1024
+
+# Ordem de preferência das codificações
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticEntry:
+    """
+    Metadados (e, quando couber, conteúdo) de um arquivo estático.
+    """
+
+    __slots__ = ('path', 'abs_path', 'size', 'mtime', 'etag', 'mimetype',
+                 'cache_control', 'body', 'variants')
+
+    def __init__(self, path: str, abs_path: str):
+        stat = os.stat(abs_path)
+        self.path = path
+        self.abs_path = abs_path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if HASHED_ASSET_PATTERN.match(path) else DEFAULT_CACHE_CONTROL
+        )
+        self.body: Optional[bytes] = None
+        # encoding -> (etag, corpo em memória ou None, caminho em disco ou None)
+        self.variants: Dict[str, tuple] = {}
+
+        if self.size <= MAX_MEMORY_FILE_SIZE:
+            with open(abs_path, 'rb') as f:
+                self.body = f.read()
+            self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        else:
+            self.etag = f"{self.size:x}-{int(self.mtime * 1000):x}"
+
+        self._load_variants()
+
+    def _load_variants(self):
+        for encoding, suffix in ENCODINGS:
+            variant_path = self.abs_path + suffix
+            if os.path.isfile(variant_path):
+                body = None
+                if os.path.getsize(variant_path) <= MAX_MEMORY_FILE_SIZE:
+                    with open(variant_path, 'rb') as f:
+                        body = f.read()
+                self.variants[encoding] = (f"{self.etag}-{encoding}", body, variant_path)
+
+        compressible = self.mimetype.startswith(COMPRESSIBLE_TYPES)
+        if 'gzip' not in self.variants and compressible and self.body and self.size >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if len(compressed) < self.size:
+                self.variants['gzip'] = (f"{self.etag}-gzip", compressed, None)
+
+
+class StaticManifest:
+    """
+    Manifesto caminho → StaticEntry da pasta estática, construído na inicialização.
+    """
+
+    def __init__(self, folder: Optional[str] = None, index: str = 'index.html'):
+        self.folder = folder
+        self.index = index
+        self.entries: Dict[str, StaticEntry] = {}
+        if folder:
+            self.scan(folder)
+
+    def scan(self, folder: str):
+        self.folder = folder
+        entries = {}
+        if folder and os.path.isdir(folder):
+            for root, _, files in os.walk(folder):
+                for name in files:
+                    if name.endswith(('.gz', '.br')) and os.path.isfile(os.path.join(root, name[:-3])):
+                        continue  # variante comprimida: anexada ao arquivo original
+                    abs_path = os.path.join(root, name)
+                    path = os.path.relpath(abs_path, folder).replace(os.sep, '/')
+                    try:
+                        entries[path] = StaticEntry(path, abs_path)
+                    except OSError as e:
+                        logger.error(f"Erro ao indexar arquivo estático {path}: {str(e)}")
+        self.entries = entries
+        logger.info(f"Manifesto estático: {len(entries)} arquivos em {folder}")
+
+    def lookup(self, path: str) -> Optional[StaticEntry]:
+        """
+        Arquivo pedido ou, para caminhos desconhecidos (rotas do SPA), o index.
+        """
+        return self.entries.get(path) or self.entries.get(self.index)
+
+    def response(self, entry: StaticEntry) -> Response:
+        """
+        Monta a resposta para uma entrada, negociando a codificação e tratando 304.
+        """
+        etag, body, file_path, encoding = entry.etag, entry.body, entry.abs_path, None
+        accepted = request.accept_encodings
+        for candidate, _ in ENCODINGS:
+            if candidate in entry.variants and accepted[candidate]:
+                etag, body, file_path = entry.variants[candidate]
+                encoding = candidate
+                break
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif body is not None:
+            response = Response(body, mimetype=entry.mimetype)
+        else:
+            response = Response(_stream_file(file_path), mimetype=entry.mimetype, direct_passthrough=True)
+            response.content_length = os.path.getsize(file_path)
+
+        response.set_etag(etag)
+        response.last_modified = entry.mtime
+        response.headers['Cache-Control'] = entry.cache_control
+        if entry.variants:
+            response.vary.add('Accept-Encoding')
+        if encoding and response.status_code != 304:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def _stream_file(path: str, chunk_size: int = 64 * 1024):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,206 @@
+"""
+Gravação anonimizada do tráfego real para o benchmark de replay.
+
+Com `TRAFFIC_RECORD_PATH` definido, cada evento relevante vira uma linha JSON:
+
+- Socket.IO: `message` e `analyze_file`;
+- REST: criação de sessão, upload e leitura de histórico/arquivo (com status,
+  tamanho da resposta e duração no servidor).
+
+Nada do conteúdo é gravado: só tamanhos, extensões de arquivo, parâmetros de
+paginação e o instante relativo ao início da gravação. Ids de sessão e de
+usuário viram hashes com `TRAFFIC_RECORD_SALT` (aleatório por processo quando
+vazio), o que mantém a sequência de cada sessão sem expor os ids reais.
+
+`TRAFFIC_RECORD_SAMPLE` escolhe uma fração das sessões (pelo hash, então a
+sessão inteira entra ou fica de fora) e `TRAFFIC_RECORD_MAX_EVENTS` encerra a
+gravação depois de tantos eventos. A escrita no arquivo é feita por uma
+thread própria, fora das requisições.
+
+O arquivo é consumido por `benchmarks/replay.py`.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+RECORD_VERSION = 1
+
+# Endpoints REST gravados e o tipo de evento correspondente
+RECORDED_ENDPOINTS = {
+    'chat.create_session': 'create_session',
+    'chat.get_messages': 'history',
+    'chat.get_archived_messages': 'archive',
+    'chat.upload_file': 'upload',
+}
+
+
+def _extension(file_name: Optional[str]) -> Optional[str]:
+    return os.path.splitext(file_name)[1].lower() if file_name else None
+
+
+class TrafficRecorder:
+    """
+    Grava eventos anonimizados em JSON Lines (desativado por padrão).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.path = ''
+        self.sample = 1.0
+        self.max_events = 100000
+        self._salt = b''
+        self._started = time.monotonic()
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('TRAFFIC_RECORD_PATH', '')
+        app.config.setdefault('TRAFFIC_RECORD_SAMPLE', 1.0)
+        app.config.setdefault('TRAFFIC_RECORD_MAX_EVENTS', 100000)
+        app.config.setdefault('TRAFFIC_RECORD_SALT', '')
+        self.path = app.config['TRAFFIC_RECORD_PATH']
+        self.sample = float(app.config['TRAFFIC_RECORD_SAMPLE'])
+        self.max_events = int(app.config['TRAFFIC_RECORD_MAX_EVENTS'])
+        salt = app.config['TRAFFIC_RECORD_SALT']
+        self._salt = salt.encode('utf-8') if salt else os.urandom(16)
+        if not self.path:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        self._started = time.monotonic()
+        self._queue.put(json.dumps({
+            'version': RECORD_VERSION,
+            'started_at': datetime.utcnow().isoformat(),
+            'sample': self.sample
+        }))
+        self._thread = threading.Thread(target=self._write_loop, name='traffic-recorder', daemon=True)
+        self._thread.start()
+        logger.info(f"📼 Gravação de tráfego em {self.path} (amostra {self.sample:.0%})")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.recorded < self.max_events
+
+    def _anonymize(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return hmac.new(self._salt, value.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def _sampled(self, session_hash: Optional[str]) -> bool:
+        if self.sample >= 1 or session_hash is None:
+            return True
+        return int(session_hash[:8], 16) / 0xFFFFFFFF < self.sample
+
+    def _record(self, kind: str, session_id: Optional[str], **fields: Any):
+        session_hash = self._anonymize(session_id)
+        if not self._sampled(session_hash):
+            return
+        with self._lock:
+            if self.recorded >= self.max_events:
+                return
+            self.recorded += 1
+            if self.recorded == self.max_events:
+                logger.info(f"Gravação de tráfego encerrada após {self.max_events} eventos")
+        event = {'t': round(time.monotonic() - self._started, 3), 'kind': kind, 'session': session_hash}
+        event.update((key, value) for key, value in fields.items() if value is not None)
+        self._queue.put(json.dumps(event))
+
+    def record_event(self, kind: str, data: Optional[Dict[str, Any]]):
+        """
+        Grava um evento Socket.IO (`message` ou `analyze_file`).
+        """
+        if not self.enabled or not isinstance(data, dict):
+            return
+        try:
+            content = data.get('content')
+            self._record(
+                kind,
+                data.get('session_id'),
+                user=self._anonymize(data.get('user_id')),
+                size=len(content.encode('utf-8')) if isinstance(content, str) else None,
+                ext=_extension(data.get('file_name'))
+            )
+        except Exception as e:
+            logger.error(f"Erro ao gravar evento de tráfego: {str(e)}")
+
+    def _before_request(self):
+        if self.enabled and request.endpoint in RECORDED_ENDPOINTS:
+            g.traffic_started = time.monotonic()
+
+    def _after_request(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None:
+            return response
+        try:
+            kind = RECORDED_ENDPOINTS[request.endpoint]
+            session_id = (request.view_args or {}).get('session_id')
+            fields = {
+                'status': response.status_code,
+                'ms': round((time.monotonic() - started) * 1000, 2),
+                'request_size': request.content_length,
+                'response_size': response.calculate_content_length()
+            }
+            if kind == 'create_session':
+                body = response.get_json(silent=True) or {}
+                session_id = (body.get('session') or {}).get('id')
+            elif kind == 'history':
+                fields['per_page'] = request.args.get('per_page', type=int)
+                fields['page'] = request.args.get('page', type=int)
+                fields['before'] = 'before' in request.args or None
+                fields['fields'] = request.args.get('fields', '').count(',') + 1 if request.args.get('fields') else None
+            elif kind == 'upload':
+                upload = request.files.get('file')
+                fields['ext'] = _extension(upload.filename if upload else None)
+            self._record(kind, session_id, **fields)
+        except Exception as e:
+            logger.error(f"Erro ao gravar requisição de tráfego: {str(e)}")
+        return response
+
+    def _write_loop(self):
+        with open(self.path, 'a', encoding='utf-8') as output:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                output.write(line + '\n')
+                # Agrupa o que já estiver na fila antes de descarregar
+                while True:
+                    try:
+                        line = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        return
+                    output.write(line + '\n')
+                output.flush()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'recorded': self.recorded,
+            'max_events': self.max_events if self.path else None
+        }
@@ -0,0 +1,99 @@
+"""
+Entrega de arquivos enviados (uploads).
+
+Os nomes dos uploads levam um prefixo uuid e nunca são sobrescritos, então
+podem ser cacheados pelo navegador indefinidamente. A entrega usa o
+`send_file` do Werkzeug com suporte a Range, ETag/Last-Modified (304) e
+`wsgi.file_wrapper` (sendfile sem cópia quando o servidor suporta), ou
+X-Sendfile quando `USE_X_SENDFILE` está ativo atrás de um proxy.
+
+Para imagens, `?thumb=<tamanho>` devolve uma miniatura gerada uma única vez e
+guardada em disco em `<sessão>/.thumbs/` (requer Pillow, opcional).
+"""
+
+import logging
+import os
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+from flask import abort, send_file
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_AGE = 365 * 24 * 3600
+THUMBNAIL_DIR = '.thumbs'
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+@lru_cache(maxsize=None)
+def _image_module():
+    # Importado na primeira miniatura, não na inicialização do servidor
+    try:
+        from PIL import Image
+    except ImportError:  # dependência opcional
+        return None
+    return Image
+
+
+def thumbnail_path(file_path: str, size: int) -> Optional[str]:
+    """
+    Caminho da miniatura em cache, gerando-a se ainda não existir.
+    Retorna None se o arquivo não for uma imagem suportada ou sem Pillow.
+    """
+    if size not in THUMBNAIL_SIZES:
+        return None
+    if os.path.splitext(file_path)[1].lower() not in THUMBNAIL_EXTENSIONS:
+        return None
+
+    Image = _image_module()
+    if Image is None:
+        return None
+
+    directory, filename = os.path.split(file_path)
+    thumb_dir = os.path.join(directory, THUMBNAIL_DIR)
+    thumb_file = os.path.join(thumb_dir, f"{size}_{os.path.splitext(filename)[0]}.webp")
+
+    if os.path.exists(thumb_file) and os.path.getmtime(thumb_file) >= os.path.getmtime(file_path):
+        return thumb_file
+
+    tmp_file = None
+    try:
+        os.makedirs(thumb_dir, exist_ok=True)
+        with Image.open(file_path) as image:
+            image.thumbnail((size, size))
+            # Escrita atômica: temporário único por chamada (threads e processos),
+            # requisições concorrentes nunca veem arquivo parcial
+            fd, tmp_file = tempfile.mkstemp(dir=thumb_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as output:
+                image.save(output, format='WEBP', quality=80)
+            # mkstemp cria com 0600; o proxy (X-Sendfile) precisa ler
+            os.chmod(tmp_file, 0o644)
+            os.replace(tmp_file, thumb_file)
+        return thumb_file
+    except Exception as e:
+        logger.error(f"Erro ao gerar miniatura de {filename}: {str(e)}")
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return None
+
+
+def send_upload(upload_root: str, session_id: str, filename: str, thumb: Optional[int] = None):
+    """
+    Envia um upload (ou sua miniatura) com validadores e cache de longa duração.
+    """
+    file_path = safe_join(upload_root, session_id, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+
+    if thumb:
+        file_path = thumbnail_path(file_path, thumb) or file_path
+
+    response = send_file(file_path, conditional=True, etag=True, max_age=UPLOAD_MAX_AGE)
+    # Conteúdo da sessão: cache apenas no navegador, nunca em proxies compartilhados
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,171 @@
+"""
+Pool de processos compartilhado para trabalho de CPU no caminho das requisições.
+
+Com o GIL, decodificar ou parsear um arquivo grande em uma thread do Socket.IO
+atrasa os emits de todas as outras conversas. Tarefas de CPU (funções puras de
+`src.services.cpu_tasks`) são enviadas a este pool:
+
+    result = await cpu_pool.run(cpu_tasks.extract_file, path, name)   # corrotina
+    result = cpu_pool.call(cpu_tasks.prepare_chunks, path, name)      # rota Flask
+
+A fila é limitada (`CPU_POOL_MAX_PENDING`): acima dela, `submit` levanta
+PoolSaturated em vez de acumular trabalho sem limite. Os processos são criados
+com fork já no `init_app`, antes de o servidor abrir threads.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PoolSaturated(Exception):
+    """
+    Fila do pool de CPU cheia; a tarefa não foi aceita.
+    """
+
+
+def _timed(task: Callable[..., T], args: Tuple[Any, ...]) -> Tuple[T, float]:
+    # Executado no processo filho: mede só o tempo de execução da tarefa
+    started = time.perf_counter()
+    result = task(*args)
+    return result, time.perf_counter() - started
+
+
+def _noop() -> None:
+    return None
+
+
+class _TaskStats:
+    __slots__ = ("submitted", "completed", "failed", "run_seconds", "wait_seconds", "max_seconds")
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.run_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        done = self.completed or 1
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_run_ms": round(self.run_seconds / done * 1000, 2),
+            "avg_wait_ms": round(self.wait_seconds / done * 1000, 2),
+            "max_ms": round(self.max_seconds * 1000, 2)
+        }
+
+
+class CPUPool:
+    """
+    ProcessPoolExecutor com fila limitada e métricas por tarefa.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 0
+        self.max_pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._peak_pending = 0
+        self._rejected = 0
+        self._tasks: Dict[str, _TaskStats] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        default_workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        app.config.setdefault('CPU_POOL_WORKERS', default_workers)
+        app.config.setdefault('CPU_POOL_MAX_PENDING', 32)
+        self.workers = int(app.config['CPU_POOL_WORKERS'])
+        self.max_pending = int(app.config['CPU_POOL_MAX_PENDING'])
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('fork')
+        )
+        # Cria todos os processos agora (fork com apenas a thread principal ativa)
+        for future in [self._executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"⚙️ Pool de CPU iniciado com {self.workers} processo(s)")
+
+    def submit(self, task: Callable[..., T], *args: Any) -> "Future[T]":
+        """
+        Envia `task(*args)` ao pool. Levanta PoolSaturated se a fila estiver cheia.
+        """
+        if self._executor is None:
+            raise RuntimeError("CPUPool não inicializado (chame init_app)")
+
+        name = task.__name__
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PoolSaturated(f"{self._pending} tarefas pendentes")
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+            stats = self._tasks.setdefault(name, _TaskStats())
+            stats.submitted += 1
+
+        submitted_at = time.perf_counter()
+        inner = self._executor.submit(_timed, task, args)
+        outer: "Future[T]" = Future()
+
+        def done(future):
+            elapsed = time.perf_counter() - submitted_at
+            error = future.exception()
+            with self._lock:
+                self._pending -= 1
+                if error is None:
+                    result, run_seconds = future.result()
+                    stats.completed += 1
+                    stats.run_seconds += run_seconds
+                    stats.wait_seconds += max(0.0, elapsed - run_seconds)
+                    stats.max_seconds = max(stats.max_seconds, elapsed)
+                else:
+                    stats.failed += 1
+            if error is None:
+                outer.set_result(result)
+            else:
+                outer.set_exception(error)
+
+        inner.add_done_callback(done)
+        return outer
+
+    async def run(self, task: Callable[..., T], *args: Any) -> T:
+        """
+        Executa a tarefa no pool sem bloquear o loop de eventos.
+        """
+        return await asyncio.wrap_future(self.submit(task, *args))
+
+    def call(self, task: Callable[..., T], *args: Any, timeout: Optional[float] = None) -> T:
+        """
+        Executa a tarefa no pool e espera o resultado (a thread espera sem o GIL).
+        """
+        return self.submit(task, *args).result(timeout)
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "peak_pending": self._peak_pending,
+                "rejected": self._rejected,
+                "tasks": {name: stats.to_dict() for name, stats in self._tasks.items()}
+            }
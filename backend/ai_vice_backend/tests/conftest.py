@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testes importam `src.*` como o app (ver src/main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,90 @@
+"""
+Formato gravado de `Message.content`: ida e volta encode/decode e ids
+gravados por outro processo.
+"""
+
+import zlib
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+
+from src.models.message import CompressionDictionary, InternedText, db
+from src.services import compression
+from src.services.prompts import WELCOME_MESSAGE
+
+LONG_REPLY = (
+    "Claro! Aqui está um exemplo completo.\n\n## Resumo\n\n"
+    + "\n".join(f"- **Passo {i}:** configure o serviço e verifique os logs." for i in range(40))
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'compression.db'}")
+    db.metadata.create_all(engine, tables=[CompressionDictionary.__table__, InternedText.__table__])
+    compression.configure(512)
+    compression.init_compression(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    '',
+    'oi, tudo bem?',
+    'acentuação e emoji 😊 ' * 40,
+    WELCOME_MESSAGE,
+    LONG_REPLY,
+])
+def test_round_trip(engine, value):
+    assert compression.decode(compression.encode(value)) == value
+
+
+def test_stored_formats(engine):
+    assert compression.encode('curta') == 'curta'
+
+    interned = compression.encode(WELCOME_MESSAGE)
+    assert interned[0] == compression.FORMAT_INTERNED
+    assert len(interned) == compression.HEADER_SIZE
+
+    compressed = compression.encode(LONG_REPLY)
+    assert compressed[0] in (compression.FORMAT_ZLIB, compression.FORMAT_ZSTD)
+    assert len(compressed) < len(LONG_REPLY.encode('utf-8'))
+
+
+def test_decode_reloads_ids_from_other_process(engine):
+    # Outro nó grava um dicionário e um texto internado depois do nosso load
+    dictionary = b"conteudo tipico das respostas de outro no " * 20
+    with engine.begin() as connection:
+        dict_id = connection.execute(
+            text("INSERT INTO compression_dictionaries (codec, data, created_at) "
+                 "VALUES ('raw', :data, CURRENT_TIMESTAMP)"),
+            {'data': dictionary}
+        ).lastrowid
+        text_id = connection.execute(
+            text("INSERT INTO interned_texts (content) VALUES ('nova mensagem de boas-vindas')")
+        ).lastrowid
+
+    compressor = zlib.compressobj(compression.ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=dictionary)
+    payload = compressor.compress(LONG_REPLY.encode('utf-8')) + compressor.flush()
+    stored = bytes((compression.FORMAT_ZLIB,)) + dict_id.to_bytes(2, 'big') + payload
+
+    assert compression.decode(stored) == LONG_REPLY
+    assert compression.decode(bytes((compression.FORMAT_INTERNED,)) + text_id.to_bytes(2, 'big')) \
+        == 'nova mensagem de boas-vindas'
+
+
+def test_decode_unknown_id_fails_clearly(engine):
+    with pytest.raises(ValueError):
+        compression.decode(bytes((compression.FORMAT_ZLIB,)) + (999).to_bytes(2, 'big') + b'x')
+    with pytest.raises(ValueError):
+        compression.decode(bytes((compression.FORMAT_INTERNED,)) + (999).to_bytes(2, 'big'))
+
+
+def test_other_databases_store_plain_text(engine):
+    column = compression.CompressedText()
+    dialect = postgresql.dialect()
+    assert column.process_bind_param(LONG_REPLY, dialect) == LONG_REPLY
+    assert column.process_bind_param(WELCOME_MESSAGE, dialect) == WELCOME_MESSAGE
+    assert column.process_result_value(LONG_REPLY, dialect) == LONG_REPLY
@@ -0,0 +1,24 @@
+"""
+Perfil local de CSV enviado ao modelo.
+"""
+
+from src.services.extractors import CSV_MAX_COLUMNS, extract_csv
+
+
+def test_wide_csv_is_not_reported_ragged(tmp_path):
+    width = CSV_MAX_COLUMNS + 10
+    path = tmp_path / 'largo.csv'
+    rows = [','.join(f'c{i}' for i in range(width))]
+    rows += [','.join(str(row * i) for i in range(width)) for row in range(20)]
+    rows.append('1,2')
+    path.write_text('\n'.join(rows) + '\n')
+
+    result = extract_csv(str(path))
+
+    assert result['metadata']['rows'] == 21
+    assert result['metadata']['columns'] == width
+    assert result['metadata']['profiled_columns'] == CSV_MAX_COLUMNS
+    assert len(result['metadata']['profile']) == CSV_MAX_COLUMNS
+    assert f'e {width} coluna(s)' in result['content']
+    assert '1 linha(s) com número de colunas diferente' in result['content']
+    assert f'primeiras {CSV_MAX_COLUMNS} colunas' in result['content']
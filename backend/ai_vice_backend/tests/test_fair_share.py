@@ -0,0 +1,95 @@
+"""
+Fila justa da IA: ordem por etiqueta de término e limpeza do estado por usuário.
+"""
+
+import pytest
+
+from src.services import fair_share
+from src.services.fair_share import FairShareScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fair_share.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = FairShareScheduler()
+    scheduler.user_max_concurrent = 10
+    return scheduler
+
+
+def run_in_order(scheduler, calls):
+    # Com uma vaga só: enfileira tudo e devolve a vaga a cada concessão
+    order = []
+    for user, name in calls:
+        ticket = scheduler.submit(user, 100)
+        ticket.future.add_done_callback(lambda future, name=name: order.append((name, future.result())))
+    released = 0
+    while released < len(order):
+        scheduler.release(order[released][1], used_tokens=100)
+        released += 1
+    return [name for name, _ in order]
+
+
+def test_isolated_call_passes_queued_burst(scheduler):
+    scheduler.max_concurrent = 1
+    burst = [('script', f'a{i}') for i in range(1, 6)]
+
+    order = run_in_order(scheduler, burst + [('other', 'b1')])
+
+    assert order[0] == 'a1'
+    assert order.index('b1') <= 2
+    assert [name for name in order if name != 'b1'] == [name for _, name in burst]
+
+
+def test_tier_weight_shortens_finish_tags(scheduler):
+    scheduler.max_concurrent = 1
+    scheduler.user_tiers = {'paid': 'pro'}
+    scheduler.tier_weights = {'free': 1.0, 'pro': 4.0}
+
+    order = run_in_order(scheduler, [('free', 'f1'), ('free', 'f2'), ('free', 'f3'),
+                                     ('paid', 'p1'), ('paid', 'p2'), ('paid', 'p3')])
+
+    assert order[:4] == ['f1', 'p1', 'p2', 'p3']
+
+
+def test_idle_users_are_forgotten(scheduler, clock):
+    for i in range(1000):
+        ticket = scheduler.submit(f'session:{i}', 100)
+        scheduler.release(ticket)
+
+    assert scheduler._users == {}
+    assert len(scheduler._idle) == 1000
+
+    # Quando os baldes enchem, nem o saldo é guardado
+    clock.now += 60
+    scheduler.release(scheduler.submit('session:last', 100), used_tokens=0)
+    assert scheduler._users == {}
+    assert len(scheduler._idle) == 0
+
+
+def test_idle_user_keeps_spent_balance(scheduler, clock):
+    capacity = scheduler.tokens_per_minute
+    scheduler.release(scheduler.submit('heavy', capacity))
+    assert 'heavy' not in scheduler._users
+
+    # O balde não volta cheio só porque o estado foi descartado
+    ticket = scheduler.submit('heavy', 100)
+    assert not ticket.future.done()
+    scheduler.withdraw(ticket)
+
+    clock.now += 60
+    ticket = scheduler.submit('heavy', 100)
+    assert ticket.future.done()
@@ -20,10 +20,12 @@ export default function ChatInterface() {
   const [inputMessage, setInputMessage] = useState('')
   const [isConnected, setIsConnected] = useState(false)
   const [isTyping, setIsTyping] = useState(false)
+  const [isDegraded, setIsDegraded] = useState(false)
   const [userId] = useState(() => `user_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`)
   
   const messagesEndRef = useRef(null)
   const fileInputRef = useRef(null)
+  const lastMessageIdRef = useRef(null)
 
   // Scroll para a última mensagem
   const scrollToBottom = () => {
@@ -32,6 +34,7 @@ export default function ChatInterface() {
 
   useEffect(() => {
     scrollToBottom()
+    lastMessageIdRef.current = messages.length ? messages[messages.length - 1].id : null
   }, [messages])
 
   // Inicializar conexão
@@ -61,10 +64,12 @@ export default function ChatInterface() {
         setMessages([data.welcome_message])
         
         // Conectar WebSocket
+        // auth é reavaliado a cada (re)conexão: o servidor reenvia só o que faltou
         const newSocket = io(BACKEND_URL, {
-          auth: {
-            session_id: data.session.id
-          }
+          auth: (cb) => cb({
+            session_id: data.session.id,
+            last_message_id: lastMessageIdRef.current
+          })
         })
 
         newSocket.on('connect', () => {
@@ -77,9 +82,41 @@ export default function ChatInterface() {
           console.log('Desconectado do servidor')
         })
 
-        newSocket.on('message', (message) => {
+        const handleMessage = (message) => {
           setMessages(prev => [...prev, message])
           setIsTyping(false)
+        }
+
+        newSocket.on('message', handleMessage)
+
+        // Eventos agrupados pelo servidor em um único frame: [[evento, payload], ...]
+        newSocket.on('batch', (events) => {
+          events.forEach(([event, payload]) => {
+            if (event === 'message') {
+              handleMessage(payload)
+            }
+          })
+        })
+
+        newSocket.on('sync', async (sync) => {
+          if (sync.complete) {
+            setMessages(prev => {
+              const seen = new Set(prev.map(m => m.id))
+              return [...prev, ...sync.messages.filter(m => !seen.has(m.id))]
+            })
+            return
+          }
+          // Lacuna grande demais para o delta: recarregar o histórico
+          const history = await fetch(`${BACKEND_URL}/api/chat/sessions/${sync.session_id}/messages`)
+          const historyData = await history.json()
+          if (historyData.success) {
+            setMessages(historyData.messages)
+          }
+        })
+
+        // Servidor sobrecarregado: respostas simples locais, análises adiadas
+        newSocket.on('status', (status) => {
+          setIsDegraded(Boolean(status.degraded))
         })
 
         newSocket.on('error', (error) => {
@@ -136,8 +173,8 @@ export default function ChatInterface() {
         if (socket) {
           socket.emit('analyze_file', {
             session_id: sessionId,
-            file_path: data.message.file_url,
-            file_name: data.message.file_name
+            message_id: data.message.id,
+            user_id: userId
           })
           setIsTyping(true)
         }
@@ -236,9 +273,16 @@ export default function ChatInterface() {
                 </p>
               </div>
             </div>
-            <Badge variant={isConnected ? 'default' : 'destructive'}>
-              {isConnected ? 'Conectado' : 'Desconectado'}
-            </Badge>
+            <div className="flex items-center gap-2">
+              {isDegraded && (
+                <Badge variant="secondary" title="Alta demanda: respostas podem ser simplificadas e análises de arquivos adiadas">
+                  Alta demanda
+                </Badge>
+              )}
+              <Badge variant={isConnected ? 'default' : 'destructive'}>
+                {isConnected ? 'Conectado' : 'Desconectado'}
+              </Badge>
+            </div>
           </div>
         </CardHeader>
       </Card>
@@ -9,6 +9,7 @@ import logging
 import os
 import uuid
 from datetime import datetime
+from types import MappingProxyType
 from typing import Dict, List
 
 from flask import Flask, request, jsonify
@@ -31,6 +32,20 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 active_sessions: Dict[str, Dict] = {}
 session_messages: Dict[str, List] = {}
 
+# Prompt de sistema pré-computado: todo contexto começa pelos mesmos bytes,
+# permitindo o reaproveitamento do cache de prefixo do provedor
+SYSTEM_PROMPT = """Você é o AI Vice, um assistente de IA conversacional brasileiro, amigável e prestativo.
+
+Características:
+- Responda sempre em português brasileiro
+- Seja conversacional, amigável e prestativo
+- Use emojis moderadamente para tornar a conversa mais calorosa
+- Mantenha respostas concisas mas informativas
+- Demonstre personalidade própria como AI Vice
+- Ajude com qualquer pergunta ou tarefa que o usuário solicitar"""
+
+SYSTEM_MESSAGE = MappingProxyType({"role": "system", "content": SYSTEM_PROMPT})
+
 class ManusAIIntegration:
     """Integração com o Manus AI para processar mensagens reais"""
     
@@ -49,19 +64,8 @@ class ManusAIIntegration:
             # Preparar contexto para o Manus AI
             context_messages = []
             
-            # Adicionar mensagem de sistema
-            context_messages.append({
-                "role": "system",
-                "content": """Você é o AI Vice, um assistente de IA conversacional brasileiro, amigável e prestativo. 
-                
-Características:
-- Responda sempre em português brasileiro
-- Seja conversacional, amigável e prestativo
-- Use emojis moderadamente para tornar a conversa mais calorosa
-- Mantenha respostas concisas mas informativas
-- Demonstre personalidade própria como AI Vice
-- Ajude com qualquer pergunta ou tarefa que o usuário solicitar"""
-            })
+            # Adicionar mensagem de sistema (prefixo fixo, pré-computado)
+            context_messages.append(dict(SYSTEM_MESSAGE))
             
             # Adicionar histórico recente (últimas 10 mensagens)
             for msg in history[-10:]: